@@ -0,0 +1,119 @@
+# benchmarks/bench_extract_json.py
+"""Benchmark extract_json on large, code-bearing LLM replies.
+
+Compares the single-pass scanner in llm_client with the greedy regex it
+replaced, on replies of increasing size whose file contents are full of
+braces. Each size is measured with plain prose around the JSON, with prose
+that contains braces too, which the greedy regex cannot handle, and with a
+reply cut off at 90% of its length, where neither can find an object and the
+scanner has to give up without rescanning the text.
+
+    python benchmarks/bench_extract_json.py --sizes 10 100 500 --repeat 20
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+os.environ.setdefault("LLM_TELEMETRY", "false")
+
+from llm_client import extract_json, fix_json_formatting
+from schemas import STEPS_SCHEMA
+
+CODE_BLOCK = '''def handler(event):
+    config = {"retries": 3, "backoff": {"base": 0.5, "max": 8}}
+    if event.get("type") == "push":
+        return {"status": "ok", "data": [{"id": i} for i in range(10)]}
+    template = "Hello {name}, you have {count} messages"
+    return {"status": "ignored", "template": template}
+
+'''
+
+VARIANTS = ("plain", "with braces", "truncated")
+
+def make_response(size_kb, variant):
+    """Build a reply with roughly size_kb KB of code inside a steps object."""
+    files = []
+    per_file = max(1, size_kb // 10)
+    for index in range(10):
+        content = CODE_BLOCK * max(1, per_file * 1024 // len(CODE_BLOCK))
+        files.append({"action": "create_file", "path": f"module_{index}.py", "content": content})
+    steps = json.dumps({"steps": files + [{"action": "run_command", "command": "pytest", "background": False}]})
+    if variant == "with braces":
+        return (
+            "Here is the plan. Each file uses dicts like {\"key\": value}.\n\n"
+            + steps
+            + "\n\nNote: format strings such as {name} are filled in at runtime."
+        )
+    response = "Here is the plan.\n\n" + steps + "\n\nRun the tests when done."
+    if variant == "truncated":
+        # A reply cut short by the token limit
+        return response[:len(response) * 9 // 10]
+    return response
+
+def regex_extract_json(response):
+    """The greedy regex extractor that extract_json replaced."""
+    match = re.search(r'\{.*\}', response, flags=re.DOTALL)
+    if match:
+        try:
+            return json.loads(match.group(0))
+        except json.JSONDecodeError:
+            try:
+                return json.loads(fix_json_formatting(match.group(0)))
+            except json.JSONDecodeError:
+                return None
+    return None
+
+def measure(func, response, repeat):
+    """Run func on response repeat times and return (best seconds, result)."""
+    best = None
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func(response)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def run_case(response, variant, repeat):
+    """Measure both extractors on one reply and print a result row."""
+    scanner_time, scanner_result = measure(lambda r: extract_json(r, STEPS_SCHEMA), response, repeat)
+    regex_time, regex_result = measure(regex_extract_json, response, repeat)
+    entry = {
+        "size_bytes": len(response),
+        "variant": variant,
+        "scanner_seconds": scanner_time,
+        "regex_seconds": regex_time,
+        "scanner_parsed": scanner_result is not None,
+        "regex_parsed": regex_result is not None
+    }
+    print(
+        f"{len(response) // 1024:>6}KB {variant:>13}"
+        f" {scanner_time * 1000:>11.2f} {regex_time * 1000:>9.2f}"
+        f"  {str(entry['scanner_parsed']):>10}  {str(entry['regex_parsed']):>8}"
+    )
+    return entry
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark JSON extraction from LLM replies")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 300, 500], help="Reply sizes in KB")
+    parser.add_argument("--repeat", type=int, default=10, help="Runs per measurement (best is reported)")
+    parser.add_argument("--output", help="Write results to this JSON file")
+    args = parser.parse_args()
+    
+    results = []
+    print(f"{'size':>8} {'reply':>13} {'scanner ms':>11} {'regex ms':>9}  scanner ok  regex ok")
+    for size_kb in args.sizes:
+        for variant in VARIANTS:
+            results.append(run_case(make_response(size_kb, variant), variant, args.repeat))
+    
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"benchmark": "extract_json", "results": results}, f, indent=2)
+        print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+# benchmarks/fake_llm_server.py
+"""OpenAI-compatible stub of an LLM server for benchmarks.
+
+Serves /v1/models, /v1/chat/completions and /v1/embeddings, answering chat
+requests (streamed or not) with the agents' mock responses after a simulated
+delay: a fixed latency, plus generation time at a given token rate, plus
+random jitter.
+A fraction of requests can be failed with HTTP 503 to exercise retries.
+
+    python benchmarks/fake_llm_server.py --port 1234 --latency 0.2 --token-rate 50
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from llm_client import get_mock_response, mock_kind_for
+from telemetry import estimate_tokens
+
+class _Handler(BaseHTTPRequestHandler):
+    """Request handler; self.server.fake is the FakeLLMServer it serves."""
+    
+    protocol_version = "HTTP/1.1"
+    
+    def log_message(self, format, *args):
+        pass
+    
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._reply(200, {"object": "list", "data": [{"id": self.server.fake.model, "object": "model"}]})
+        else:
+            self._reply(404, {"error": {"message": f"Unknown path {self.path}"}})
+    
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self._reply(400, {"error": {"message": "Malformed JSON"}})
+            return
+        
+        fake = self.server.fake
+        fake.count("requests")
+        if fake.uniform() < fake.error_rate:
+            fake.count("errors")
+            time.sleep(fake.latency)
+            self._reply(503, {"error": {"message": "Injected failure", "type": "server_error"}})
+            return
+        
+        if self.path.rstrip("/").endswith("/chat/completions"):
+            self._chat(request)
+        elif self.path.rstrip("/").endswith("/embeddings"):
+            self._embeddings(request)
+        else:
+            self._reply(404, {"error": {"message": f"Unknown path {self.path}"}})
+    
+    def _chat(self, request):
+        messages = request.get("messages", [])
+        system_prompt = "".join(m.get("content", "") for m in messages if m.get("role") == "system")
+        user_prompt = "".join(m.get("content", "") for m in messages if m.get("role") == "user")
+        content = self.server.fake.response_for(system_prompt, user_prompt)
+        prompt_tokens = estimate_tokens(system_prompt + user_prompt)
+        completion_tokens = estimate_tokens(content)
+        
+        fake = self.server.fake
+        time.sleep(fake.delay(completion_tokens))
+        if request.get("stream"):
+            self._stream(request, content)
+            return
+        self._reply(200, {
+            "id": f"chatcmpl-{fake.count('completions')}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", fake.model),
+            "choices": [{
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": content}
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens
+            }
+        })
+    
+    def _stream(self, request, content):
+        """Send a reply as server-sent events, a few words per chunk."""
+        fake = self.server.fake
+        chunk_id = f"chatcmpl-{fake.count('completions')}"
+        words = content.split(" ")
+        pieces = [" ".join(words[i:i + 8]) + (" " if i + 8 < len(words) else "") for i in range(0, len(words), 8)]
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        for piece in pieces:
+            event = {
+                "id": chunk_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": request.get("model", fake.model),
+                "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]
+            }
+            self.wfile.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.close_connection = True
+    
+    def _embeddings(self, request):
+        texts = request.get("input", [])
+        if isinstance(texts, str):
+            texts = [texts]
+        fake = self.server.fake
+        time.sleep(fake.delay(0))
+        self._reply(200, {
+            "object": "list",
+            "model": request.get("model", fake.model),
+            "data": [{"object": "embedding", "index": i, "embedding": [0.0] * 384} for i in range(len(texts))],
+            "usage": {"prompt_tokens": sum(estimate_tokens(t) for t in texts), "total_tokens": 0}
+        })
+    
+    def _reply(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+class FakeLLMServer:
+    """A stub LLM server running in a background thread."""
+    
+    def __init__(self, host="127.0.0.1", port=0, latency=0.05, token_rate=1000.0, jitter=0.0,
+                 error_rate=0.0, model="fake-model", seed=None, responses=None):
+        """Configure the server.
+        
+        Args:
+            host: Interface to listen on
+            port: Port to listen on (0 picks a free one)
+            latency: Seconds before the first token of every reply
+            token_rate: Completion tokens generated per second (0 for instant)
+            jitter: Up to this many extra seconds, drawn uniformly per request
+            error_rate: Fraction of requests failed with HTTP 503
+            model: Model name reported by the server
+            seed: Seed for the jitter and error draws, for repeatable runs
+            responses: Replies to use instead of the agents' mock responses,
+                by prompt type ("developer", "router", ...)
+        """
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.token_rate = token_rate
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.model = model
+        self.responses = responses or {}
+        self.stats = {"requests": 0, "errors": 0, "completions": 0}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+    
+    @property
+    def url(self):
+        """Base URL of the OpenAI-compatible API, for LLM_STUDIO_API_URL."""
+        return f"http://{self.host}:{self.port}/v1"
+    
+    def start(self):
+        """Start serving in a background thread.
+        
+        Returns:
+            The server, for chaining
+        """
+        self._server = _Server((self.host, self.port), _Handler)
+        self._server.fake = self
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, name="fake-llm-server", daemon=True).start()
+        return self
+    
+    def stop(self):
+        """Stop serving."""
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+    
+    def response_for(self, system_prompt, user_prompt):
+        """Get the reply to a chat prompt."""
+        kind = mock_kind_for(system_prompt, user_prompt)
+        return self.responses.get(kind) or get_mock_response(kind)
+    
+    def delay(self, completion_tokens):
+        """Get the simulated time to answer with a number of tokens."""
+        generation = completion_tokens / self.token_rate if self.token_rate > 0 else 0.0
+        return self.latency + generation + self.uniform() * self.jitter
+    
+    def count(self, name):
+        """Increase a request counter and return its new value."""
+        with self._lock:
+            self.stats[name] += 1
+            return self.stats[name]
+    
+    def uniform(self):
+        """Draw a uniform random number in [0, 1)."""
+        with self._lock:
+            return self._random.random()
+
+def main():
+    parser = argparse.ArgumentParser(description="Run an OpenAI-compatible stub LLM server")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to listen on")
+    parser.add_argument("--port", type=int, default=1234, help="Port to listen on")
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds before the first token")
+    parser.add_argument("--token-rate", type=float, default=1000.0, help="Completion tokens per second")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Maximum extra random delay in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests failed with 503")
+    parser.add_argument("--seed", type=int, help="Random seed")
+    args = parser.parse_args()
+    
+    server = FakeLLMServer(
+        args.host, args.port, args.latency, args.token_rate, args.jitter, args.error_rate, seed=args.seed
+    ).start()
+    print(f"Fake LLM server listening on {server.url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+# benchmarks/run_benchmarks.py
+"""End-to-end benchmarks that run offline against a fake LLM server.
+
+Starts benchmarks/fake_llm_server.py, points the local backend at it and
+disables the other providers, then measures:
+
+    execute_task   TaskManager.execute_task latency, LLM calls included
+    execute_steps  execute_steps on a batch of file writes, patches and a command
+    server         /execute throughput of `main.py server` under concurrent load
+    startup        Wall time of `main.py --help` (import cost)
+
+Results are written as JSON with the git revision, and can be compared with
+an earlier run. LLM_* settings from the environment are passed through, so
+routing, hedging and retry options can be benchmarked against each other:
+
+    python benchmarks/run_benchmarks.py --iterations 20
+    LLM_HEDGING=true python benchmarks/run_benchmarks.py --compare benchmarks/results/baseline.json
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+MAIN = os.path.join(ROOT, "src", "main.py")
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+BENCHMARKS = ["execute_task", "execute_steps", "server", "startup"]
+TASK = "Write a Python function that validates email addresses"
+
+MODULE_SOURCE = '''VERSION = 1
+
+def handler(event):
+    return {"status": "ok", "version": VERSION, "event": event}
+'''
+
+# The mock developer plan creates a venv and installs packages with pip, which
+# needs the network and dwarfs everything else; benchmark a plan that only
+# writes files and runs them instead
+DEVELOPER_RESPONSE = json.dumps({"steps": [
+    {"action": "create_file", "path": "validator.py", "content": (
+        "import re\n\n"
+        "def is_valid_email(address):\n"
+        "    return re.fullmatch(r'[^@\\s]+@[^@\\s]+\\.[a-z]+', address) is not None\n"
+    )},
+    {"action": "create_file", "path": "check_validator.py", "content": (
+        "from validator import is_valid_email\n\n"
+        "assert is_valid_email('user@example.com')\n"
+        "assert not is_valid_email('not an email')\n"
+    )},
+    {"action": "patch_file", "path": "validator.py", "edits": [{"search": "[a-z]+", "replace": "[A-Za-z]+"}]},
+    {"action": "run_command", "command": f"{sys.executable} check_validator.py"}
+]})
+
+def free_port():
+    """Get a TCP port that is free right now."""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def configure_environment(llm_url, workdir):
+    """Point the agents at the fake server and keep their files in workdir.
+    
+    Must run before any module from src is imported, since they read their
+    configuration at import time.
+    """
+    os.environ.update({
+        "LLM_STUDIO_API_URL": llm_url,
+        "OPENAI_API_KEY": "",
+        "CLAUDE_API_KEY": "",
+        "USE_MOCK_RESPONSES": "false",
+        "AGENTS_DAEMON": "off",
+        "TRACE_DIR": "",
+        "LLM_TELEMETRY_LOG": os.path.join(workdir, "llm_calls.log"),
+        "SNAPSHOT_DIR": os.path.join(workdir, ".agent_snapshots")
+    })
+    sys.path.insert(0, os.path.join(ROOT, "src"))
+    sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+def summarize(samples, failures=0):
+    """Summarize latency samples in seconds."""
+    ordered = sorted(samples)
+    
+    def percentile(pct):
+        if not ordered:
+            return None
+        index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+        return round(ordered[index], 4)
+    
+    return {
+        "count": len(ordered),
+        "failures": failures,
+        "mean": round(sum(ordered) / len(ordered), 4) if ordered else None,
+        "p50": percentile(50),
+        "p90": percentile(90),
+        "p99": percentile(99),
+        "max": round(ordered[-1], 4) if ordered else None
+    }
+
+def bench_execute_task(args):
+    """Time TaskManager.execute_task end to end."""
+    from task_manager import TaskManager
+    
+    manager = TaskManager()
+    samples = []
+    failures = 0
+    for _ in range(args.iterations):
+        started = time.perf_counter()
+        result = manager.execute_task(TASK)
+        samples.append(time.perf_counter() - started)
+        failures += not result or "error" in result
+    return summarize(samples, failures)
+
+def bench_execute_steps(args):
+    """Time execute_steps on file creation, patching and a shell command."""
+    from main import execute_steps
+    
+    samples = []
+    failures = 0
+    for iteration in range(args.iterations):
+        steps = []
+        for index in range(args.files):
+            steps.append({
+                "action": "create_file",
+                "path": f"steps_{iteration}/module_{index}.py",
+                "content": MODULE_SOURCE
+            })
+        for index in range(args.files):
+            steps.append({
+                "action": "patch_file",
+                "path": f"steps_{iteration}/module_{index}.py",
+                "edits": [{"search": "VERSION = 1", "replace": "VERSION = 2"}]
+            })
+        steps.append({"action": "run_command", "command": "echo done"})
+        
+        started = time.perf_counter()
+        result = execute_steps(steps)
+        samples.append(time.perf_counter() - started)
+        failures += not result.get("success", True)
+    return summarize(samples, failures)
+
+def wait_for_server(url, process, timeout=30):
+    """Wait until the server answers /status, or raise RuntimeError."""
+    import requests
+    
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            if requests.get(f"{url}/status", timeout=1).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Server did not start within {timeout}s")
+
+def bench_server(args, workdir):
+    """Measure /execute latency and throughput under concurrent load."""
+    import requests
+    
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    process = subprocess.Popen(
+        [sys.executable, MAIN, "server", "--port", str(port)],
+        cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        wait_for_server(url, process)
+        
+        def send(_):
+            started = time.perf_counter()
+            try:
+                response = requests.post(f"{url}/execute", json={"task": TASK}, timeout=300)
+                ok = response.status_code == 200 and "error" not in response.json()
+            except requests.RequestException:
+                ok = False
+            return time.perf_counter() - started, ok
+        
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            results = list(pool.map(send, range(args.requests)))
+        wall = time.perf_counter() - started
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+    
+    summary = summarize([latency for latency, _ in results], sum(not ok for _, ok in results))
+    summary["concurrency"] = args.concurrency
+    summary["requests_per_second"] = round(len(results) / wall, 2)
+    return summary
+
+def bench_startup(args, workdir):
+    """Time how long the CLI takes to start and print its help."""
+    samples = []
+    failures = 0
+    for _ in range(args.iterations):
+        started = time.perf_counter()
+        completed = subprocess.run(
+            [sys.executable, MAIN, "--help"], cwd=workdir,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        samples.append(time.perf_counter() - started)
+        failures += completed.returncode != 0
+    return summarize(samples, failures)
+
+def git_revision():
+    """Get the short git revision of the tree, or None outside a checkout."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results, baseline_path):
+    """Print the change in each benchmark against a baseline results file."""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    print(f"\nCompared with {baseline_path} ({baseline.get('revision')})")
+    print(f"{'benchmark':<15} {'metric':<20} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name, current in results["benchmarks"].items():
+        previous = baseline.get("benchmarks", {}).get(name)
+        if not previous:
+            continue
+        for metric in ("p50", "p90", "p99", "requests_per_second"):
+            if current.get(metric) is None or not previous.get(metric):
+                continue
+            change = (current[metric] - previous[metric]) / previous[metric] * 100
+            print(f"{name:<15} {metric:<20} {previous[metric]:>10} {current[metric]:>10} {change:>+7.1f}%")
+
+def main():
+    parser = argparse.ArgumentParser(description="Run end-to-end benchmarks against a fake LLM server")
+    parser.add_argument("--only", nargs="+", choices=BENCHMARKS, default=BENCHMARKS, help="Benchmarks to run")
+    parser.add_argument("--iterations", type=int, default=10, help="Iterations per latency benchmark")
+    parser.add_argument("--files", type=int, default=20, help="Files written per execute_steps iteration")
+    parser.add_argument("--requests", type=int, default=40, help="Requests sent in the server benchmark")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent clients in the server benchmark")
+    parser.add_argument("--latency", type=float, default=0.05, help="Fake LLM seconds before the first token")
+    parser.add_argument("--token-rate", type=float, default=1000.0, help="Fake LLM completion tokens per second")
+    parser.add_argument("--jitter", type=float, default=0.02, help="Fake LLM maximum extra random delay")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of fake LLM requests failed with 503")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed for the fake LLM server")
+    parser.add_argument("--output", help="Results file (defaults to benchmarks/results/<time>-<revision>.json)")
+    parser.add_argument("--compare", help="Baseline results file to compare with")
+    args = parser.parse_args()
+    # The benchmarks run from a scratch directory
+    args.output = args.output and os.path.abspath(args.output)
+    args.compare = args.compare and os.path.abspath(args.compare)
+    
+    workdir = tempfile.mkdtemp(prefix="agents-bench-")
+    port = free_port()
+    configure_environment(f"http://127.0.0.1:{port}/v1", workdir)
+    from fake_llm_server import FakeLLMServer
+    
+    server = FakeLLMServer(
+        port=port, latency=args.latency, token_rate=args.token_rate,
+        jitter=args.jitter, error_rate=args.error_rate, seed=args.seed,
+        responses={"developer": DEVELOPER_RESPONSE}
+    ).start()
+    os.chdir(workdir)
+    
+    results = {
+        "revision": git_revision(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "settings": {key: value for key, value in sorted(vars(args).items()) if key not in ("output", "compare", "only")},
+        "environment": {key: value for key, value in sorted(os.environ.items()) if key.startswith(("LLM_", "TASK_"))},
+        "benchmarks": {}
+    }
+    try:
+        for name in BENCHMARKS:
+            if name not in args.only:
+                continue
+            print(f"Running {name}...")
+            if name == "execute_task":
+                results["benchmarks"][name] = bench_execute_task(args)
+            elif name == "execute_steps":
+                results["benchmarks"][name] = bench_execute_steps(args)
+            elif name == "server":
+                results["benchmarks"][name] = bench_server(args, workdir)
+            elif name == "startup":
+                results["benchmarks"][name] = bench_startup(args, workdir)
+    finally:
+        server.stop()
+    results["fake_llm"] = server.stats
+    
+    print(f"\n{'benchmark':<15} {'count':>6} {'fail':>5} {'p50':>8} {'p90':>8} {'p99':>8} {'req/s':>8}")
+    for name, summary in results["benchmarks"].items():
+        print(
+            f"{name:<15} {summary['count']:>6} {summary['failures']:>5} {summary['p50']:>8} {summary['p90']:>8}"
+            f" {summary['p99']:>8} {summary.get('requests_per_second', '-'):>8}"
+        )
+    
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        output = os.path.join(RESULTS_DIR, f"{stamp}-{results['revision'] or 'unknown'}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+    
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == "__main__":
+    main()
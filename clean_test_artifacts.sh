@@ -32,6 +32,12 @@ for file in "${TEST_ARTIFACTS[@]}"; do
     fi
 done
 
+# Remove file snapshots taken for rollback
+if [ -d ".agent_snapshots" ]; then
+    echo -e "${YELLOW}Removing:${NC} .agent_snapshots/"
+    rm -rf .agent_snapshots
+fi
+
 # Clean __pycache__ directories
 echo -e "\n${YELLOW}Cleaning Python cache files...${NC}"
 find . -type d -name __pycache__ -exec rm -rf {} +
@@ -1,6 +1,7 @@
 # src/agents.py
-from llm_client import ask_llm, extract_json
+from llm_client import ask_llm, ask_json
 from instructions_parser import parse_instructions
+from tracing import traced
 from prompts import (
     DEVELOPER_SYSTEM_PROMPT, 
     DEVELOPER_USER_PROMPT, 
@@ -10,11 +11,10 @@ from prompts import (
     CODE_GENERATION_SYSTEM_PROMPT,
     CURSOR_INTEGRATION_SYSTEM_PROMPT
 )
-from cursor_integration import CursorIntegration
-
-# Initialize cursor integration
-cursor = CursorIntegration()
+from schemas import STEPS_SCHEMA, CURSOR_ACTIONS_SCHEMA
+from cursor_integration import get_cursor
 
+@traced("agent.developer")
 def get_developer_instructions(custom_prompt=None, complexity="medium"):
     """Get instructions from the developer agent.
     
@@ -26,12 +26,12 @@ def get_developer_instructions(custom_prompt=None, complexity="medium"):
         List of parsed instructions
     """
     user_prompt = custom_prompt or DEVELOPER_USER_PROMPT
-    response = ask_llm(DEVELOPER_SYSTEM_PROMPT, user_prompt, task_complexity=complexity)
-    data = extract_json(response)
+    data = ask_json(DEVELOPER_SYSTEM_PROMPT, user_prompt, STEPS_SCHEMA, task_complexity=complexity, agent="developer")
     if data:
         return parse_instructions(data)
     return []
 
+@traced("agent.tester")
 def get_tester_instructions(custom_prompt=None, complexity="low"):
     """Get instructions from the tester agent.
     
@@ -43,12 +43,12 @@ def get_tester_instructions(custom_prompt=None, complexity="low"):
         List of parsed instructions
     """
     user_prompt = custom_prompt or TESTER_USER_PROMPT
-    response = ask_llm(TESTER_SYSTEM_PROMPT, user_prompt, task_complexity=complexity)
-    data = extract_json(response)
+    data = ask_json(TESTER_SYSTEM_PROMPT, user_prompt, STEPS_SCHEMA, task_complexity=complexity, agent="tester")
     if data:
         return parse_instructions(data)
     return []
 
+@traced("agent.debugger")
 def get_debugger_instructions(error_msg, complexity="medium"):
     """Get instructions from the debugger agent.
     
@@ -59,16 +59,18 @@ def get_debugger_instructions(error_msg, complexity="medium"):
     Returns:
         List of parsed instructions
     """
-    response = ask_llm(
+    data = ask_json(
         DEBUGGER_SYSTEM_PROMPT, 
         f"Error encountered:\n{error_msg}\nFix the code. Return JSON steps only.",
-        task_complexity=complexity
+        STEPS_SCHEMA,
+        task_complexity=complexity,
+        agent="debugger"
     )
-    data = extract_json(response)
     if data:
         return parse_instructions(data)
     return []
 
+@traced("agent.code_generation")
 def generate_code(description, file_path=None, language="python", complexity="high"):
     """Generate code based on description.
     
@@ -81,13 +83,12 @@ def generate_code(description, file_path=None, language="python", complexity="hi
     Returns:
         Generated code
     """
-    system_prompt = CODE_GENERATION_SYSTEM_PROMPT.format(language=language)
-    user_prompt = f"Generate code for: {description}"
+    user_prompt = f"Language: {language}\nGenerate code for: {description}"
     
     if file_path:
         user_prompt += f"\nThe code will be saved to {file_path}."
         
-    response = ask_llm(system_prompt, user_prompt, task_complexity=complexity)
+    response = ask_llm(CODE_GENERATION_SYSTEM_PROMPT, user_prompt, task_complexity=complexity, agent="code_generation")
     
     # Extract code from markdown code blocks if present
     import re
@@ -100,10 +101,11 @@ def generate_code(description, file_path=None, language="python", complexity="hi
         code = response
         
     if file_path:
-        cursor.create_file_direct(file_path, code)
+        get_cursor().create_file_direct(file_path, code)
         
     return code
 
+@traced("agent.cursor")
 def execute_cursor_commands(instructions, complexity="medium"):
     """Execute instructions in Cursor IDE.
     
@@ -114,16 +116,19 @@ def execute_cursor_commands(instructions, complexity="medium"):
     Returns:
         Response from execution
     """
+    cursor = get_cursor()
+    
     # Create a terminal if we don't have one already
     terminal_id = cursor.create_terminal()
     
-    response = ask_llm(
+    data = ask_json(
         CURSOR_INTEGRATION_SYSTEM_PROMPT, 
         instructions,
-        task_complexity=complexity
+        CURSOR_ACTIONS_SCHEMA,
+        task_complexity=complexity,
+        agent="cursor"
     )
     
-    data = extract_json(response)
     if not data or "actions" not in data:
         return {"success": False, "message": "Could not parse instructions"}
         
@@ -150,6 +155,11 @@ def execute_cursor_commands(instructions, complexity="medium"):
             success = cursor.modify_file(file_path, content)
             results.append({"type": "modify_file", "path": file_path, "success": success})
             
+        elif action_type == "patch_file":
+            file_path = action.get("path")
+            success = cursor.patch_file(file_path, diff=action.get("diff"), edits=action.get("edits"))
+            results.append({"type": "patch_file", "path": file_path, "success": success})
+            
         elif action_type == "run_terminal":
             command = action.get("command")
             if terminal_id:
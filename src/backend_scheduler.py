@@ -0,0 +1,214 @@
+# src/backend_scheduler.py
+import os
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+ADAPTIVE_ROUTING = os.getenv("LLM_ADAPTIVE_ROUTING", "false").lower() == "true"
+HEALTH_PROBE_INTERVAL = float(os.getenv("LLM_HEALTH_PROBE_INTERVAL", "30"))
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("LLM_CIRCUIT_FAILURE_THRESHOLD", "3"))
+CIRCUIT_COOLDOWN = float(os.getenv("LLM_CIRCUIT_COOLDOWN", "30"))
+
+# Backends allowed for each task complexity, in order of preference
+COMPLEXITY_TIERS = {
+    "low": ("local", "openai"),
+    "medium": ("openai", "local"),
+    "high": ("claude", "openai")
+}
+
+# Weight of the newest sample in the moving averages
+EWMA_ALPHA = 0.3
+# Number of recent latencies kept per backend for percentiles
+LATENCY_WINDOW = 200
+
+class BackendScheduler:
+    """Tracks backend latency, errors and load, and picks backends from them.
+    
+    Each backend has a circuit breaker: after CIRCUIT_FAILURE_THRESHOLD
+    consecutive failures it is skipped for CIRCUIT_COOLDOWN seconds, then a
+    single trial call is let through to decide whether to close it again.
+    """
+    
+    def __init__(self):
+        """Initialize the scheduler with no observations."""
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._probe_thread = None
+    
+    def _backend(self, backend):
+        """Get the mutable stats of a backend (call with the lock held)."""
+        if backend not in self._stats:
+            self._stats[backend] = {
+                "latency_ewma": None,
+                "error_rate": 0.0,
+                "in_flight": 0,
+                "calls": 0,
+                "consecutive_failures": 0,
+                "open_until": 0.0,
+                "trial_in_flight": False,
+                "healthy": True,
+                "latencies": deque(maxlen=LATENCY_WINDOW)
+            }
+        return self._stats[backend]
+    
+    def observe(self, backend, latency, success):
+        """Record the outcome of one call to a backend.
+        
+        Args:
+            backend: Backend name
+            latency: Call latency in seconds
+            success: Whether the call succeeded
+        """
+        with self._lock:
+            stats = self._backend(backend)
+            stats["calls"] += 1
+            stats["error_rate"] += EWMA_ALPHA * ((0.0 if success else 1.0) - stats["error_rate"])
+            stats["trial_in_flight"] = False
+            if success:
+                stats["latencies"].append(latency)
+                if stats["latency_ewma"] is None:
+                    stats["latency_ewma"] = latency
+                else:
+                    stats["latency_ewma"] += EWMA_ALPHA * (latency - stats["latency_ewma"])
+                stats["consecutive_failures"] = 0
+                stats["open_until"] = 0.0
+            else:
+                stats["consecutive_failures"] += 1
+                if stats["consecutive_failures"] >= CIRCUIT_FAILURE_THRESHOLD:
+                    stats["open_until"] = time.monotonic() + CIRCUIT_COOLDOWN
+    
+    def set_health(self, backend, healthy):
+        """Record the result of a health probe.
+        
+        Args:
+            backend: Backend name
+            healthy: Whether the probe succeeded
+        """
+        with self._lock:
+            stats = self._backend(backend)
+            stats["healthy"] = healthy
+            if not healthy:
+                stats["open_until"] = time.monotonic() + CIRCUIT_COOLDOWN
+    
+    @contextmanager
+    def track(self, backend):
+        """Count a call as in flight on a backend for the duration of a block.
+        
+        A call that a half-open circuit let through as its trial ends with
+        the block, however it ends. If it failed before reaching the backend
+        (for example on its deadline) nothing was observed, and the next call
+        is let through as the trial instead.
+        """
+        with self._lock:
+            self._backend(backend)["in_flight"] += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                stats = self._backend(backend)
+                stats["in_flight"] -= 1
+                stats["trial_in_flight"] = False
+    
+    def choose(self, complexity, available, prefer=None, tier=None):
+        """Pick the fastest healthy backend allowed for a complexity tier.
+        
+        Backends are scored by their latency average scaled by their current
+        load and error rate. Backends without observations yet score best, so
+        each one gets tried. Ties keep the tier's order of preference.
+        
+        Args:
+            complexity: "low", "medium" or "high"
+            available: Backends that are configured (e.g. have API keys)
+            prefer: Backend to move to the front of the tier's order
+            tier: Backends allowed, in order of preference (defaults to the
+                complexity's entry in COMPLEXITY_TIERS)
+        
+        Returns:
+            Backend name
+        """
+        self.start_health_probe()
+        tier = list(tier or COMPLEXITY_TIERS.get(complexity, COMPLEXITY_TIERS["medium"]))
+        if prefer in tier:
+            tier.remove(prefer)
+            tier.insert(0, prefer)
+        candidates = [backend for backend in tier if backend in available] or tier
+        
+        now = time.monotonic()
+        with self._lock:
+            scored = []
+            for order, backend in enumerate(candidates):
+                stats = self._backend(backend)
+                if stats["open_until"] > now or (stats["open_until"] and stats["trial_in_flight"]):
+                    continue
+                latency = stats["latency_ewma"] or 0.0
+                score = latency * (1 + stats["in_flight"]) * (1 + 4 * stats["error_rate"])
+                scored.append((score, order, backend))
+            if not scored:
+                # Every circuit is open: fall back to the tier's first choice
+                return candidates[0]
+            _, _, backend = min(scored)
+            stats = self._backend(backend)
+            if stats["open_until"]:
+                # Half-open: this call decides whether the circuit closes
+                stats["trial_in_flight"] = True
+            return backend
+    
+    def latency_percentile(self, backend, percentile):
+        """Get a percentile of a backend's recent successful call latencies.
+        
+        Args:
+            backend: Backend name
+            percentile: Percentile between 0 and 100
+        
+        Returns:
+            Latency in seconds, or None without observations
+        """
+        with self._lock:
+            latencies = sorted(self._backend(backend)["latencies"])
+        if not latencies:
+            return None
+        index = min(len(latencies) - 1, int(round(percentile / 100 * (len(latencies) - 1))))
+        return latencies[index]
+    
+    def status(self):
+        """Get a snapshot of every backend's scheduling state.
+        
+        Returns:
+            Dictionary keyed by backend name
+        """
+        now = time.monotonic()
+        with self._lock:
+            return {
+                backend: {
+                    "latency_ewma": round(stats["latency_ewma"], 4) if stats["latency_ewma"] is not None else None,
+                    "error_rate": round(stats["error_rate"], 4),
+                    "in_flight": stats["in_flight"],
+                    "calls": stats["calls"],
+                    "healthy": stats["healthy"],
+                    "circuit": "open" if stats["open_until"] > now else ("half-open" if stats["open_until"] else "closed")
+                }
+                for backend, stats in self._stats.items()
+            }
+    
+    def start_health_probe(self):
+        """Start probing local model servers' health in a background thread, once."""
+        if self._probe_thread is not None or HEALTH_PROBE_INTERVAL <= 0:
+            return
+        with self._lock:
+            if self._probe_thread is not None:
+                return
+            self._probe_thread = threading.Thread(target=self._probe_loop, name="llm-health-probe", daemon=True)
+        self._probe_thread.start()
+    
+    def _probe_loop(self):
+        """Probe the local backends every HEALTH_PROBE_INTERVAL seconds."""
+        from llm_client import USE_MOCK
+        from llm_backends import local_backends
+        while True:
+            for backend in local_backends():
+                healthy, _ = (True, None) if USE_MOCK else backend.health()
+                self.set_health(backend.name, healthy)
+            time.sleep(HEALTH_PROBE_INTERVAL)
+
+scheduler = BackendScheduler()
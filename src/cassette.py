@@ -0,0 +1,127 @@
+# src/cassette.py
+import os
+import gzip
+import json
+import time
+import atexit
+import hashlib
+import threading
+
+# "record" appends every successful LLM reply to the cassette, "replay"
+# answers from it instead of calling any backend
+CASSETTE_MODE = os.getenv("LLM_CASSETTE_MODE", "off").lower()
+CASSETTE_PATH = os.path.abspath(os.getenv("LLM_CASSETTE", "llm_cassette.jsonl.gz"))
+# "zero" replays instantly, "original" waits as long as the recorded call took
+REPLAY_LATENCY = os.getenv("LLM_REPLAY_LATENCY", "zero").lower()
+
+class CassetteMiss(Exception):
+    """Raised when a replayed request has no recorded reply."""
+
+class Cassette:
+    """Gzipped JSON lines file of recorded LLM requests and replies.
+    
+    Replies are looked up by their system prompt, user prompt and schema, not
+    by backend, so a replay does not depend on routing. A prompt recorded
+    several times is answered with its recordings in order, and with the last
+    one after that.
+    """
+    
+    def __init__(self, path):
+        """Initialize a cassette.
+        
+        Args:
+            path: Cassette file path
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+        self._entries = None
+        self._served = {}
+    
+    @staticmethod
+    def key(system_prompt, user_prompt, json_schema=None):
+        """Get the lookup key of a request."""
+        schema_name = json_schema["title"] if json_schema else None
+        request = json.dumps([system_prompt, user_prompt, schema_name])
+        return hashlib.sha256(request.encode("utf-8")).hexdigest()
+    
+    def record(self, system_prompt, user_prompt, json_schema, response, backend, model, latency):
+        """Append a request and its reply to the cassette.
+        
+        Args:
+            system_prompt: The system instructions
+            user_prompt: The user query
+            json_schema: Schema the reply was constrained to, or None
+            response: Reply text
+            backend: Backend that answered
+            model: Model that answered
+            latency: Call latency in seconds
+        """
+        entry = {
+            "key": self.key(system_prompt, user_prompt, json_schema),
+            "ts": time.time(),
+            "backend": backend,
+            "model": model,
+            "latency": round(latency, 4),
+            "schema": json_schema["title"] if json_schema else None,
+            "system_prompt": system_prompt,
+            "user_prompt": user_prompt,
+            "response": response
+        }
+        with self._lock:
+            try:
+                if self._file is None:
+                    os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                    self._file = gzip.open(self.path, "at", encoding="utf-8")
+                    atexit.register(self.close)
+                self._file.write(json.dumps(entry) + "\n")
+                # Flush each entry so a crashed run keeps what it recorded
+                self._file.flush()
+            except OSError as e:
+                print(f"Could not write to LLM cassette {self.path}: {str(e)}")
+    
+    def replay(self, system_prompt, user_prompt, json_schema=None):
+        """Get the next recorded reply to a request.
+        
+        Args:
+            system_prompt: The system instructions
+            user_prompt: The user query
+            json_schema: Schema the reply is constrained to, or None
+        
+        Returns:
+            The recorded entry, or None if the request was not recorded
+        """
+        key = self.key(system_prompt, user_prompt, json_schema)
+        with self._lock:
+            if self._entries is None:
+                self._entries = self._load()
+            recordings = self._entries.get(key)
+            if not recordings:
+                return None
+            served = self._served.get(key, 0)
+            self._served[key] = served + 1
+            return recordings[min(served, len(recordings) - 1)]
+    
+    def close(self):
+        """Close the cassette file if it is open for recording."""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+    
+    def _load(self):
+        """Read all recordings, grouped by key (call with the lock held)."""
+        entries = {}
+        try:
+            with gzip.open(self.path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    entry = json.loads(line)
+                    entries.setdefault(entry["key"], []).append(entry)
+        except FileNotFoundError:
+            print(f"LLM cassette {self.path} not found; nothing to replay")
+        except (OSError, EOFError, json.JSONDecodeError) as e:
+            # A run that was killed while recording leaves a truncated last entry
+            print(f"LLM cassette {self.path} is truncated, replaying what could be read: {str(e)}")
+        return entries
+
+cassette = Cassette(CASSETTE_PATH)
@@ -0,0 +1,176 @@
+# src/checkpoint.py
+import os
+import json
+import time
+import threading
+
+# Save a checkpoint after every completed step of a task's plan, so an
+# interrupted task can be resumed with "resume <task-id>"
+CHECKPOINTS = os.getenv("TASK_CHECKPOINTS", "false").lower() == "true"
+CHECKPOINT_DIR = os.path.expanduser(os.getenv("CHECKPOINT_DIR", "~/.agents-cli/checkpoints"))
+
+class Checkpoint:
+    """Progress of a task's plan, saved after every completed step.
+    
+    Steps run in order and a plan stops at its first failed step, so the
+    completed steps are always the first last_completed + 1 of the plan.
+    File writes are buffered by write_batch and only count as completed once
+    they have been flushed to disk.
+    """
+    
+    def __init__(self, data):
+        """Initialize a checkpoint.
+        
+        Args:
+            data: Checkpoint dictionary, as saved
+        """
+        self.data = data
+        self._unflushed = []
+        self._lock = threading.Lock()
+    
+    @property
+    def task_id(self):
+        """ID of the checkpointed task."""
+        return self.data["task_id"]
+    
+    @property
+    def next_step(self):
+        """Index of the first step that has not completed."""
+        return self.data["last_completed"] + 1
+    
+    def remaining_steps(self):
+        """Get the steps that have not completed yet."""
+        return self.data["steps"][self.next_step:]
+    
+    def background_steps(self):
+        """Get the completed steps whose background processes should be running.
+        
+        Returns:
+            Background run_command steps completed after the last kill_process
+        """
+        steps = []
+        for step in self.data["steps"][:self.next_step]:
+            if step.get("action") == "kill_process":
+                steps = []
+            elif step.get("action") == "run_command" and step.get("background"):
+                steps.append(step)
+        return steps
+    
+    def step_done(self, index, result, flushed=True):
+        """Record a completed step.
+        
+        Args:
+            index: Index of the step in the plan
+            result: Step result
+            flushed: False for a file write still buffered by write_batch
+        """
+        with self._lock:
+            self._unflushed.append((index, result))
+            if flushed:
+                self._commit()
+    
+    def flushed(self):
+        """Record that every buffered file write has reached the disk."""
+        with self._lock:
+            if self._unflushed:
+                self._commit()
+    
+    def finish(self, success):
+        """Record the end of the plan.
+        
+        The checkpoint of a plan that succeeded is deleted, since there is
+        nothing left to resume; a failed one is kept.
+        
+        Args:
+            success: Whether every step succeeded
+        """
+        with self._lock:
+            if success:
+                self._delete()
+                return
+            self.data["status"] = "failed"
+            self._save()
+    
+    def _commit(self):
+        """Save the recorded steps as completed (call with the lock held)."""
+        for index, result in self._unflushed:
+            self.data["last_completed"] = index
+            self.data["results"].append(result)
+        self._unflushed = []
+        self._save()
+    
+    def _save(self):
+        """Write the checkpoint file atomically (call with the lock held)."""
+        self.data["updated"] = time.time()
+        path = checkpoint_path(self.task_id)
+        try:
+            os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(self.data, f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(path + ".tmp", path)
+        except OSError as e:
+            print(f"Could not save checkpoint {path}: {str(e)}")
+
+    def _delete(self):
+        """Delete the checkpoint file (call with the lock held)."""
+        try:
+            os.remove(checkpoint_path(self.task_id))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"Could not delete checkpoint {checkpoint_path(self.task_id)}: {str(e)}")
+
+def checkpoint_path(task_id):
+    """Get the file path of a task's checkpoint."""
+    return os.path.join(CHECKPOINT_DIR, f"{task_id}.json")
+
+def start_checkpoint(task_id, steps, task=None):
+    """Start checkpointing a task's plan.
+    
+    Args:
+        task_id: Task ID (the task's trace ID)
+        steps: The plan's steps
+        task: Task description, for reference
+    
+    Returns:
+        Checkpoint, or None if checkpoints are disabled or there is no task ID
+    """
+    if not CHECKPOINTS or not task_id or not steps:
+        return None
+    checkpoint = Checkpoint({
+        "task_id": task_id,
+        "task": task,
+        "cwd": os.getcwd(),
+        "steps": steps,
+        "last_completed": -1,
+        "results": [],
+        "status": "running",
+        "created": time.time()
+    })
+    with checkpoint._lock:
+        checkpoint._save()
+    print(f"Checkpointing task {task_id}; resume it with: python src/main.py resume {task_id}")
+    return checkpoint
+
+def load_checkpoint(task_id):
+    """Load a task's checkpoint.
+    
+    Args:
+        task_id: Task ID
+    
+    Returns:
+        Checkpoint, or None if there is none
+    """
+    # Task IDs are trace IDs; refuse anything that could leave CHECKPOINT_DIR
+    if not task_id or os.path.basename(task_id) != task_id:
+        return None
+    try:
+        with open(checkpoint_path(task_id), "r", encoding="utf-8") as f:
+            return Checkpoint(json.load(f))
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        print(f"Could not read checkpoint for task {task_id}: {str(e)}")
+        return None
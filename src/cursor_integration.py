@@ -1,9 +1,31 @@
 import os
 import json
-import requests
 import subprocess
+import threading
 from pathlib import Path
 from urllib.parse import urljoin
+from file_manager import apply_patch, create_file
+
+_shared = None
+_shared_lock = threading.Lock()
+
+def get_cursor():
+    """Get the process-wide CursorIntegration, creating it on first use.
+    
+    Returns:
+        Shared CursorIntegration instance
+    """
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = CursorIntegration()
+        return _shared
+
+def reset_cursor():
+    """Drop the shared CursorIntegration so the next one uses the current cwd."""
+    global _shared
+    with _shared_lock:
+        _shared = None
 
 class CursorIntegration:
     """Integration with Cursor IDE for managing files, terminals, and IDE features."""
@@ -47,6 +69,7 @@ class CursorIntegration:
                 return {"success": True}
         
         # Real API request
+        import requests
         url = urljoin(self.api_url, endpoint)
         try:
             if method == "GET":
@@ -157,6 +180,39 @@ class CursorIntegration:
             data={"path": file_path, "content": content}
         ) is not None
         
+    def patch_file(self, file_path, diff=None, edits=None):
+        """Patch a file in Cursor with a unified diff or search/replace edits.
+        
+        The patch is applied locally against the file on disk, and the
+        result is sent to Cursor only if every hunk applies.
+        
+        Args:
+            file_path: Path to the file to patch
+            diff: Unified diff, or SEARCH/REPLACE blocks, as a string
+            edits: List of {"search": ..., "replace": ...} dictionaries
+            
+        Returns:
+            True if successful, False otherwise
+        """
+        if not os.path.isabs(file_path):
+            file_path = os.path.join(self.workspace_path, file_path)
+            
+        try:
+            with open(file_path, "r", encoding="utf-8") as f:
+                content = f.read()
+        except FileNotFoundError:
+            content = ""
+        except Exception as e:
+            print(f"Error reading file: {str(e)}")
+            return False
+            
+        success, result = apply_patch(content, diff=diff, edits=edits)
+        if not success:
+            print(f"Patch for {file_path} does not apply: {result}")
+            return False
+            
+        return self.modify_file(file_path, result)
+        
     def run_shell_command_in_os(self, command, cwd=None, capture_output=True):
         """Run a shell command directly in the OS.
         
@@ -204,22 +260,11 @@ class CursorIntegration:
         Returns:
             True if successful, False otherwise
         """
-        try:
-            # If file_path is relative, make it absolute
-            if not os.path.isabs(file_path):
-                file_path = os.path.join(self.workspace_path, file_path)
-                
-            # Ensure the directory exists
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        # If file_path is relative, make it absolute
+        if not os.path.isabs(file_path):
+            file_path = os.path.join(self.workspace_path, file_path)
             
-            # Write the file
-            with open(file_path, "w") as f:
-                f.write(content)
-                
-            return True
-        except Exception as e:
-            print(f"Error creating file: {str(e)}")
-            return False
+        return create_file(file_path, content)
             
     def open_cursor_ide(self, workspace_path=None):
         """Open the Cursor IDE with a specific workspace.
@@ -0,0 +1,320 @@
+# src/daemon.py
+import io
+import os
+import sys
+import json
+import time
+import signal
+import socket
+import traceback
+from contextlib import redirect_stdout, redirect_stderr
+from pathlib import Path
+
+DAEMON_SOCKET = os.getenv(
+    "AGENTS_DAEMON_SOCKET",
+    os.path.join(os.path.expanduser("~"), ".agents-cli", "daemon.sock")
+)
+# "auto" forwards commands to a running daemon, "off" always runs in-process
+DAEMON_MODE = os.getenv("AGENTS_DAEMON", "auto").lower()
+# Worker processes serving commands; each runs one command at a time and
+# keeps the clients and caches it builds for the commands after it
+DAEMON_WORKERS = max(int(os.getenv("AGENTS_DAEMON_WORKERS", "4")), 1)
+
+SHUTDOWN_COMMAND = "__shutdown__"
+
+# Variables read once, when the agent's modules are imported or its clients
+# built. A command whose settings differ from the daemon's runs in-process;
+# any other variable (PATH, HOME, ...) is simply applied to the command
+SETTING_NAMES = (
+    "CLAUDE_API_KEY", "CURSOR_API_URL", "DEFAULT_LOCAL_MODEL", "DEFAULT_COMPLEXITY",
+    "DEFAULT_LANGUAGE", "FSYNC_WRITES", "ROLLBACK_ON_FAILURE", "SNAPSHOT_DIR",
+    "CHECKPOINT_DIR", "PROJECT_WORKFLOW", "TRACE_DIR", "USE_MOCK_RESPONSES"
+)
+SETTING_PREFIXES = ("LLM_", "STEP_", "TASK_", "WORKFLOW_", "OPENAI_", "ANTHROPIC_")
+
+class _SocketWriter(io.TextIOBase):
+    """Text stream that forwards writes to the client as JSON lines."""
+    
+    def __init__(self, conn, stream):
+        self.conn = conn
+        self.stream = stream
+        self.closed_by_client = False
+    
+    def writable(self):
+        return True
+    
+    def write(self, text):
+        if text and not self.closed_by_client:
+            try:
+                _send(self.conn, {"stream": self.stream, "data": text})
+            except OSError:
+                # The client went away; keep running but stop streaming
+                self.closed_by_client = True
+        return len(text)
+
+class _Worker:
+    """A process that serves forwarded CLI invocations, one at a time.
+    
+    Workers are forked from the daemon after it has warmed up, and run each
+    command in their own process, so a command can change the working
+    directory, environment and stdout without affecting the others. What a
+    command loads or caches stays in its worker for the next command.
+    """
+    
+    def __init__(self, listener, run_argv, env):
+        """Initialize a worker.
+        
+        Args:
+            listener: Listening socket shared by all workers
+            run_argv: Callable that runs the CLI for a list of arguments
+            env: The daemon's environment, restored after every command
+        """
+        self.listener = listener
+        self.run_argv = run_argv
+        self.env = env
+        self.cwd = os.getcwd()
+        self.stopping = False
+    
+    def serve(self):
+        """Accept and run commands until the daemon stops the worker."""
+        def stop(signum, frame):
+            self.stopping = True
+        signal.signal(signal.SIGTERM, stop)
+        # Ctrl-C reaches the whole process group; the daemon stops its workers
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        
+        while not self.stopping:
+            try:
+                conn, _ = self.listener.accept()
+            except (socket.timeout, InterruptedError):
+                continue
+            with conn:
+                try:
+                    self.handle(conn)
+                except OSError:
+                    pass
+    
+    def handle(self, conn):
+        """Run one forwarded CLI invocation and stream its output back."""
+        with conn.makefile("r", encoding="utf-8") as requests:
+            line = requests.readline()
+        if not line:
+            return
+        try:
+            request = json.loads(line)
+        except json.JSONDecodeError:
+            _send(conn, {"exit": 2, "error": "Malformed request"})
+            return
+        
+        argv = request.get("argv", [])
+        if argv == [SHUTDOWN_COMMAND]:
+            _send(conn, {"exit": 0})
+            os.kill(os.getppid(), signal.SIGTERM)
+            return
+        
+        env = request.get("env")
+        if env is not None and _settings(env) != _settings(self.env):
+            # Settings are read once at import, so the warm modules would
+            # ignore the caller's; let the caller run the command itself
+            _send(conn, {"exit": None, "error": "settings differ from the daemon's"})
+            return
+        
+        exit_code = 0
+        stdout = _SocketWriter(conn, "stdout")
+        stderr = _SocketWriter(conn, "stderr")
+        try:
+            if env is not None:
+                # Commands started by the steps inherit the caller's environment
+                _replace_environ(env)
+            os.chdir(request.get("cwd") or self.cwd)
+            with redirect_stdout(stdout), redirect_stderr(stderr):
+                self.run_argv(argv)
+        except SystemExit as e:
+            exit_code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+        except Exception:
+            stderr.write(traceback.format_exc())
+            exit_code = 1
+        finally:
+            _replace_environ(self.env)
+            os.chdir(self.cwd)
+        
+        try:
+            _send(conn, {"exit": exit_code})
+        except OSError:
+            pass
+
+def run_daemon(run_argv, socket_path=DAEMON_SOCKET, warm_up=None):
+    """Serve CLI invocations over a Unix domain socket until stopped.
+    
+    Args:
+        run_argv: Callable that runs the CLI for a list of arguments
+        socket_path: Path of the Unix domain socket
+        warm_up: Optional callable run once before serving, to build clients
+            and load caches ahead of the first request
+    """
+    if not hasattr(socket, "AF_UNIX"):
+        print("The daemon needs Unix domain sockets, which this platform does not support.")
+        return
+    
+    Path(socket_path).parent.mkdir(parents=True, exist_ok=True)
+    if os.path.exists(socket_path):
+        if _ping(socket_path):
+            print(f"A daemon is already listening on {socket_path}")
+            return
+        # Left behind by a daemon that did not shut down cleanly
+        os.remove(socket_path)
+    
+    if warm_up:
+        warm_up()
+    
+    listener = _listen(socket_path)
+    env = dict(os.environ)
+    workers = set()
+    stopping = []
+    
+    def stop(signum, frame):
+        stopping.append(signum)
+    signal.signal(signal.SIGTERM, stop)
+    
+    print(f"Daemon listening on {socket_path} with {DAEMON_WORKERS} workers")
+    try:
+        while not stopping:
+            while len(workers) < DAEMON_WORKERS:
+                workers.add(_start_worker(listener, run_argv, env))
+            time.sleep(0.5)
+            workers -= _reap(workers)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        # Workers finish the command they are running before they exit
+        for pid in workers:
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+        listener.close()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        print("Daemon stopped.")
+
+def forward_to_daemon(argv, socket_path=DAEMON_SOCKET):
+    """Run a CLI invocation in the daemon, streaming its output here.
+    
+    Args:
+        argv: Command-line arguments to forward
+        socket_path: Path of the daemon's Unix domain socket
+    
+    Returns:
+        The command's exit code, or None if no daemon is reachable, or our
+        settings differ from its own, and the command should run in-process
+        instead
+    """
+    if DAEMON_MODE == "off":
+        return None
+    return _forward(argv, socket_path)
+
+def stop_daemon(socket_path=DAEMON_SOCKET):
+    """Ask a running daemon to shut down.
+    
+    Args:
+        socket_path: Path of the daemon's Unix domain socket
+    
+    Returns:
+        True if a daemon was stopped, False otherwise
+    """
+    return _forward([SHUTDOWN_COMMAND], socket_path) == 0
+
+def _listen(socket_path):
+    """Create the daemon's listening socket, accessible to its owner only."""
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    # Created with mode 0o600 by bind, so other users never get to connect
+    umask = os.umask(0o177)
+    try:
+        listener.bind(socket_path)
+    finally:
+        os.umask(umask)
+    listener.listen(16)
+    # Workers wake up regularly to notice that they should stop
+    listener.settimeout(0.5)
+    return listener
+
+def _start_worker(listener, run_argv, env):
+    """Fork a worker process serving commands from the listening socket."""
+    pid = os.fork()
+    if pid:
+        return pid
+    try:
+        _Worker(listener, run_argv, env).serve()
+    finally:
+        os._exit(0)
+
+def _reap(workers):
+    """Get the workers that have exited, collecting their exit status."""
+    exited = set()
+    for pid in workers:
+        try:
+            if os.waitpid(pid, os.WNOHANG)[0]:
+                exited.add(pid)
+        except ChildProcessError:
+            exited.add(pid)
+    return exited
+
+def _forward(argv, socket_path):
+    """Send an invocation to the daemon and relay its output."""
+    if not hasattr(socket, "AF_UNIX") or not os.path.exists(socket_path):
+        return None
+    
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        conn.connect(socket_path)
+    except OSError:
+        conn.close()
+        return None
+    
+    with conn, conn.makefile("r", encoding="utf-8") as replies:
+        _send(conn, {"argv": argv, "cwd": os.getcwd(), "env": dict(os.environ)})
+        for line in replies:
+            message = json.loads(line)
+            if "exit" in message:
+                if message["exit"] is None:
+                    return None
+                if message.get("error"):
+                    print(message["error"], file=sys.stderr)
+                return message["exit"]
+            stream = sys.stderr if message.get("stream") == "stderr" else sys.stdout
+            stream.write(message.get("data", ""))
+            stream.flush()
+    print("Daemon closed the connection before the command finished.", file=sys.stderr)
+    return 1
+
+def _settings(env):
+    """Get the variables of an environment that are read only at startup."""
+    return {
+        name: value for name, value in env.items()
+        if name in SETTING_NAMES or name.startswith(SETTING_PREFIXES)
+    }
+
+def _replace_environ(env):
+    """Make os.environ hold exactly the given variables."""
+    os.environ.clear()
+    os.environ.update(env)
+
+def _ping(socket_path):
+    """Check whether something is accepting connections on a socket path."""
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        conn.connect(socket_path)
+        return True
+    except OSError:
+        return False
+    finally:
+        conn.close()
+
+def _send(conn, message):
+    """Send one JSON-line message over a socket."""
+    conn.sendall((json.dumps(message) + "\n").encode("utf-8"))
@@ -0,0 +1,243 @@
+# src/endpoint_pool.py
+import os
+import time
+import random
+import threading
+from contextlib import contextmanager
+import metrics
+from retry_policy import attempt_timeout, call_with_retries, is_retryable
+
+# "least_outstanding" sends each request to the endpoint with the fewest
+# requests in flight; "p2c" compares two endpoints drawn at random
+POOL_STRATEGY = os.getenv("LLM_POOL_STRATEGY", "least_outstanding").lower()
+# Seconds between health and loaded-model checks of each endpoint
+POOL_HEALTH_INTERVAL = float(os.getenv("LLM_POOL_HEALTH_INTERVAL", "30"))
+HEALTH_CHECK_TIMEOUT = float(os.getenv("LLM_HEALTH_CHECK_TIMEOUT", "5"))
+
+# Model names that mean "whatever the server has loaded"
+ANY_MODEL = ("", "default")
+
+def probe_endpoint(url, timeout=HEALTH_CHECK_TIMEOUT):
+    """Check if an OpenAI-compatible server is accessible and get its models.
+    
+    Args:
+        url: API base URL ending in /v1
+        timeout: Seconds to wait for the server
+    
+    Returns:
+        (healthy, list of model names or an error message)
+    """
+    try:
+        import requests
+        response = requests.get(f"{url.rstrip('/')}/models", timeout=timeout)
+        if response.status_code == 200:
+            models = response.json().get("data", [])
+            return True, [model.get("id") for model in models]
+        else:
+            return False, f"Error: {response.status_code}, {response.text}"
+    except Exception as e:
+        return False, f"Error connecting to {url}: {str(e)}"
+
+class Endpoint:
+    """One server in a pool, with its client and load."""
+    
+    def __init__(self, url, api_key):
+        """Initialize an endpoint.
+        
+        Args:
+            url: API base URL (None for the provider's default)
+            api_key: API key sent to the server
+        """
+        self.url = url
+        self.api_key = api_key
+        self.in_flight = 0
+        self.healthy = True
+        # Models the server reported as loaded; None until it has been checked
+        self.models = None
+        self._client = None
+        self._client_built = False
+        self._lock = threading.Lock()
+    
+    def client(self):
+        """Get the endpoint's OpenAI SDK client, building it on first use.
+        
+        Returns:
+            OpenAI client, or None if the SDK is unavailable
+        """
+        with self._lock:
+            if not self._client_built:
+                self._client_built = True
+                try:
+                    from openai import OpenAI
+                    self._client = OpenAI(base_url=self.url, api_key=self.api_key or "lm-studio", max_retries=0)
+                except ImportError:
+                    print("OpenAI package not installed properly. Using direct API calls where possible.")
+                except Exception as e:
+                    print(f"Error initializing client for {self.url}: {str(e)}")
+            return self._client
+    
+    def serves(self, model):
+        """Check whether the endpoint can answer requests for a model."""
+        return model in ANY_MODEL or self.models is None or model in self.models
+
+class EndpointPool:
+    """Load-balances requests over interchangeable servers.
+    
+    Requests go to healthy endpoints that have the requested model loaded,
+    picked by POOL_STRATEGY. An endpoint that fails with a retryable error is
+    marked unhealthy and the request moves straight to another one; endpoints
+    are checked again every POOL_HEALTH_INTERVAL seconds. The backend's retry
+    policy applies to the pool as a whole, not to each endpoint.
+    """
+    
+    def __init__(self, name, urls, api_key=""):
+        """Initialize a pool.
+        
+        Args:
+            name: Backend the pool serves, for logs and metrics
+            urls: API base URLs of the endpoints
+            api_key: API key sent to every endpoint
+        """
+        self.name = name
+        self.endpoints = [Endpoint(url, api_key) for url in urls]
+        self._lock = threading.Lock()
+        self._checked_at = 0.0
+        self._checking = False
+    
+    def choose(self, model=None, exclude=()):
+        """Pick the endpoint for a request.
+        
+        Args:
+            model: Requested model
+            exclude: Endpoints already tried for this request
+        
+        Returns:
+            Endpoint, or None if every endpoint was excluded
+        """
+        self._check_if_due()
+        candidates = [endpoint for endpoint in self.endpoints if endpoint not in exclude]
+        if not candidates:
+            return None
+        # Prefer healthy endpoints with the model; without any, try the rest anyway
+        eligible = (
+            [endpoint for endpoint in candidates if endpoint.healthy and endpoint.serves(model)]
+            or [endpoint for endpoint in candidates if endpoint.healthy]
+            or candidates
+        )
+        if len(eligible) == 1:
+            return eligible[0]
+        with self._lock:
+            if POOL_STRATEGY == "p2c":
+                return min(random.sample(eligible, 2), key=lambda endpoint: endpoint.in_flight)
+            fewest = min(endpoint.in_flight for endpoint in eligible)
+            return random.choice([endpoint for endpoint in eligible if endpoint.in_flight == fewest])
+    
+    @contextmanager
+    def acquire(self, model=None, exclude=()):
+        """Pick an endpoint and count a request in flight on it for a block.
+        
+        Yields:
+            Endpoint, or None if every endpoint was excluded
+        """
+        endpoint = self.choose(model, exclude)
+        if endpoint is None:
+            yield None
+            return
+        with self._lock:
+            endpoint.in_flight += 1
+        metrics.LLM_ENDPOINT_REQUESTS.inc(backend=self.name, endpoint=endpoint.url or "default")
+        try:
+            yield endpoint
+        finally:
+            with self._lock:
+                endpoint.in_flight -= 1
+    
+    def call(self, model, request):
+        """Run a request on an endpoint, failing over to the others.
+        
+        Each endpoint gets a single attempt per round, and the first retryable
+        error moves the request to the next one without waiting. Once every
+        endpoint has failed, the round is retried under the backend's retry
+        policy (backoff, attempts and deadline).
+        
+        Args:
+            model: Requested model
+            request: Function taking an Endpoint and the attempt's timeout in
+                seconds, and making one request
+        
+        Returns:
+            The result of request
+        """
+        def attempt_round(timeout):
+            tried = []
+            while True:
+                with self.acquire(model, tried) as endpoint:
+                    tried.append(endpoint)
+                    try:
+                        result = request(endpoint, timeout if len(tried) == 1 else attempt_timeout(timeout))
+                    except Exception as e:
+                        if not is_retryable(e):
+                            raise
+                        endpoint.healthy = False
+                        if len(tried) == len(self.endpoints):
+                            raise
+                        print(f"{self.name} endpoint {endpoint.url} failed, trying another one: {str(e)}")
+                        continue
+                    endpoint.healthy = True
+                    return result
+        
+        return call_with_retries(self.name, attempt_round)
+    
+    def check(self):
+        """Check the health and loaded models of every endpoint now.
+        
+        Returns:
+            (whether any endpoint is healthy, list of models loaded anywhere or
+            the first error message)
+        """
+        models = []
+        errors = []
+        for endpoint in self.endpoints:
+            if endpoint.url is None:
+                continue
+            healthy, detail = probe_endpoint(endpoint.url)
+            endpoint.healthy = healthy
+            if healthy:
+                endpoint.models = set(detail)
+                models.extend(model for model in detail if model not in models)
+            else:
+                errors.append(detail)
+        self._checked_at = time.monotonic()
+        if errors and not models and len(errors) == len(self.endpoints):
+            return False, errors[0]
+        return True, models
+    
+    def status(self):
+        """Get each endpoint's load, health and loaded models."""
+        return [
+            {
+                "url": endpoint.url,
+                "in_flight": endpoint.in_flight,
+                "healthy": endpoint.healthy,
+                "models": sorted(endpoint.models) if endpoint.models is not None else None
+            }
+            for endpoint in self.endpoints
+        ]
+    
+    def _check_if_due(self):
+        """Start a background check of the endpoints if the last one is stale."""
+        if len(self.endpoints) < 2 or POOL_HEALTH_INTERVAL <= 0:
+            return
+        with self._lock:
+            if self._checking or time.monotonic() - self._checked_at < POOL_HEALTH_INTERVAL:
+                return
+            self._checking = True
+        threading.Thread(target=self._background_check, name=f"{self.name}-pool-check", daemon=True).start()
+    
+    def _background_check(self):
+        """Run check, then allow the next one."""
+        try:
+            self.check()
+        finally:
+            with self._lock:
+                self._checking = False
@@ -1,24 +1,85 @@
 # src/executor.py
 import subprocess
 import os
+import contextvars
 from state_manager import record_action, load_state, save_state
+from tracing import traced, set_attributes, current_trace_id
+from sandbox import Cgroup, run_limited, start_limited, limit_message
 
+# Resources used by the commands of the step being executed
+_step_usage = contextvars.ContextVar("step_usage", default=None)
+
+def start_usage():
+    """Start adding up the resources used by commands, for one step.
+    
+    Returns:
+        Token to pass to end_usage
+    """
+    return _step_usage.set({
+        "commands": 0,
+        "wall_seconds": 0.0,
+        "cpu_seconds": 0.0,
+        "max_rss_mb": 0.0,
+        "output_bytes": 0,
+        "limit": None
+    })
+
+def end_usage(token):
+    """Stop adding up resources for a step.
+    
+    Args:
+        token: Token from start_usage
+    
+    Returns:
+        Resources used by the step's commands, or None if it ran none
+    """
+    usage = _step_usage.get()
+    _step_usage.reset(token)
+    return usage if usage and usage["commands"] else None
+
+def _add_usage(usage, limit):
+    """Add a command's resource usage to the current step's."""
+    total = _step_usage.get()
+    if total is None:
+        return
+    total["commands"] += 1
+    total["wall_seconds"] = round(total["wall_seconds"] + usage.get("wall_seconds", 0), 3)
+    total["cpu_seconds"] = round(total["cpu_seconds"] + usage.get("cpu_seconds", 0), 3)
+    total["max_rss_mb"] = max(total["max_rss_mb"], usage.get("max_rss_mb", 0))
+    total["output_bytes"] += usage.get("output_bytes", 0)
+    total["limit"] = total["limit"] or limit
+
+@traced("executor.run_command")
 def run_command(command, cwd=None, background=False):
     print(f"Running command: {command}, background={background}")
+    set_attributes(command=command, background=background)
+    # Let commands tag their own output with the trace they ran in
+    env = None
+    if current_trace_id():
+        env = dict(os.environ, AGENTS_TRACE_ID=current_trace_id())
     if background:
         # Run the process in background and return immediately
-        process = subprocess.Popen(command, cwd=cwd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        process, cgroup = start_limited(command, cwd=cwd, env=env)
         # Store PID in state
         state = load_state()
         if "background_processes" not in state:
             state["background_processes"] = []
-        state["background_processes"].append({"command": command, "pid": process.pid})
+        state["background_processes"].append({
+            "command": command,
+            "pid": process.pid,
+            "cgroup": cgroup.path if cgroup else None
+        })
         save_state(state)
         return True, f"Started background process PID: {process.pid}"
     else:
-        result = subprocess.run(command, cwd=cwd, shell=True, capture_output=True, text=True)
-        success = (result.returncode == 0)
-        output = result.stdout if success else result.stderr
+        # Runs within the step limits (timeout, rlimits, cgroup, output cap)
+        result = run_limited(command, cwd=cwd, env=env)
+        set_attributes(limit=result["limit"], **result["usage"])
+        _add_usage(result["usage"], result["limit"])
+        success = (result["returncode"] == 0)
+        output = result["stdout"] if success else result["stderr"]
+        if result["limit"]:
+            output = f"{limit_message(result['limit'])}\n{output}"
         return success, output.strip()
 
 def kill_all_background_processes():
@@ -34,6 +95,11 @@ def kill_all_background_processes():
                 print(f"Killed process PID: {pid}")
             except Exception as e:
                 print(f"Error killing PID {pid}: {e}")
+            if proc_info.get("cgroup"):
+                # Also kill whatever the process started, then drop its cgroup
+                cgroup = Cgroup(proc_info["cgroup"])
+                cgroup.kill()
+                cgroup.remove()
         # Clear the list
         state["background_processes"] = []
         save_state(state)
@@ -1,11 +1,28 @@
 # src/file_manager.py
 import os
+import re
 import shutil
+import hashlib
+import threading
+import uuid
+from contextlib import contextmanager
 from pathlib import Path
 
+HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+# Whether writes are fsynced before being renamed into place
+FSYNC_WRITES = os.getenv("FSYNC_WRITES", "true").lower() == "true"
+
+# Per-thread write batch: {"depth": int, "pending": {abs_path: content}}
+_batch = threading.local()
+
 def create_file(file_path, content):
     """Create a new file with the given content.
     
+    The file is written to a temporary file in the same directory and
+    renamed into place, so readers never see a partially written file.
+    Inside a write batch the write is buffered until the batch is flushed.
+    
     Args:
         file_path: Path to the file to create
         content: Content to write to the file
@@ -13,15 +30,169 @@ def create_file(file_path, content):
     Returns:
         True if successful, False otherwise
     """
+    pending = _pending_writes()
+    if pending is not None:
+        pending[os.path.abspath(file_path)] = content
+        return True
+        
     try:
-        Path(file_path).parent.mkdir(parents=True, exist_ok=True)
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(content)
+        _write_files({file_path: content})
         return True
     except Exception as e:
         print(f"Error creating file {file_path}: {str(e)}")
         return False
 
+@contextmanager
+def write_batch():
+    """Buffer file writes made by create_file/modify_file/patch_file.
+    
+    Repeated writes to the same path are coalesced into one, and the batch
+    is flushed when the outermost batch exits. Batches nest, and are local to
+    the current thread. A failed flush on exit is only printed, so callers
+    that report on the writes call flush_writes before leaving the batch.
+    """
+    if getattr(_batch, "depth", 0) == 0:
+        _batch.pending = {}
+    _batch.depth = getattr(_batch, "depth", 0) + 1
+    try:
+        yield
+    finally:
+        if _batch.depth == 1:
+            flush_writes()
+            _batch.pending = None
+        _batch.depth -= 1
+
+def flush_writes():
+    """Write out all buffered writes of the current write batch.
+    
+    Returns:
+        True if successful, False otherwise
+    """
+    pending = _pending_writes()
+    if not pending:
+        return True
+        
+    files = dict(pending)
+    pending.clear()
+    try:
+        _write_files(files)
+        return True
+    except Exception as e:
+        print(f"Error writing files {', '.join(files)}: {str(e)}")
+        return False
+
+def discard_writes(file_paths):
+    """Drop buffered writes to the given paths from the current write batch.
+    
+    Args:
+        file_paths: Paths whose pending writes should be discarded
+    """
+    pending = _pending_writes()
+    if pending:
+        for file_path in file_paths:
+            pending.pop(os.path.abspath(file_path), None)
+
+def file_digest(file_path):
+    """Get the SHA-256 digest of a file's contents.
+    
+    Args:
+        file_path: Path to the file
+        
+    Returns:
+        Hex digest string, or None if the file does not exist
+    """
+    digest = hashlib.sha256()
+    try:
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    except FileNotFoundError:
+        return None
+    return digest.hexdigest()
+
+def _pending_writes():
+    """Get the pending writes of the current thread's batch, if any."""
+    if getattr(_batch, "depth", 0) > 0:
+        return _batch.pending
+    return None
+
+def _encode(content):
+    """Encode content the way a text-mode write would."""
+    if os.linesep != "\n":
+        content = content.replace("\n", os.linesep)
+    return content.encode("utf-8")
+
+def _write_files(files):
+    """Atomically write {path: content}, skipping files whose content is unchanged."""
+    staged = []
+    try:
+        for file_path, content in files.items():
+            data = _encode(content)
+            if _has_content(file_path, data):
+                continue
+            staged.append((file_path, _stage_file(file_path, data)))
+            
+        if FSYNC_WRITES:
+            for _, temp_path in staged:
+                _fsync_path(temp_path)
+            
+        for file_path, temp_path in staged:
+            os.replace(temp_path, file_path)
+            
+        if FSYNC_WRITES:
+            # Make the renames durable: one fsync per directory written to
+            for directory in {os.path.dirname(os.path.abspath(file_path)) for file_path, _ in staged}:
+                _fsync_directory(directory)
+    except Exception:
+        for _, temp_path in staged:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        raise
+
+def _has_content(file_path, data):
+    """Check whether a file already holds exactly the given bytes."""
+    try:
+        if os.path.getsize(file_path) != len(data):
+            return False
+    except OSError:
+        return False
+    return file_digest(file_path) == hashlib.sha256(data).hexdigest()
+
+def _stage_file(file_path, data):
+    """Write data to a temporary file next to file_path and return its path."""
+    path = Path(file_path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = str(path.parent / f".{path.name}.{uuid.uuid4().hex[:8]}.tmp")
+    # Created with mode 0o666 so the umask applies as for a plain open()
+    fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0), 0o666)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        if path.exists():
+            shutil.copymode(file_path, temp_path)
+    except Exception:
+        os.remove(temp_path)
+        raise
+    return temp_path
+
+def _fsync_path(path):
+    """Flush a file's contents to disk."""
+    fd = os.open(path, os.O_RDWR | getattr(os, "O_BINARY", 0))
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def _fsync_directory(path):
+    """Flush a directory's entries to disk, where the platform allows it."""
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
 def modify_file(file_path, new_content):
     """Modify an existing file with new content.
     
@@ -34,6 +205,182 @@ def modify_file(file_path, new_content):
     """
     return create_file(file_path, new_content)  # Overwrites
 
+def patch_file(file_path, diff=None, edits=None):
+    """Patch an existing file with a unified diff or search/replace edits.
+    
+    The patch is applied to the file contents in memory and only written
+    back if every hunk or edit applies cleanly, so a conflicting patch
+    leaves the file untouched.
+    
+    Args:
+        file_path: Path to the file to patch
+        diff: Unified diff, or SEARCH/REPLACE blocks, as a string
+        edits: List of {"search": ..., "replace": ...} dictionaries
+        
+    Returns:
+        Tuple of (success, output message)
+    """
+    pending = _pending_writes() or {}
+    if os.path.abspath(file_path) in pending or is_file(file_path):
+        content = read_file(file_path)
+        if content is None:
+            return False, f"Could not read {file_path}"
+    else:
+        content = ""
+        
+    success, result = apply_patch(content, diff=diff, edits=edits)
+    if not success:
+        return False, f"Patch for {file_path} does not apply: {result}"
+    if result == content:
+        return True, f"File {file_path} already up to date."
+    if not create_file(file_path, result):
+        return False, f"Could not write {file_path}"
+    return True, f"File {file_path} patched."
+
+def apply_patch(content, diff=None, edits=None):
+    """Apply a unified diff or search/replace edits to a string.
+    
+    Args:
+        content: Original text
+        diff: Unified diff, or SEARCH/REPLACE blocks, as a string
+        edits: List of {"search": ..., "replace": ...} dictionaries
+        
+    Returns:
+        Tuple of (success, patched text or conflict description)
+    """
+    if edits is None and diff is None:
+        return False, "No diff or edits given"
+    if diff is not None and "<<<<<<< SEARCH" in diff:
+        edits = (edits or []) + parse_search_replace_blocks(diff)
+        diff = None
+    if diff is not None:
+        success, content = apply_unified_diff(content, diff)
+        if not success:
+            return False, content
+    for i, edit in enumerate(edits or []):
+        search = edit.get("search", "")
+        replace = edit.get("replace", "")
+        if not search:
+            return False, f"Edit {i + 1} has an empty search block"
+        count = content.count(search)
+        if count == 0:
+            return False, f"Edit {i + 1}: search text not found"
+        if count > 1:
+            return False, f"Edit {i + 1}: search text matches {count} locations"
+        content = content.replace(search, replace, 1)
+    return True, content
+
+def parse_search_replace_blocks(text):
+    """Parse SEARCH/REPLACE blocks into a list of edits.
+    
+    Each block has the form::
+    
+        <<<<<<< SEARCH
+        old lines
+        =======
+        new lines
+        >>>>>>> REPLACE
+        
+    Args:
+        text: Text containing one or more blocks
+        
+    Returns:
+        List of {"search": ..., "replace": ...} dictionaries
+    """
+    pattern = r"<<<<<<< SEARCH\n(.*?)\n?=======\n(.*?)\n?>>>>>>> REPLACE"
+    return [
+        {"search": search, "replace": replace}
+        for search, replace in re.findall(pattern, text, flags=re.DOTALL)
+    ]
+
+def apply_unified_diff(content, diff):
+    """Apply a unified diff to a string.
+    
+    Hunks are located by their context lines rather than trusting the line
+    numbers in the header, preferring the match closest to the stated
+    position. A hunk whose context cannot be found is a conflict. A hunk
+    with no old lines (@@ -N,0 ...) inserts after line N.
+    
+    Args:
+        content: Original text
+        diff: Unified diff as a string
+        
+    Returns:
+        Tuple of (success, patched text or conflict description)
+    """
+    lines = content.splitlines()
+    trailing_newline = content.endswith("\n") or not content
+    try:
+        hunks = _parse_hunks(diff)
+    except ValueError as e:
+        return False, str(e)
+    if not hunks:
+        return False, "No hunks found in diff"
+        
+    offset = 0
+    for number, (old_start, old_lines, new_lines) in enumerate(hunks, 1):
+        # old_start is the first old line, or the line to insert after
+        expected = max(old_start - (1 if old_lines else 0) + offset, 0)
+        position = _find_hunk(lines, old_lines, expected)
+        if position is None:
+            return False, f"Hunk {number} context does not match"
+        lines[position:position + len(old_lines)] = new_lines
+        offset += len(new_lines) - len(old_lines)
+        
+    patched = "\n".join(lines)
+    if lines and trailing_newline:
+        patched += "\n"
+    return True, patched
+
+def _parse_hunks(diff):
+    """Split a unified diff into (old_start, old_lines, new_lines) hunks.
+    
+    Raises:
+        ValueError: If a line in a hunk is not a context, removed or added line
+    """
+    hunks = []
+    old_remaining = new_remaining = 0
+    for line in diff.splitlines():
+        header = HUNK_HEADER.match(line)
+        if header:
+            old_lines, new_lines = [], []
+            hunks.append((int(header.group(1)), old_lines, new_lines))
+            old_remaining = int(header.group(2) or 1)
+            new_remaining = int(header.group(4) or 1)
+        elif old_remaining <= 0 and new_remaining <= 0:
+            # File headers and anything else between hunks
+            continue
+        elif line.startswith("\\"):
+            continue
+        elif line.startswith("-"):
+            old_lines.append(line[1:])
+            old_remaining -= 1
+        elif line.startswith("+"):
+            new_lines.append(line[1:])
+            new_remaining -= 1
+        elif line and not line.startswith(" "):
+            raise ValueError(f"Malformed line in hunk {len(hunks)}: {line!r}")
+        else:
+            # Context line; blank context lines often lose their leading space
+            old_lines.append(line[1:])
+            new_lines.append(line[1:])
+            old_remaining -= 1
+            new_remaining -= 1
+    return hunks
+
+def _find_hunk(lines, old_lines, expected):
+    """Find where old_lines occur in lines, closest to the expected index."""
+    if not old_lines:
+        return min(expected, len(lines))
+    size = len(old_lines)
+    candidates = [
+        i for i in range(len(lines) - size + 1)
+        if lines[i:i + size] == old_lines
+    ]
+    if not candidates:
+        return None
+    return min(candidates, key=lambda i: abs(i - expected))
+
 def append_to_file(file_path, content):
     """Append content to an existing file.
     
@@ -44,6 +391,11 @@ def append_to_file(file_path, content):
     Returns:
         True if successful, False otherwise
     """
+    pending = _pending_writes()
+    if pending is not None and os.path.abspath(file_path) in pending:
+        pending[os.path.abspath(file_path)] += content
+        return True
+        
     try:
         with open(file_path, 'a', encoding='utf-8') as f:
             f.write(content)
@@ -61,6 +413,10 @@ def read_file(file_path):
     Returns:
         File contents as string if successful, None otherwise
     """
+    pending = _pending_writes()
+    if pending is not None and os.path.abspath(file_path) in pending:
+        return pending[os.path.abspath(file_path)]
+        
     try:
         with open(file_path, 'r', encoding='utf-8') as f:
             return f.read()
@@ -1,5 +1,7 @@
 # src/instructions_parser.py
+from tracing import traced
 
+@traced("parse_instructions")
 def parse_instructions(data):
     """Parse the instructions from JSON data.
     
@@ -52,6 +54,14 @@ def parse_instructions(data):
                     "content": action.get("content", "")
                 })
                 
+            elif action_type == "patch_file":
+                steps.append({
+                    "action": "patch_file",
+                    "path": action.get("path"),
+                    "diff": action.get("diff"),
+                    "edits": action.get("edits")
+                })
+                
             elif action_type == "run_terminal":
                 steps.append({
                     "action": "run_terminal",
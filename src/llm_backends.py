@@ -0,0 +1,530 @@
+# src/llm_backends.py
+import os
+import time
+import asyncio
+import threading
+from dotenv import load_dotenv
+from telemetry import add_to_chain, record_llm_call, usage_from_response
+from tracing import span
+from retry_policy import RETRYABLE_STATUSES, call_with_retries
+from cassette import CASSETTE_MODE, cassette
+from endpoint_pool import EndpointPool
+
+load_dotenv()
+
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
+DEFAULT_OPENAI_MODEL = "gpt-4"
+
+# LM Studio configuration; a comma-separated list of URLs load-balances over them
+LLM_STUDIO_API_URL = os.getenv("LLM_STUDIO_API_URL", "http://localhost:8000/v1")
+LLM_STUDIO_API_KEY = os.getenv("LLM_STUDIO_API_KEY", "")
+DEFAULT_LOCAL_MODEL = os.getenv("DEFAULT_LOCAL_MODEL", "default")
+CLAUDE_API_KEY = os.getenv("CLAUDE_API_KEY", "")
+DEFAULT_CLAUDE_MODEL = "claude-3-sonnet-20240229"
+# Claude requires a reply length limit; the same one applies to every call
+CLAUDE_MAX_TOKENS = 4096
+
+# Ask backends for JSON or schema-constrained output when a schema is given
+STRUCTURED_OUTPUT = os.getenv("LLM_STRUCTURED_OUTPUT", "true").lower() == "true"
+
+# Mark system prompts as cacheable where the provider supports it (Claude)
+PROMPT_CACHING = os.getenv("LLM_PROMPT_CACHING", "true").lower() == "true"
+
+# More OpenAI-compatible local servers (llama.cpp, vLLM, ...) as name=url
+# pairs; a bare URL after a pair adds another endpoint to that backend
+EXTRA_BACKENDS = os.getenv("LLM_BACKENDS", "")
+
+# Where each backend's requests go when it fails, as backend:fallback pairs
+FALLBACKS = os.getenv("LLM_FALLBACKS", "local:openai,claude:openai")
+
+# Default prices in USD per million prompt and completion tokens
+DEFAULT_COSTS = {"openai": (30.0, 60.0), "claude": (3.0, 15.0)}
+
+class BackendError(Exception):
+    """Raised when a backend cannot answer a request."""
+
+class Backend:
+    """An LLM provider behind the interface shared by all backends.
+    
+    Subclasses implement _complete, and optionally _stream, embed and health.
+    complete and stream add the tracing span, telemetry event and cassette
+    recording of every call.
+    """
+    
+    # "local" for model servers we run, "remote" for hosted APIs
+    kind = "remote"
+    # Features callers can rely on: chat, stream, embeddings, json_object,
+    # json_schema, prompt_cache, prefill
+    capabilities = frozenset({"chat"})
+    
+    def __init__(self, name, model, cost=(0.0, 0.0)):
+        """Initialize a backend.
+        
+        Args:
+            name: Registry name, used in telemetry and LLM_<NAME>_* settings
+            model: Default model
+            cost: Default USD prices per million prompt and completion tokens,
+                overridden by LLM_<NAME>_COST="prompt,completion"
+        """
+        self.name = name
+        self.model = model
+        setting = os.getenv(f"LLM_{name.upper()}_COST")
+        self.cost = tuple(float(price) for price in setting.split(",")) if setting else cost
+    
+    def available(self):
+        """Check whether the backend is configured well enough to be called."""
+        return True
+    
+    def model_for(self, requested):
+        """Get the model to use when a caller asks for one.
+        
+        Most backends serve their configured model whatever the caller asked for.
+        """
+        return self.model
+    
+    def estimate_cost(self, prompt_tokens, completion_tokens):
+        """Get the price of a call in USD."""
+        return ((prompt_tokens or 0) * self.cost[0] + (completion_tokens or 0) * self.cost[1]) / 1_000_000
+    
+    def complete(self, system_prompt, user_prompt, model=None, temperature=0.2, json_schema=None):
+        """Send a prompt and wait for the whole reply.
+        
+        Args:
+            system_prompt: The system instructions
+            user_prompt: The user query
+            model: Model identifier (defaults to the backend's model)
+            temperature: Temperature parameter for response generation
+            json_schema: Schema from schemas.py to constrain the reply to, if supported
+        
+        Returns:
+            Reply text
+        
+        Raises:
+            Exception: The provider's error if the call failed
+        """
+        model = model or self.model
+        add_to_chain(self.name)
+        started = time.perf_counter()
+        with span(f"llm.{self.name}", model=model):
+            try:
+                text, usage = self._complete(system_prompt, user_prompt, model, temperature, json_schema)
+            except Exception as e:
+                record_llm_call(self.name, model, time.perf_counter() - started, error=str(e))
+                raise
+        latency = time.perf_counter() - started
+        self._record(system_prompt, user_prompt, json_schema, text, model, latency, usage)
+        return text
+    
+    async def acomplete(self, system_prompt, user_prompt, model=None, temperature=0.2, json_schema=None):
+        """Send a prompt without blocking the event loop; see complete."""
+        return await asyncio.to_thread(self.complete, system_prompt, user_prompt, model, temperature, json_schema)
+    
+    def stream(self, system_prompt, user_prompt, model=None, temperature=0.2):
+        """Send a prompt and yield the reply as it is generated.
+        
+        Args:
+            system_prompt: The system instructions
+            user_prompt: The user query
+            model: Model identifier (defaults to the backend's model)
+            temperature: Temperature parameter for response generation
+        
+        Yields:
+            Chunks of reply text
+        """
+        model = model or self.model
+        add_to_chain(self.name)
+        started = time.perf_counter()
+        ttft = None
+        chunks = []
+        try:
+            for chunk in self._stream(system_prompt, user_prompt, model, temperature):
+                if ttft is None:
+                    ttft = time.perf_counter() - started
+                chunks.append(chunk)
+                yield chunk
+        except Exception as e:
+            record_llm_call(self.name, model, time.perf_counter() - started, ttft=ttft, error=str(e))
+            raise
+        latency = time.perf_counter() - started
+        self._record(system_prompt, user_prompt, None, "".join(chunks), model, latency, None, ttft)
+    
+    def embed(self, texts, model=None):
+        """Get embeddings for a list of texts.
+        
+        Returns:
+            One vector per text
+        """
+        raise BackendError(f"{self.name} does not support embeddings")
+    
+    def health(self):
+        """Check whether the backend is reachable.
+        
+        Returns:
+            (healthy, list of model names or an error message)
+        """
+        return self.available(), [self.model]
+    
+    def _complete(self, system_prompt, user_prompt, model, temperature, json_schema):
+        """Make the call; return (reply text, provider usage object or None)."""
+        raise NotImplementedError
+    
+    def _stream(self, system_prompt, user_prompt, model, temperature):
+        """Yield the reply in chunks; backends without streaming yield it whole."""
+        yield self._complete(system_prompt, user_prompt, model, temperature, None)[0]
+    
+    def _record(self, system_prompt, user_prompt, json_schema, text, model, latency, usage, ttft=None):
+        """Record a successful call in telemetry and, when recording, on the cassette."""
+        usage = usage_from_response(usage)
+        cost = self.estimate_cost(usage["prompt_tokens"], usage["completion_tokens"])
+        record_llm_call(self.name, model, latency, ttft=ttft, cost=cost, **usage)
+        if CASSETTE_MODE == "record":
+            cassette.record(system_prompt, user_prompt, json_schema, text, self.name, model, latency)
+
+class OpenAICompatibleBackend(Backend):
+    """OpenAI, or any server with an OpenAI-compatible API (LM Studio, llama.cpp, vLLM).
+    
+    Uses the OpenAI SDK, or plain HTTP requests for local servers when the
+    SDK is not installed. A backend with several URLs spreads its requests
+    over them with an EndpointPool.
+    """
+    
+    def __init__(self, name, base_url, api_key, model, kind="local", capabilities=None, cost=(0.0, 0.0)):
+        """Initialize a backend.
+        
+        Args:
+            name: Registry name
+            base_url: API base URL ending in /v1, a list or comma-separated
+                string of them, or None for OpenAI itself
+            api_key: API key (optional for local servers)
+            model: Default model
+            kind: "local" or "remote"
+            capabilities: Supported features (see Backend.capabilities)
+            cost: Default USD prices per million prompt and completion tokens
+        """
+        super().__init__(name, model, cost)
+        if isinstance(base_url, str):
+            base_url = [url.strip() for url in base_url.split(",") if url.strip()]
+        self.api_key = api_key
+        self.kind = kind
+        self.capabilities = frozenset(capabilities or {"chat", "stream", "embeddings", "json_schema"})
+        self.pool = EndpointPool(name, base_url or [None], api_key)
+        # Models that rejected a structured output request
+        self._no_structured_output = set()
+    
+    def available(self):
+        """Local servers need no key; hosted APIs do."""
+        return self.kind == "local" or bool(self.api_key)
+    
+    def model_for(self, requested):
+        """Hosted APIs serve the model the caller asks for."""
+        if self.kind == "remote" and requested:
+            return requested
+        return self.model
+    
+    def client(self):
+        """Get the SDK client of the backend's first endpoint, building it on first use.
+        
+        Returns:
+            OpenAI client, or None without an API key or SDK
+        """
+        return self.pool.endpoints[0].client() if self.available() else None
+    
+    def _complete(self, system_prompt, user_prompt, model, temperature, json_schema):
+        return self.pool.call(model, lambda endpoint, timeout: self._complete_on(
+            endpoint, timeout, system_prompt, user_prompt, model, temperature, json_schema
+        ))
+    
+    def _complete_on(self, endpoint, timeout, system_prompt, user_prompt, model, temperature, json_schema):
+        """Make one chat completion request to one endpoint."""
+        client = endpoint.client() if self.available() else None
+        if client is None:
+            if self.kind != "local":
+                raise BackendError(f"{self.name} client not initialized")
+            data = self._post(endpoint, timeout, "chat/completions", {
+                "model": model,
+                "messages": _chat_messages(system_prompt, user_prompt),
+                "temperature": temperature,
+                **self._structured_output(model, json_schema)
+            })
+            return data["choices"][0]["message"]["content"], data.get("usage")
+        
+        completion = self._create_completion(
+            client, timeout, model, system_prompt, user_prompt, temperature, json_schema
+        )
+        return completion.choices[0].message.content, completion.usage
+    
+    def _stream(self, system_prompt, user_prompt, model, temperature):
+        with self.pool.acquire(model) as endpoint:
+            client = endpoint.client() if self.available() else None
+            if client is None:
+                yield call_with_retries(self.name, lambda timeout: self._complete_on(
+                    endpoint, timeout, system_prompt, user_prompt, model, temperature, None
+                ))[0]
+                return
+            stream = call_with_retries(self.name, lambda timeout: client.chat.completions.create(
+                model=model,
+                messages=_chat_messages(system_prompt, user_prompt),
+                temperature=temperature,
+                stream=True,
+                timeout=timeout
+            ))
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+    
+    def embed(self, texts, model=None):
+        model = model or self.model
+        return self.pool.call(model, lambda endpoint, timeout: self._embed_on(endpoint, timeout, texts, model))
+    
+    def _embed_on(self, endpoint, timeout, texts, model):
+        """Make one embeddings request to one endpoint."""
+        client = endpoint.client() if self.available() else None
+        if client is not None:
+            response = client.embeddings.create(model=model, input=texts, timeout=timeout)
+            return [item.embedding for item in response.data]
+        if self.kind != "local":
+            raise BackendError(f"{self.name} client not initialized")
+        data = self._post(endpoint, timeout, "embeddings", {"model": model, "input": texts})
+        return [item["embedding"] for item in data.get("data", [])]
+    
+    def health(self):
+        """Check every endpoint, also refreshing which models each has loaded."""
+        if self.kind != "local":
+            return super().health()
+        return self.pool.check()
+    
+    def _structured_output(self, model, json_schema):
+        """Get request parameters that constrain a reply to JSON.
+        
+        Servers that accept the schema itself get it; OpenAI gets JSON mode,
+        which works with more models than schema-constrained output. The
+        schema is validated after parsing either way.
+        """
+        if not json_schema or not STRUCTURED_OUTPUT or model in self._no_structured_output:
+            return {}
+        if "json_schema" in self.capabilities:
+            return {"response_format": {
+                "type": "json_schema",
+                "json_schema": {"name": json_schema["title"], "schema": json_schema}
+            }}
+        if "json_object" in self.capabilities:
+            return {"response_format": {"type": "json_object"}}
+        return {}
+    
+    def _create_completion(self, client, timeout, model, system_prompt, user_prompt, temperature, json_schema=None):
+        """Create a chat completion with the SDK client.
+        
+        If the model rejects the structured output parameters, the request is
+        sent again without them and they are not used for that model again.
+        """
+        def create(extra):
+            return client.chat.completions.create(
+                model=model,
+                messages=_chat_messages(system_prompt, user_prompt),
+                temperature=temperature,
+                timeout=timeout,
+                **extra
+            )
+        
+        extra = self._structured_output(model, json_schema)
+        try:
+            return create(extra)
+        except Exception as e:
+            if not extra or getattr(e, "status_code", None) != 400:
+                raise
+            print(f"{model} on {self.name} does not support structured output, retrying without it: {str(e)}")
+            self._no_structured_output.add(model)
+            return create({})
+    
+    def _post(self, endpoint, timeout, path, payload):
+        """POST to an endpoint with requests and return the decoded JSON reply."""
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        url = f"{endpoint.url.rstrip('/')}/{path}"
+        response = _post_retryable(url, headers=headers, json=payload, timeout=timeout)
+        if response.status_code != 200:
+            raise BackendError(f"HTTP {response.status_code}, {response.text}")
+        return response.json()
+
+class ClaudeBackend(Backend):
+    """Anthropic's Claude API.
+    
+    Claude has no JSON mode, so with a schema the reply is prefilled with "{"
+    to make it start as a JSON object.
+    """
+    
+    capabilities = frozenset({"chat", "stream", "prompt_cache", "prefill"})
+    
+    def __init__(self, name, api_key, model, cost=(0.0, 0.0)):
+        """Initialize the backend.
+        
+        Args:
+            name: Registry name
+            api_key: Anthropic API key
+            model: Default model
+            cost: Default USD prices per million prompt and completion tokens
+        """
+        super().__init__(name, model, cost)
+        self.api_key = api_key
+        self._client = None
+        self._lock = threading.Lock()
+    
+    def available(self):
+        return bool(self.api_key)
+    
+    def client(self):
+        """Get the shared Anthropic client, building it on first use."""
+        with self._lock:
+            if self._client is None:
+                import anthropic
+                self._client = anthropic.Anthropic(api_key=self.api_key, max_retries=0)
+            return self._client
+    
+    def _complete(self, system_prompt, user_prompt, model, temperature, json_schema):
+        client = self.client()
+        messages = [{"role": "user", "content": user_prompt}]
+        prefill = "{" if json_schema and STRUCTURED_OUTPUT else ""
+        if prefill:
+            messages.append({"role": "assistant", "content": prefill})
+        
+        message = call_with_retries(self.name, lambda timeout: client.messages.create(
+            model=model,
+            system=_claude_system(system_prompt),
+            messages=messages,
+            temperature=temperature,
+            max_tokens=CLAUDE_MAX_TOKENS,
+            timeout=timeout
+        ))
+        return prefill + message.content[0].text, message.usage
+    
+    def _stream(self, system_prompt, user_prompt, model, temperature):
+        client = self.client()
+        with client.messages.stream(
+            model=model,
+            system=_claude_system(system_prompt),
+            messages=[{"role": "user", "content": user_prompt}],
+            temperature=temperature,
+            max_tokens=CLAUDE_MAX_TOKENS
+        ) as stream:
+            yield from stream.text_stream
+
+def _chat_messages(system_prompt, user_prompt):
+    """Build chat messages for OpenAI-compatible APIs.
+    
+    The static system prompt always comes first and the request-specific user
+    prompt last, so consecutive calls from one agent share the longest
+    possible prefix. OpenAI caches such prefixes automatically, and LM Studio
+    can reuse the model's KV cache for them.
+    """
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+
+def _claude_system(system_prompt):
+    """Build Claude's system parameter, marked cacheable if PROMPT_CACHING is on."""
+    if not PROMPT_CACHING:
+        return system_prompt
+    return [{"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}}]
+
+def _post_retryable(url, **kwargs):
+    """POST with requests, raising for retryable statuses only.
+    
+    Other error responses are returned for the caller to handle.
+    """
+    import requests
+    response = requests.post(url, **kwargs)
+    if response.status_code in RETRYABLE_STATUSES:
+        response.raise_for_status()
+    return response
+
+_registry = {}
+
+def register_backend(backend):
+    """Add a backend to the registry, replacing any with the same name.
+    
+    Args:
+        backend: Backend instance
+    
+    Returns:
+        The backend
+    """
+    _registry[backend.name] = backend
+    return backend
+
+def get_backend(name):
+    """Get a registered backend by name.
+    
+    Raises:
+        KeyError: If no backend has that name
+    """
+    return _registry[name]
+
+def available_backends():
+    """Get the names of the backends that are configured well enough to be called."""
+    return [name for name, backend in _registry.items() if backend.available()]
+
+def local_backends():
+    """Get the registered local model servers."""
+    return [backend for backend in _registry.values() if backend.kind == "local"]
+
+def fallback_chain(name):
+    """Get the backends to try for a request to a backend, in order.
+    
+    Follows LLM_FALLBACKS from the backend, skipping unknown backends and
+    ones already in the chain.
+    
+    Args:
+        name: Backend the request was sent to
+    
+    Returns:
+        List of backend names, starting with name
+    """
+    chain = []
+    pending = [name]
+    while pending:
+        current = pending.pop(0)
+        if current in chain or current not in _registry:
+            continue
+        chain.append(current)
+        pending.extend(_fallbacks.get(current, []))
+    return chain
+
+def _parse_backends(value):
+    """Parse LLM_BACKENDS into [(name, [url, ...]), ...]."""
+    backends = []
+    for item in value.split(","):
+        item = item.strip()
+        if "=" in item:
+            name, _, url = item.partition("=")
+            backends.append((name.strip(), [url.strip()]))
+        elif item and backends:
+            backends[-1][1].append(item)
+    return backends
+
+def _parse_pairs(value, separator):
+    """Parse "a<separator>b,c<separator>d" into [(a, b), (c, d)]."""
+    pairs = []
+    for item in value.split(","):
+        if separator in item:
+            key, _, target = item.partition(separator)
+            pairs.append((key.strip(), target.strip()))
+    return pairs
+
+_fallbacks = {}
+for _name, _fallback in _parse_pairs(FALLBACKS, ":"):
+    _fallbacks.setdefault(_name, []).append(_fallback)
+
+register_backend(OpenAICompatibleBackend("local", LLM_STUDIO_API_URL, LLM_STUDIO_API_KEY, DEFAULT_LOCAL_MODEL))
+register_backend(OpenAICompatibleBackend(
+    "openai", None, OPENAI_API_KEY, DEFAULT_OPENAI_MODEL, kind="remote",
+    capabilities={"chat", "stream", "embeddings", "json_object"}, cost=DEFAULT_COSTS["openai"]
+))
+register_backend(ClaudeBackend("claude", CLAUDE_API_KEY, DEFAULT_CLAUDE_MODEL, cost=DEFAULT_COSTS["claude"]))
+for _name, _urls in _parse_backends(EXTRA_BACKENDS):
+    register_backend(OpenAICompatibleBackend(
+        _name, _urls,
+        os.getenv(f"LLM_{_name.upper()}_API_KEY", ""),
+        os.getenv(f"LLM_{_name.upper()}_MODEL", DEFAULT_LOCAL_MODEL)
+    ))
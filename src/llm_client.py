@@ -2,44 +2,70 @@
 import os
 import re
 import json
-import requests
+import time
+import queue
+import threading
 from dotenv import load_dotenv
-try:
-    from openai import OpenAI
-except ImportError:
-    print("OpenAI package not installed properly. Using mock responses.")
-    OpenAI = None
+from telemetry import call_chain, extend_chain, record_llm_call, separate_chain
+from tracing import traced, bind_context
+from backend_scheduler import ADAPTIVE_ROUTING, COMPLEXITY_TIERS, scheduler
+from schemas import validate
+from cassette import CASSETTE_MODE, REPLAY_LATENCY, CassetteMiss, cassette
+from llm_backends import (
+    DEFAULT_LOCAL_MODEL, DEFAULT_CLAUDE_MODEL, available_backends, fallback_chain, get_backend, local_backends
+)
+from endpoint_pool import probe_endpoint
+from retry_policy import DeadlineExceeded, is_retryable, remaining_time
+import metrics
 
 load_dotenv()
 
 USE_MOCK = os.getenv("USE_MOCK_RESPONSES", "false").lower() == "true"
 
-# Try to initialize clients, but allow for missing keys for testing
-try:
-    OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
-    if OPENAI_API_KEY and not USE_MOCK and OpenAI:
-        openai_client = OpenAI(api_key=OPENAI_API_KEY)
-    else:
-        openai_client = None
-except Exception as e:
-    print(f"Error initializing OpenAI client: {str(e)}")
-    openai_client = None
-
-# LM Studio configuration
-LLM_STUDIO_API_URL = os.getenv("LLM_STUDIO_API_URL", "http://localhost:8000/v1")
-LLM_STUDIO_API_KEY = os.getenv("LLM_STUDIO_API_KEY", "")
-DEFAULT_LOCAL_MODEL = os.getenv("DEFAULT_LOCAL_MODEL", "default")
-CLAUDE_API_KEY = os.getenv("CLAUDE_API_KEY", "")
-
-# Initialize LM Studio client if OpenAI SDK is available
-try:
-    if OpenAI and not USE_MOCK:
-        lm_studio_client = OpenAI(base_url=LLM_STUDIO_API_URL, api_key=LLM_STUDIO_API_KEY or "lm-studio")
-    else:
-        lm_studio_client = None
-except Exception as e:
-    print(f"Error initializing LM Studio client: {str(e)}")
-    lm_studio_client = None
+# Share one backend call between concurrent identical requests
+SINGLE_FLIGHT = os.getenv("LLM_SINGLE_FLIGHT", "true").lower() == "true"
+
+# Hedging: duplicate slow latency-critical calls to a second backend
+HEDGING = os.getenv("LLM_HEDGING", "false").lower() == "true"
+HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+HEDGE_DELAY_MS = float(os.getenv("LLM_HEDGE_DELAY_MS", "1000"))
+
+# Calls currently in flight, keyed by everything that determines their answer
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+
+_JSON_DECODER = json.JSONDecoder()
+# A complete JSON string, or a brace outside strings
+_JSON_TOKEN = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"|[{}]', re.DOTALL)
+
+# Repairs made by fix_json_formatting
+_SINGLE_QUOTED_KEY = re.compile(r"'([^']*)':")
+_SINGLE_QUOTED_VALUE = re.compile(r": '([^']*)'")
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+
+def get_openai_client():
+    """Get the shared OpenAI client, building it on first use.
+    
+    Returns:
+        OpenAI client, or None if there is no API key or SDK
+    """
+    return None if USE_MOCK else get_backend("openai").client()
+
+def get_lm_studio_client():
+    """Get the shared LM Studio client, building it on first use.
+    
+    Returns:
+        OpenAI-compatible client for LM Studio, or None if the SDK is unavailable
+    """
+    return None if USE_MOCK else get_backend("local").client()
+
+def get_claude_client():
+    """Get the shared Anthropic client, building it on first use.
+    
+    Returns:
+        Anthropic client
+    """
+    return get_backend("claude").client()
 
 # Mock responses for testing
 MOCK_RESPONSES = {
@@ -155,23 +181,53 @@ def get_mock_response(prompt_type):
     else:
         return MOCK_RESPONSES["developer"]
 
-def check_lm_studio_health():
-    """Check if LM Studio API is accessible and get available models."""
+def mock_response_for(system_prompt, user_prompt):
+    """Get the mock response for a prompt, identified by its system prompt."""
+    return get_mock_response(mock_kind_for(system_prompt, user_prompt))
+
+def mock_kind_for(system_prompt, user_prompt):
+    """Get which kind of mock response answers a prompt.
+    
+    Returns:
+        Prompt type to pass to get_mock_response
+    """
+    if "Developer Agent" in system_prompt:
+        return "developer"
+    elif "Tester Agent" in system_prompt:
+        return "tester"
+    elif "Debugger Agent" in system_prompt:
+        return "debugger"
+    elif "Router Agent" in system_prompt:
+        return "router"
+    elif "Task Manager Agent" in system_prompt:
+        # Checked before code generation, as its prompt mentions "expertise" and the "developer" agent
+        return "task_analysis"
+    elif "expert" in system_prompt and "developer" in system_prompt:
+        if "email" in user_prompt.lower():
+            return "email_validator"
+        return "code_generation"
+    elif "controls the Cursor IDE" in system_prompt:
+        return "cursor"
+    else:
+        print(f"Using default mock response for unknown prompt type: {system_prompt[:50]}...")
+        return "developer"
+
+def check_lm_studio_health(url=None):
+    """Check if LM Studio API is accessible and get available models.
+    
+    Args:
+        url: Endpoint to check; by default every LLM_STUDIO_API_URL endpoint
+            is checked, and the local pool learns which models each has loaded
+    """
     if USE_MOCK:
         return True, ["mock-model"]
-        
-    try:
-        url = f"{LLM_STUDIO_API_URL.rstrip('/v1')}/v1/models"
-        response = requests.get(url)
-        if response.status_code == 200:
-            models = response.json().get("data", [])
-            return True, [model.get("id") for model in models]
-        else:
-            return False, f"Error: {response.status_code}, {response.text}"
-    except Exception as e:
-        return False, f"Error connecting to LM Studio: {str(e)}"
+    if url:
+        return probe_endpoint(url)
+    return get_backend("local").health()
 
-def ask_llm(system_prompt, user_prompt, model="gpt-4", temperature=0.2, use_local=False, task_complexity="low"):
+@traced("llm.ask")
+def ask_llm(system_prompt, user_prompt, model="gpt-4", temperature=0.2, use_local=False, task_complexity="low",
+            hedge=False, agent=None, json_schema=None):
     """
     Send a prompt to either OpenAI, Anthropic (Claude), or a local LLM Studio model based on complexity.
     
@@ -182,142 +238,271 @@ def ask_llm(system_prompt, user_prompt, model="gpt-4", temperature=0.2, use_loca
         temperature: Temperature parameter for response generation
         use_local: Whether to use local LLM Studio API
         task_complexity: "low", "medium", or "high" to determine which LLM to use
+        hedge: Whether to send a duplicate request to a second backend if the
+            first is slow (only with LLM_HEDGING enabled); meant for small
+            prompts on the critical path
+        agent: Name of the calling agent, for telemetry and the prompt-size report
+        json_schema: Schema from schemas.py to constrain the reply to, on
+            backends that support JSON or structured output
+    
+    The system prompt should be static text, with everything request-specific
+    in the user prompt, so that providers can reuse its cached prefix.
     """
+    with call_chain(agent, system_prompt + user_prompt):
+        return _ask_llm(
+            system_prompt, user_prompt, model, temperature, use_local, task_complexity, hedge, agent, json_schema
+        )
+
+def _ask_llm(system_prompt, user_prompt, model, temperature, use_local, task_complexity, hedge=False, agent=None,
+             json_schema=None):
+    """Pick a backend for a prompt and send it there."""
     # For testing, use mock responses based on the system prompt
     if USE_MOCK:
-        # Identify prompt type
-        if "Developer Agent" in system_prompt:
-            return get_mock_response("developer")
-        elif "Tester Agent" in system_prompt:
-            return get_mock_response("tester")
-        elif "Debugger Agent" in system_prompt:
-            return get_mock_response("debugger")
-        elif "expert" in system_prompt and "developer" in system_prompt:
-            if "email" in user_prompt.lower():
-                return get_mock_response("email_validator")
-            return get_mock_response("code_generation")
-        elif "controls the Cursor IDE" in system_prompt:
-            return get_mock_response("cursor")
-        elif "Router Agent" in system_prompt:
-            return get_mock_response("router")
-        elif "Task Manager Agent" in system_prompt:
-            return get_mock_response("task_analysis")
-        else:
-            print(f"Using default mock response for unknown prompt type: {system_prompt[:50]}...")
-            return get_mock_response("developer")
+        record_llm_call("mock", "mock", 0.0)
+        return mock_response_for(system_prompt, user_prompt)
+    if CASSETTE_MODE == "replay":
+        return _replay(system_prompt, user_prompt, json_schema)
+    
+    backend = choose_backend(task_complexity, use_local)
+    if hedge and HEDGING:
+        secondary = _secondary_backend(backend, task_complexity)
+        if secondary:
+            return _hedged_call(backend, secondary, system_prompt, user_prompt, model, temperature, agent, json_schema)
+    return _call_backend(backend, system_prompt, user_prompt, model, temperature, json_schema)
+
+def _replay(system_prompt, user_prompt, json_schema=None):
+    """Answer a prompt from the LLM cassette instead of a backend.
+    
+    Raises:
+        CassetteMiss: If the prompt was not recorded; the run has diverged
+            from the recorded one, and no backend is called in its place
+    """
+    entry = cassette.replay(system_prompt, user_prompt, json_schema)
+    if entry is None:
+        key = cassette.key(system_prompt, user_prompt, json_schema)
+        record_llm_call("replay", None, 0.0, error="not recorded")
+        raise CassetteMiss(f"No recorded reply in the LLM cassette for prompt {key}: {user_prompt[:80]!r}")
+    
+    latency = entry["latency"] if REPLAY_LATENCY == "original" else 0.0
+    if latency:
+        time.sleep(latency)
+    record_llm_call("replay", entry["model"], latency)
+    return entry["response"]
+
+def _call_backend(backend, system_prompt, user_prompt, model, temperature, json_schema=None):
+    """Send a prompt to one backend, sharing identical in-flight calls."""
+    with scheduler.track(backend):
+        model = get_backend(backend).model_for(model)
+        call = lambda: _complete_with_fallbacks(backend, system_prompt, user_prompt, model, temperature, json_schema)
+        if not SINGLE_FLIGHT:
+            return call()
+        schema_name = json_schema["title"] if json_schema else None
+        return single_flight((backend, model, system_prompt, user_prompt, temperature, schema_name), call)
+
+def _complete_with_fallbacks(backend, system_prompt, user_prompt, model=None, temperature=0.2, json_schema=None):
+    """Send a prompt to a backend, then along its LLM_FALLBACKS chain until one answers.
+    
+    Args:
+        backend: Backend to try first
+        system_prompt: The system instructions
+        user_prompt: The user query
+        model: Model for the first backend; fallbacks use their own default
+        temperature: Temperature parameter for response generation
+        json_schema: Schema to constrain the reply to, if the backend supports it
+    
+    Returns:
+        The first reply, or a mock response if every backend failed
+    
+    Raises:
+        DeadlineExceeded: If the task's deadline has passed; no fallback or
+            mock response is tried then
+    """
+    for name in fallback_chain(backend):
+        provider = get_backend(name)
+        remaining = remaining_time()
+        if remaining is not None and remaining <= 0:
+            raise DeadlineExceeded("Task deadline exceeded")
+        try:
+            return provider.complete(
+                system_prompt, user_prompt, model=model if name == backend else None,
+                temperature=temperature, json_schema=json_schema
+            )
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            print(f"{name} request failed: {str(e)}")
+    remaining = remaining_time()
+    if remaining is not None and remaining <= 0:
+        raise DeadlineExceeded("Task deadline exceeded")
+    print("No backend could answer. Using mock response.")
+    return get_mock_response("developer")
+
+def _hedged_call(primary, secondary, system_prompt, user_prompt, model, temperature, agent=None, json_schema=None):
+    """Send a prompt to primary, and also to secondary if primary is slow.
+    
+    The duplicate is sent once primary has been outstanding for longer than
+    its LLM_HEDGE_PERCENTILE latency (LLM_HEDGE_DELAY_MS until it has any
+    observations). The first answer wins. Each attempt runs on a thread of
+    its own, so an attempt that never returns holds up no other call; the
+    losing one finishes in the background and its answer is discarded.
+    Attempts track their backends separately, and only the winner's are
+    added to the request's call chain.
+    """
+    delay = scheduler.latency_percentile(primary, HEDGE_PERCENTILE)
+    if delay is None:
+        delay = HEDGE_DELAY_MS / 1000
+    finished = queue.Queue()
+    
+    def attempt(role, backend):
+        with separate_chain() as backends:
+            try:
+                result = _call_backend(backend, system_prompt, user_prompt, model, temperature, json_schema)
+                finished.put((role, backends, result, None))
+            except Exception as e:
+                finished.put((role, backends, None, e))
+    
+    def start(role, backend):
+        run = bind_context(lambda: attempt(role, backend))
+        threading.Thread(target=run, name=f"llm-hedge-{role}", daemon=True).start()
+    
+    start("primary", primary)
+    try:
+        role, backends, result, error = finished.get(timeout=delay)
+    except queue.Empty:
+        start("secondary", secondary)
+        for _ in range(2):
+            role, backends, result, error = finished.get()
+            if error is None:
+                extend_chain(backends)
+                metrics.LLM_HEDGES.inc(winner=role)
+                return result
+        raise error
+    
+    extend_chain(backends)
+    if error is not None:
+        raise error
+    return result
+
+def _secondary_backend(primary, task_complexity):
+    """Get the backend to hedge a call to primary with, or None."""
+    available = available_backends()
+    for backend in _tier(task_complexity) + tuple(available):
+        if backend != primary and backend in available:
+            return backend
+    return None
+
+def _tier(task_complexity):
+    """Get the backends allowed for a complexity tier, in order of preference.
+    
+    Local servers added with LLM_BACKENDS share LM Studio's place in the tiers.
+    """
+    tier = []
+    for backend in COMPLEXITY_TIERS.get(task_complexity, COMPLEXITY_TIERS["medium"]):
+        tier.extend([local.name for local in local_backends()] if backend == "local" else [backend])
+    return tuple(tier)
+
+def choose_backend(task_complexity="medium", use_local=False):
+    """Choose the backend for a request.
+    
+    With LLM_ADAPTIVE_ROUTING enabled, the scheduler picks the fastest healthy
+    backend allowed for the complexity tier. Otherwise high complexity goes to
+    Claude (when configured), low complexity or use_local to LM Studio, and
+    everything else to OpenAI.
+    
+    Args:
+        task_complexity: "low", "medium" or "high"
+        use_local: Whether to prefer the local LLM
+    
+    Returns:
+        Name of a registered backend
+    """
+    if ADAPTIVE_ROUTING:
+        return scheduler.choose(
+            task_complexity, available_backends(), prefer="local" if use_local else None, tier=_tier(task_complexity)
+        )
     
-    # Route to appropriate LLM based on complexity
-    if task_complexity == "high" and CLAUDE_API_KEY:
-        return ask_claude(system_prompt, user_prompt, temperature=temperature)
+    if task_complexity == "high" and get_backend("claude").available():
+        return "claude"
     elif use_local or task_complexity == "low":
-        return ask_local_llm(system_prompt, user_prompt, model=DEFAULT_LOCAL_MODEL, temperature=temperature)
-    else:
-        return ask_openai(system_prompt, user_prompt, model=model, temperature=temperature)
+        return "local"
+    return "openai"
 
-def ask_openai(system_prompt, user_prompt, model="gpt-4", temperature=0.2):
-    """Send a prompt to OpenAI API"""
-    if USE_MOCK:
-        return get_mock_response("developer")
+def single_flight(key, call):
+    """Run call once for all concurrent callers with the same key.
+    
+    The first caller runs call; callers arriving while it is in flight wait
+    for it, but no longer than their own deadline, and receive the same
+    result or exception. An error that comes from the first caller's own
+    deadline (DeadlineExceeded, or a timeout while it had a deadline) is not
+    shared: the waiting callers then make their own call. Nothing is cached:
+    once the call finishes, the next caller starts a new one.
+    
+    Args:
+        key: Hashable key identifying identical requests
+        call: Function with no arguments that performs the request
         
-    if not openai_client:
-        print("OpenAI client not initialized. Using mock response.")
-        return get_mock_response("developer")
+    Returns:
+        The result of call
+    
+    Raises:
+        DeadlineExceeded: If the caller's deadline passes while it waits
+    """
+    with _in_flight_lock:
+        flight = _in_flight.get(key)
+        leader = flight is None
+        if leader:
+            flight = {
+                "done": threading.Event(), "result": None, "error": None,
+                "deadline": remaining_time() is not None
+            }
+            _in_flight[key] = flight
+            
+    if not leader:
+        metrics.LLM_COALESCED.inc(backend=key[0])
+        remaining = remaining_time()
+        if not flight["done"].wait(None if remaining is None else max(remaining, 0)):
+            raise DeadlineExceeded("Task deadline exceeded")
+        error = flight["error"]
+        if error is None:
+            return flight["result"]
+        if isinstance(error, DeadlineExceeded) or (flight["deadline"] and is_retryable(error)):
+            return call()
+        raise error
         
     try:
-        completion = openai_client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            temperature=temperature
-        )
-        response = completion.choices[0].message.content
-        return response
+        flight["result"] = call()
+        return flight["result"]
     except Exception as e:
-        print(f"Error calling OpenAI API: {str(e)}")
+        flight["error"] = e
+        raise
+    finally:
+        with _in_flight_lock:
+            del _in_flight[key]
+        flight["done"].set()
+
+def ask_openai(system_prompt, user_prompt, model="gpt-4", temperature=0.2, json_schema=None):
+    """Send a prompt to OpenAI API"""
+    if USE_MOCK:
         return get_mock_response("developer")
+    return _complete_with_fallbacks("openai", system_prompt, user_prompt, model, temperature, json_schema)
 
-def ask_local_llm(system_prompt, user_prompt, model=DEFAULT_LOCAL_MODEL, temperature=0.2):
+def ask_local_llm(system_prompt, user_prompt, model=DEFAULT_LOCAL_MODEL, temperature=0.2, json_schema=None):
     """Send a prompt to local LLM Studio API"""
     if USE_MOCK:
         return get_mock_response("developer")
-        
-    # Try using the OpenAI client SDK approach first (preferred)
-    if lm_studio_client:
-        try:
-            completion = lm_studio_client.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                temperature=temperature
-            )
-            return completion.choices[0].message.content
-        except Exception as e:
-            print(f"Error using LM Studio client: {str(e)}")
-            # Fall back to direct API call
-    
-    # Direct API call as fallback
-    try:
-        headers = {"Content-Type": "application/json"}
-        if LLM_STUDIO_API_KEY:
-            headers["Authorization"] = f"Bearer {LLM_STUDIO_API_KEY}"
-            
-        payload = {
-            "model": model,
-            "messages": [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            "temperature": temperature
-        }
-        
-        chat_endpoint = f"{LLM_STUDIO_API_URL.rstrip('/v1')}/v1/chat/completions"
-        response = requests.post(chat_endpoint, headers=headers, json=payload)
-        
-        if response.status_code == 200:
-            return response.json()["choices"][0]["message"]["content"]
-        else:
-            print(f"Error from local LLM API: {response.status_code}, {response.text}")
-            if not USE_MOCK:
-                # Fallback to OpenAI if local fails
-                return ask_openai(system_prompt, user_prompt, model="gpt-3.5-turbo", temperature=temperature)
-            else:
-                return get_mock_response("developer")
-    except Exception as e:
-        print(f"Local LLM request failed: {str(e)}")
-        if not USE_MOCK:
-            # Fallback to OpenAI
-            return ask_openai(system_prompt, user_prompt, model="gpt-3.5-turbo", temperature=temperature)
-        else:
-            return get_mock_response("developer")
+    return _complete_with_fallbacks("local", system_prompt, user_prompt, model, temperature, json_schema)
 
-def ask_claude(system_prompt, user_prompt, model="claude-3-sonnet-20240229", temperature=0.2):
-    """Send a prompt to Anthropic's Claude API"""
+def ask_claude(system_prompt, user_prompt, model=DEFAULT_CLAUDE_MODEL, temperature=0.2, json_schema=None):
+    """Send a prompt to Anthropic's Claude API.
+    
+    Claude has no JSON mode, so with a schema the reply is prefilled with "{"
+    to make it start as a JSON object.
+    """
     if USE_MOCK:
         return get_mock_response("developer")
-        
-    try:
-        import anthropic
-        client = anthropic.Anthropic(api_key=CLAUDE_API_KEY)
-        
-        message = client.messages.create(
-            model=model,
-            system=system_prompt,
-            messages=[{"role": "user", "content": user_prompt}],
-            temperature=temperature
-        )
-        return message.content[0].text
-    except Exception as e:
-        print(f"Claude API request failed: {str(e)}")
-        if not USE_MOCK:
-            # Fallback to OpenAI
-            return ask_openai(system_prompt, user_prompt, model="gpt-4", temperature=temperature)
-        else:
-            return get_mock_response("developer")
+    return _complete_with_fallbacks("claude", system_prompt, user_prompt, model, temperature, json_schema)
 
+@traced("llm.embeddings")
 def get_embeddings(text_or_texts, model=DEFAULT_LOCAL_MODEL):
     """Get embeddings for text using LM Studio API.
     
@@ -328,10 +513,10 @@ def get_embeddings(text_or_texts, model=DEFAULT_LOCAL_MODEL):
     Returns:
         List of embeddings
     """
+    is_list = isinstance(text_or_texts, list)
+    texts = text_or_texts if is_list else [text_or_texts]
     if USE_MOCK:
         # Return mock embeddings (vectors of zeros)
-        is_list = isinstance(text_or_texts, list)
-        texts = text_or_texts if is_list else [text_or_texts]
         mock_embedding = [0.0] * 384  # Common embedding dimension
         
         if is_list:
@@ -339,71 +524,123 @@ def get_embeddings(text_or_texts, model=DEFAULT_LOCAL_MODEL):
         else:
             return mock_embedding
     
-    # Use the OpenAI client SDK if available
-    if lm_studio_client:
-        try:
-            response = lm_studio_client.embeddings.create(
-                model=model,
-                input=text_or_texts
-            )
-            if isinstance(text_or_texts, list):
-                return [item.embedding for item in response.data]
-            else:
-                return response.data[0].embedding
-        except Exception as e:
-            print(f"Error getting embeddings with LM Studio client: {str(e)}")
-            # Fall back to direct API call
-    
-    # Direct API call for embeddings
     try:
-        headers = {"Content-Type": "application/json"}
-        if LLM_STUDIO_API_KEY:
-            headers["Authorization"] = f"Bearer {LLM_STUDIO_API_KEY}"
-        
-        payload = {
-            "model": model,
-            "input": text_or_texts
-        }
-        
-        embedding_endpoint = f"{LLM_STUDIO_API_URL.rstrip('/v1')}/v1/embeddings"
-        response = requests.post(embedding_endpoint, headers=headers, json=payload)
-        
-        if response.status_code == 200:
-            data = response.json().get("data", [])
-            if isinstance(text_or_texts, list):
-                return [item["embedding"] for item in data]
-            else:
-                return data[0]["embedding"]
-        else:
-            print(f"Error from embeddings API: {response.status_code}, {response.text}")
-            return get_embeddings(text_or_texts, model) if USE_MOCK else None
+        embeddings = get_backend("local").embed(texts, model)
     except Exception as e:
         print(f"Embeddings request failed: {str(e)}")
-        return get_embeddings(text_or_texts, model) if USE_MOCK else None
+        return None
+    return embeddings if is_list else embeddings[0]
 
-def extract_json(response):
-    match = re.search(r'\{.*\}', response, flags=re.DOTALL)
-    if match:
-        try:
-            data = json.loads(match.group(0))
+def ask_json(system_prompt, user_prompt, schema, **kwargs):
+    """Ask for a JSON reply and validate it against a schema.
+    
+    The request asks the backend for structured output. If the reply cannot
+    be parsed or does not match the schema, the LLM is asked once more with
+    the validation errors and its previous reply.
+    
+    Args:
+        system_prompt: The system instructions
+        user_prompt: The user query
+        schema: Schema from schemas.py
+        **kwargs: Further arguments for ask_llm
+    
+    Returns:
+        Parsed JSON (possibly still invalid after the repair), or None if no
+        JSON object could be parsed
+    """
+    response = ask_llm(system_prompt, user_prompt, json_schema=schema, **kwargs)
+    data = extract_json(response, schema)
+    errors = validate(data, schema) if data is not None else ["the reply is not a JSON object"]
+    if not errors:
+        return data
+    
+    print(f"Invalid {schema['title']} reply ({'; '.join(errors[:3])}), asking for a corrected one")
+    repair_prompt = (
+        f"{user_prompt}\n\nYour previous reply was:\n{response}\n\n"
+        f"It is not valid: {'; '.join(errors[:10])}.\n"
+        "Reply again with only the corrected JSON object."
+    )
+    repaired = extract_json(ask_llm(system_prompt, repair_prompt, json_schema=schema, **kwargs), schema)
+    if repaired is not None and not validate(repaired, schema):
+        metrics.LLM_JSON_REPAIRS.inc(schema=schema["title"], outcome="repaired")
+        return repaired
+    metrics.LLM_JSON_REPAIRS.inc(schema=schema["title"], outcome="failed")
+    return repaired if repaired is not None else data
+
+def extract_json(response, schema=None):
+    """Extract a JSON object from an LLM reply.
+    
+    Args:
+        response: Reply text
+        schema: Optional schema from schemas.py; the first object that
+            matches it is preferred over earlier ones that merely parse
+    
+    Returns:
+        Parsed dictionary, or None if the reply contains no JSON object
+    """
+    first = None
+    for data in iter_json_objects(response or ""):
+        if schema is None or not validate(data, schema):
             return data
+        if first is None:
+            first = data
+    return first
+
+def iter_json_objects(text):
+    """Yield every top-level JSON object in a text, in a single pass.
+    
+    The text is scanned forward once, tracking brace depth and JSON strings.
+    At each top-level "{" the C JSON decoder is tried first; it parses a
+    valid object and reports where it ends, so valid JSON is read once at C
+    speed. When decoding fails, the scan carries on to the brace that closes
+    the block, which is parsed once more after fix_json_formatting and is
+    skipped as a whole if it still does not parse. A block that never closes
+    ends the scan, since everything after its opening brace is inside it.
+    
+    Args:
+        text: Text to scan
+    
+    Yields:
+        Parsed dictionaries, in order
+    """
+    pos = 0
+    while True:
+        start = text.find("{", pos)
+        if start == -1:
+            return
+        try:
+            data, pos = _JSON_DECODER.raw_decode(text, start)
+            yield data
+            continue
         except json.JSONDecodeError:
-            # Try to fix common JSON errors
-            fixed_json = fix_json_formatting(match.group(0))
-            try:
-                return json.loads(fixed_json)
-            except json.JSONDecodeError:
-                return None
+            pass
+        
+        end = _block_end(text, start)
+        if end is None:
+            return
+        try:
+            yield json.loads(fix_json_formatting(text[start:end]))
+        except json.JSONDecodeError:
+            pass
+        pos = end
+
+def _block_end(text, start):
+    """Find the end of the balanced {...} block at start, or None if unclosed."""
+    depth = 0
+    for match in _JSON_TOKEN.finditer(text, start):
+        if match.group() == "{":
+            depth += 1
+        elif match.group() == "}":
+            depth -= 1
+            if depth == 0:
+                return match.end()
     return None
 
 def fix_json_formatting(json_str):
     """Try to fix common JSON formatting errors"""
     # Replace single quotes with double quotes
-    json_str = re.sub(r"'([^']*)':", r'"\1":', json_str)
-    json_str = re.sub(r": '([^']*)'", r': "\1"', json_str)
+    json_str = _SINGLE_QUOTED_KEY.sub(r'"\1":', json_str)
+    json_str = _SINGLE_QUOTED_VALUE.sub(r': "\1"', json_str)
     
     # Fix trailing commas in arrays and objects
-    json_str = re.sub(r",\s*}", "}", json_str)
-    json_str = re.sub(r",\s*\]", "]", json_str)
-    
-    return json_str
+    return _TRAILING_COMMA.sub(r"\1", json_str)
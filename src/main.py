@@ -1,56 +1,67 @@
 # src/main.py
 import os
 import sys
+import time
 import argparse
 import json
 from dotenv import load_dotenv
-from task_manager import TaskManager
-from agents import (
-    get_developer_instructions, 
-    get_tester_instructions, 
-    get_debugger_instructions,
-    execute_cursor_commands
-)
-from file_manager import (
-    create_file, 
-    modify_file, 
-    file_exists, 
-    read_file, 
-    create_directory,
-    delete_file
-)
-from env_manager import (
-    create_venv, 
-    install_dependencies, 
-    run_python_file, 
-    run_shell_command
-)
-from state_manager import (
-    record_action, 
-    record_file, 
-    load_state, 
-    save_state
-)
-from executor import kill_all_background_processes
-from cursor_integration import CursorIntegration
 
 # Load environment variables from .env file
 load_dotenv()
 
-# Initialize task manager
-task_manager = TaskManager()
+# Everything beyond argument parsing (agents, the task manager, the LLM
+# clients, step execution, tracing and metrics) is imported by the command
+# that uses it, so that --help, argument errors and commands forwarded to
+# the daemon don't pay for those imports.
+_task_manager = None
 
-# Initialize cursor integration
-cursor = CursorIntegration()
+def get_task_manager():
+    """Get the task manager, creating it on first use.
+    
+    Returns:
+        Shared TaskManager instance
+    """
+    global _task_manager
+    if _task_manager is None:
+        from task_manager import TaskManager
+        _task_manager = TaskManager()
+    return _task_manager
+
+# Commands that a running daemon can execute on the CLI's behalf
+DAEMON_COMMANDS = ("project", "dev", "task", "code", "cursor", "resume")
 
-def main():
-    """Main entry point for the application."""
+def main(argv=None):
+    """Main entry point for the application.
+    
+    Args:
+        argv: Command-line arguments (defaults to sys.argv[1:])
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    
+    if args.command in DAEMON_COMMANDS:
+        from daemon import forward_to_daemon
+        exit_code = forward_to_daemon(argv)
+        if exit_code is not None:
+            sys.exit(exit_code)
+            
+    dispatch(args, parser)
+
+def build_parser():
+    """Build the command-line argument parser.
+    
+    Returns:
+        ArgumentParser for all subcommands
+    """
     parser = argparse.ArgumentParser(description="Agent-based CLI tool")
     subparsers = parser.add_subparsers(dest="command", help="Command to run")
     
     # Project command
     project_parser = subparsers.add_parser("project", help="Run a project-building workflow")
     project_parser.add_argument("--dir", default="llm-cli-testing", help="Project directory")
+    project_parser.add_argument("--workflow", help="YAML workflow definition (defaults to PROJECT_WORKFLOW)")
+    project_parser.add_argument("--rebuild", action="store_true", help="Run every phase, ignoring cached outputs")
     
     # Dev command
     dev_parser = subparsers.add_parser("dev", help="Execute developer agent")
@@ -60,6 +71,10 @@ def main():
     task_parser = subparsers.add_parser("task", help="Execute a general task")
     task_parser.add_argument("instructions", help="Task instructions")
     
+    # Resume command
+    resume_parser = subparsers.add_parser("resume", help="Resume an interrupted task from its checkpoint")
+    resume_parser.add_argument("task_id", help="Task ID printed when the task started")
+    
     # Code command
     code_parser = subparsers.add_parser("code", help="Generate code")
     code_parser.add_argument("description", help="Code description")
@@ -74,52 +89,101 @@ def main():
     server_parser = subparsers.add_parser("server", help="Run a server to listen for commands")
     server_parser.add_argument("--port", type=int, default=8080, help="Server port")
     
-    # Parse arguments
-    args = parser.parse_args()
+    # Daemon command
+    daemon_parser = subparsers.add_parser("daemon", help="Run a background daemon that keeps clients and caches warm")
+    daemon_parser.add_argument("--socket", help="Unix domain socket path")
+    daemon_parser.add_argument("--stop", action="store_true", help="Stop the running daemon")
+    
+    return parser
+
+def dispatch(args, parser):
+    """Run the subcommand selected by parsed arguments.
     
+    Args:
+        args: Parsed arguments
+        parser: Parser that produced them, for printing help
+    """
     if args.command == "project":
-        run_project_workflow(args.dir)
+        run_project_workflow(args.dir, args.workflow, args.rebuild)
     elif args.command == "dev":
         run_developer_agent(args.instructions)
     elif args.command == "task":
         run_task(args.instructions)
+    elif args.command == "resume":
+        resume_task(args.task_id)
     elif args.command == "code":
         generate_code(args.description, args.file, args.language)
     elif args.command == "cursor":
         run_cursor_commands(args.instructions)
     elif args.command == "server":
         run_server(args.port)
+    elif args.command == "daemon":
+        run_daemon(args.socket, args.stop)
     else:
         parser.print_help()
 
-def run_project_workflow(project_dir):
+def run_argv(argv):
+    """Parse and run a command in this process; used by the daemon.
+    
+    Args:
+        argv: Command-line arguments
+    """
+    from cursor_integration import reset_cursor
+    
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    # The Cursor workspace is the directory the command was run from
+    reset_cursor()
+    dispatch(args, parser)
+
+def run_project_workflow(project_dir, workflow_path=None, rebuild=False):
     """Run a complete project-building workflow.
     
+    Agent phases whose inputs have not changed since the last run in the
+    project directory reuse its plans (see WORKFLOW_CACHE).
+    
     Args:
         project_dir: Project directory
+        workflow_path: YAML workflow definition (defaults to PROJECT_WORKFLOW)
+        rebuild: Run every phase, ignoring cached outputs
     """
+    from workflow import WorkflowError, load_workflow
+    from tracing import trace
+    
+    try:
+        workflow = load_workflow(os.path.abspath(workflow_path) if workflow_path else None)
+    except WorkflowError as e:
+        print(f"Invalid workflow: {str(e)}")
+        return
+    
+    with trace("project", project_dir=project_dir):
+        _run_project_phases(project_dir, workflow, rebuild)
+
+def _run_project_phases(project_dir, workflow, rebuild=False):
+    """Run the phases of the project workflow in the project directory."""
+    from workflow import WORKFLOW_CACHE, WORKFLOW_CACHE_FILE, PhaseCache, run_workflow
+    from executor import kill_all_background_processes
+    
     # Ensure project directory
     os.makedirs(project_dir, exist_ok=True)
     os.chdir(project_dir)
 
-    # Phase 1: Developer instructions (create app, run server in background, etc.)
-    dev_steps = get_developer_instructions()
-    if not dev_steps:
-        print("No valid instructions from Developer.")
-        return
-
-    execute_steps(dev_steps)
-
-    # Phase 2: Tester instructions
-    print("=== TESTING PHASE ===")
-    test_steps = get_tester_instructions()
-    if test_steps:
-        execute_steps(test_steps)
+    cache = None
+    if WORKFLOW_CACHE:
+        cache = PhaseCache(WORKFLOW_CACHE_FILE)
+        if rebuild:
+            cache.clear()
+    result = run_workflow(workflow, execute_steps, cache)
 
     # After tests, if we want, we can kill all background processes
     kill_all_background_processes()
 
-    print("Project workflow completed successfully.")
+    for name, seconds in result["durations"].items():
+        print(f"Phase {name}: {result['status'][name]} in {seconds:.2f}s")
+    if all(status in ("done", "cached") for status in result["status"].values()):
+        print("Project workflow completed successfully.")
+    else:
+        print("Project workflow finished with failed or skipped phases.")
 
 def run_developer_agent(instructions):
     """Run the developer agent with custom instructions.
@@ -127,12 +191,17 @@ def run_developer_agent(instructions):
     Args:
         instructions: Custom instructions for the developer agent
     """
-    steps = get_developer_instructions(instructions)
-    if not steps:
-        print("No valid instructions from Developer.")
-        return
-        
-    execute_steps(steps)
+    from agents import get_developer_instructions
+    from tracing import trace, current_trace_id
+    from checkpoint import start_checkpoint
+    
+    with trace("dev", instructions=instructions):
+        steps = get_developer_instructions(instructions)
+        if not steps:
+            print("No valid instructions from Developer.")
+            return
+            
+        execute_steps(steps, checkpoint=start_checkpoint(current_trace_id(), steps, instructions))
     print("Developer agent completed successfully.")
 
 def run_task(instructions):
@@ -142,7 +211,22 @@ def run_task(instructions):
         instructions: Task instructions
     """
     print(f"Executing task: {instructions}")
-    result = task_manager.execute_task(instructions)
+    result = get_task_manager().execute_task(instructions)
+    
+    if result.get("success", False):
+        print("Task completed successfully.")
+    else:
+        print(f"Task failed: {result.get('error', 'Unknown error')}")
+    
+    return result
+
+def resume_task(task_id):
+    """Resume an interrupted task from its checkpoint.
+    
+    Args:
+        task_id: Task ID printed when the task started
+    """
+    result = get_task_manager().resume_task(task_id)
     
     if result.get("success", False):
         print("Task completed successfully.")
@@ -178,6 +262,8 @@ def run_cursor_commands(instructions):
     Args:
         instructions: Instructions for cursor operations
     """
+    from agents import execute_cursor_commands
+    
     print(f"Executing cursor commands: {instructions}")
     result = execute_cursor_commands(instructions)
     
@@ -197,7 +283,11 @@ def run_server(port):
         port: Server port
     """
     try:
-        from flask import Flask, request, jsonify
+        from flask import Flask, Response, request, jsonify
+        import metrics
+        from telemetry import get_llm_summary, get_prompt_report
+        from backend_scheduler import scheduler
+        from llm_backends import local_backends
         
         app = Flask(__name__)
         
@@ -209,39 +299,165 @@ def run_server(port):
                 return jsonify({"error": "Missing task parameter"}), 400
                 
             task = data['task']
-            result = task_manager.execute_task(task)
+            metrics.QUEUE_DEPTH.inc()
+            try:
+                result = get_task_manager().execute_task(task, trace_id=request.headers.get("X-Trace-Id"))
+            finally:
+                metrics.QUEUE_DEPTH.dec()
+            return jsonify(result)
+            
+        @app.route('/resume/<task_id>', methods=['POST'])
+        def resume(task_id):
+            """Resume an interrupted task from its checkpoint."""
+            metrics.QUEUE_DEPTH.inc()
+            try:
+                result = get_task_manager().resume_task(task_id)
+            finally:
+                metrics.QUEUE_DEPTH.dec()
+            if result.get("error", "").startswith("No checkpoint"):
+                return jsonify(result), 404
             return jsonify(result)
             
         @app.route('/status', methods=['GET'])
         def status():
             """Get the agent status."""
-            history = task_manager.get_history()
+            history = get_task_manager().get_history()
             return jsonify({
                 "status": "running",
-                "tasks_completed": len(history)
+                "tasks_completed": len(history),
+                "llm_calls": get_llm_summary(),
+                "prompt_sizes": get_prompt_report(),
+                "speculative_planning": get_task_manager().get_speculation_stats(),
+                "backends": scheduler.status(),
+                "endpoints": {backend.name: backend.pool.status() for backend in local_backends()}
             })
             
+        @app.route('/metrics', methods=['GET'])
+        def prometheus_metrics():
+            """Get metrics in Prometheus text exposition format."""
+            return Response(metrics.render_metrics(), mimetype="text/plain; version=0.0.4")
+            
         print(f"Starting server on port {port}...")
         app.run(host='0.0.0.0', port=port)
     except ImportError:
         print("Flask is required to run the server. Install it with: pip install flask")
         return
 
-def execute_steps(steps):
+# Steps whose file writes are buffered in the step batch's write batch
+FILE_WRITE_ACTIONS = ("create_file", "modify_file", "patch_file")
+
+def run_daemon(socket_path=None, stop=False):
+    """Run, or stop, the daemon that executes forwarded CLI commands.
+    
+    Args:
+        socket_path: Unix domain socket path (defaults to AGENTS_DAEMON_SOCKET)
+        stop: Stop the running daemon instead of starting one
+    """
+    from daemon import DAEMON_SOCKET, run_daemon as serve, stop_daemon
+    
+    socket_path = socket_path or DAEMON_SOCKET
+    if stop:
+        if stop_daemon(socket_path):
+            print("Daemon stopped.")
+        else:
+            print(f"No daemon is listening on {socket_path}")
+        return
+        
+    serve(run_argv, socket_path, warm_up=_warm_up)
+
+def _warm_up():
+    """Import agents and step execution, and build LLM clients, ahead of the first command."""
+    import agents
+    import env_manager
+    import snapshot_manager
+    import checkpoint
+    from llm_client import get_openai_client, get_lm_studio_client
+    get_task_manager()
+    get_openai_client()
+    get_lm_studio_client()
+
+def execute_steps(steps, debug=True, checkpoint=None):
     """Execute a list of steps from an agent.
     
+    File writes are batched: consecutive writes are coalesced and flushed
+    together before the next step that could observe them. The files the
+    steps write are snapshotted first, and with ROLLBACK_ON_FAILURE set
+    they are restored when the batch fails and the debugger could not fix it.
+    
+    With a checkpoint, each step is recorded in it once completed (file
+    writes once flushed), and steps are numbered from its next step.
+    
     Args:
         steps: List of steps to execute
+        debug: Ask the debugger agent to fix a failed step
+        checkpoint: Checkpoint of the task the steps belong to, or None
         
     Returns:
         Dictionary with execution results
+    
+    Raises:
+        DeadlineExceeded: If the task's deadline passes while the debugger
+            agent is asked for a fix; the batch is rolled back first
+    """
+    from file_manager import write_batch, flush_writes
+    from retry_policy import DeadlineExceeded
+    from snapshot_manager import ROLLBACK_ON_FAILURE, take_snapshot, discard_snapshot, touched_paths
+    from tracing import span
+    
+    with span("execute_steps"), write_batch():
+        snapshot = None
+        if ROLLBACK_ON_FAILURE:
+            # An enclosing batch may still hold writes to the files we snapshot
+            flush_writes()
+            snapshot = take_snapshot(touched_paths(steps, FILE_WRITE_ACTIONS))
+            
+        try:
+            outcome = _execute_step_batch(steps, snapshot, debug, checkpoint)
+            if not outcome["success"]:
+                _roll_back(snapshot)
+        except DeadlineExceeded:
+            _roll_back(snapshot)
+            raise
+        finally:
+            if snapshot:
+                discard_snapshot(snapshot)
+        if checkpoint:
+            checkpoint.finish(outcome["success"])
+        return outcome
+
+def _execute_step_batch(steps, snapshot, debug=True, checkpoint=None):
+    """Execute a list of steps inside an open write batch.
+    
+    Buffered writes are flushed before every step that is not a file write
+    and once more at the end, so the outcome covers the writes reaching disk.
     """
+    import metrics
+    from file_manager import create_file, modify_file, patch_file
+    from env_manager import create_venv, install_dependencies, run_python_file, run_shell_command
+    from state_manager import record_action, record_file
+    from executor import kill_all_background_processes, start_usage, end_usage
+    from cursor_integration import get_cursor
+    from retry_policy import DeadlineExceeded
+    from tracing import start_span, end_span
+    
     results = []
+    # Results of the write steps whose writes are still buffered
+    unflushed = []
     
-    for i, step in enumerate(steps):
+    for i, step in enumerate(steps, checkpoint.next_step if checkpoint else 0):
         action = step.get("action")
         result = {"step": i, "action": action, "success": False}
+        started = time.perf_counter()
+        step_span = start_span(f"step.{action}", step=i)
         
+        if action not in FILE_WRITE_ACTIONS and not _flush_step_writes(unflushed, checkpoint):
+            result["output"] = "Error: could not write files from earlier steps"
+            end_span(step_span, success=False)
+            record_action(result)
+            results.append(result)
+            break
+        usage_token = start_usage()
+            
         try:
             if action == "create_venv":
                 venv_path = step.get("path", "./venv")
@@ -252,8 +468,7 @@ def execute_steps(steps):
                 result["output"] = output
                 
                 if not success:
-                    handle_failure(output)
-                    break
+                    handle_failure(output, snapshot, debug)
 
             elif action == "install_deps":
                 deps = step.get("deps", [])
@@ -265,8 +480,7 @@ def execute_steps(steps):
                 result["output"] = output
                 
                 if not success:
-                    handle_failure(output)
-                    break
+                    handle_failure(output, snapshot, debug)
 
             elif action == "create_file":
                 file_path = step.get("path")
@@ -285,6 +499,16 @@ def execute_steps(steps):
                 result["success"] = success
                 result["output"] = f"File {file_path} modified."
 
+            elif action == "patch_file":
+                file_path = step.get("path")
+                success, output = patch_file(file_path, diff=step.get("diff"), edits=step.get("edits"))
+                print(output)
+                result["success"] = success
+                result["output"] = output
+                
+                if not success:
+                    handle_failure(output, snapshot, debug)
+
             elif action == "run_file":
                 file_path = step.get("file")
                 venv_path = step.get("venv", "./venv")
@@ -293,9 +517,8 @@ def execute_steps(steps):
                 result["success"] = success
                 result["output"] = output
                 
-                if not success:
-                    retry_with_debugger(output)
-                    break
+                if not success and debug:
+                    retry_with_debugger(output, snapshot)
 
             elif action == "run_command":
                 command = step.get("command")
@@ -306,9 +529,8 @@ def execute_steps(steps):
                 result["success"] = success
                 result["output"] = output
                 
-                if not success:
-                    retry_with_debugger(output)
-                    break
+                if not success and debug:
+                    retry_with_debugger(output, snapshot)
 
             elif action == "kill_process":
                 # Kill all background processes
@@ -318,7 +540,7 @@ def execute_steps(steps):
                 
             elif action == "open_file":
                 file_path = step.get("path")
-                success = cursor.open_file(file_path)
+                success = get_cursor().open_file(file_path)
                 print(f"Opened file {file_path}")
                 result["success"] = success
                 result["output"] = f"File {file_path} opened."
@@ -326,6 +548,7 @@ def execute_steps(steps):
             elif action == "run_terminal":
                 command = step.get("command")
                 # Create a terminal if needed
+                cursor = get_cursor()
                 terminal_id = cursor.create_terminal()
                 if terminal_id:
                     success = cursor.run_in_terminal(terminal_id, command)
@@ -342,41 +565,114 @@ def execute_steps(steps):
                 result["success"] = False
                 result["output"] = f"Unknown action: {action}"
                 
+        except DeadlineExceeded:
+            # The task is out of time; stop it rather than record a failed step
+            end_usage(usage_token)
+            end_span(step_span, success=False)
+            raise
         except Exception as e:
             print(f"Error executing step {i} ({action}): {str(e)}")
             result["success"] = False
             result["output"] = f"Error: {str(e)}"
             
-        # Record the action
-        record_action(result)
+        # Record the action and the resources its commands used
+        usage = end_usage(usage_token)
+        if usage:
+            result["usage"] = usage
+            metrics.STEP_CPU_SECONDS.observe(usage["cpu_seconds"], action=action)
+            metrics.STEP_PEAK_MEMORY.observe(usage["max_rss_mb"], action=action)
+        metrics.STEP_DURATION.observe(time.perf_counter() - started, action=action)
+        end_span(step_span, success=result["success"])
         results.append(result)
+        if result["success"] and action in FILE_WRITE_ACTIONS:
+            # Recorded once its write has reached the disk
+            unflushed.append(result)
+        else:
+            record_action(result)
+        if checkpoint and result["success"]:
+            checkpoint.step_done(i, result, flushed=action not in FILE_WRITE_ACTIONS)
         
         # Stop if a step failed
         if not result["success"]:
             break
             
+    _flush_step_writes(unflushed, checkpoint)
     return {"success": all(r["success"] for r in results), "results": results}
 
-def handle_failure(error_msg):
+def _flush_step_writes(unflushed, checkpoint=None):
+    """Flush buffered writes and record which write steps reached the disk.
+    
+    The write steps are recorded in the state only now, as succeeded or,
+    if the flush fails, as failed.
+    
+    Args:
+        unflushed: Results of the write steps whose writes are buffered;
+            emptied once they are flushed and recorded
+        checkpoint: Checkpoint of the task, or None
+        
+    Returns:
+        True if the writes were flushed, False otherwise
+    """
+    from file_manager import flush_writes
+    from state_manager import record_action
+    
+    flushed = flush_writes()
+    for result in unflushed:
+        if not flushed:
+            result["success"] = False
+            result["output"] = "Error: the file could not be written to disk"
+        record_action(result)
+    unflushed.clear()
+    if flushed and checkpoint:
+        checkpoint.flushed()
+    return flushed
+
+def _roll_back(snapshot):
+    """Restore the files of a failed step batch, unless already restored or kept."""
+    from snapshot_manager import restore_snapshot
+    
+    if snapshot and not snapshot["restored"] and not snapshot["discarded"]:
+        print("Rolling back files written by the failed steps.")
+        restore_snapshot(snapshot)
+
+def handle_failure(error_msg, snapshot=None, debug=True):
     """Handle a failure by printing the error message.
     
     Args:
         error_msg: Error message
+        snapshot: Snapshot of the files written by the failed step batch
+        debug: Ask the debugger agent to fix the failure
     """
     print("Failure encountered:", error_msg)
-    retry_with_debugger(error_msg)
+    if debug:
+        retry_with_debugger(error_msg, snapshot)
 
-def retry_with_debugger(error_msg):
+def retry_with_debugger(error_msg, snapshot=None):
     """Retry execution with the debugger agent.
     
+    The debugger works on the files as the failed steps left them. If the
+    failed step batch was snapshotted (ROLLBACK_ON_FAILURE), its files are
+    kept when the debugger's steps succeed, and restored otherwise.
+    
     Args:
         error_msg: Error message
+        snapshot: Snapshot of the files written by the failed step batch
     """
-    new_steps = get_debugger_instructions(error_msg)
-    if new_steps:
-        execute_steps(new_steps)
-    else:
-        print("No revised instructions from debugger. Stopping.")
+    from agents import get_debugger_instructions
+    from snapshot_manager import discard_snapshot
+    from tracing import span
+    
+    with span("debugger.retry"):
+        new_steps = get_debugger_instructions(error_msg)
+        if new_steps:
+            if execute_steps(new_steps)["success"]:
+                if snapshot:
+                    discard_snapshot(snapshot)
+                return
+            print("The debugger's steps failed too.")
+        else:
+            print("No revised instructions from debugger. Stopping.")
+        _roll_back(snapshot)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,292 @@
+# src/metrics.py
+import threading
+
+DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+_registry = []
+
+class Metric:
+    """Base class for metrics rendered in Prometheus text exposition format."""
+    
+    kind = "untyped"
+    
+    def __init__(self, name, help_text, labels=()):
+        """Create and register a metric.
+        
+        Args:
+            name: Metric name
+            help_text: HELP line for the metric
+            labels: Names of the metric's labels
+        """
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+        _registry.append(self)
+    
+    def _key(self, labels):
+        """Get the value key for a label dictionary."""
+        return tuple(str(labels.get(label, "")) for label in self.labels)
+    
+    def _format_labels(self, key, extra=None):
+        """Format label values as {name="value",...}."""
+        pairs = list(zip(self.labels, key)) + list((extra or {}).items())
+        if not pairs:
+            return ""
+        inner = ",".join(f'{name}="{_escape(value)}"' for name, value in pairs)
+        return "{" + inner + "}"
+    
+    def render(self):
+        """Render the metric as exposition-format lines."""
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.extend(self._render_value(key, value))
+        return lines
+    
+    def _render_value(self, key, value):
+        return [f"{self.name}{self._format_labels(key)} {_format_number(value)}"]
+
+class Counter(Metric):
+    """Monotonically increasing count."""
+    
+    kind = "counter"
+    
+    def inc(self, amount=1, **labels):
+        """Increase the counter for a set of labels."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(Metric):
+    """Value that can go up and down, or is computed when scraped."""
+    
+    kind = "gauge"
+    
+    def __init__(self, name, help_text, labels=(), collect=None):
+        """Create a gauge.
+        
+        Args:
+            name: Metric name
+            help_text: HELP line for the metric
+            labels: Names of the metric's labels
+            collect: Optional callable returning {label tuple: value}, used
+                instead of stored values when the gauge is rendered
+        """
+        super().__init__(name, help_text, labels)
+        self.collect = collect
+    
+    def set(self, value, **labels):
+        """Set the gauge for a set of labels."""
+        with self._lock:
+            self._values[self._key(labels)] = value
+    
+    def inc(self, amount=1, **labels):
+        """Increase the gauge for a set of labels."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+    
+    def dec(self, amount=1, **labels):
+        """Decrease the gauge for a set of labels."""
+        self.inc(-amount, **labels)
+    
+    def render(self):
+        if self.collect:
+            try:
+                values = self.collect()
+            except Exception as e:
+                print(f"Error collecting metric {self.name}: {str(e)}")
+                values = {}
+            with self._lock:
+                self._values = dict(values)
+        return super().render()
+
+class Histogram(Metric):
+    """Distribution of observed values in cumulative buckets."""
+    
+    kind = "histogram"
+    
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+    
+    def observe(self, value, **labels):
+        """Record one observation for a set of labels."""
+        key = self._key(labels)
+        with self._lock:
+            counts, total, count = self._values.get(key, ((0,) * len(self.buckets), 0.0, 0))
+            counts = tuple(bucket + (value <= bound) for bucket, bound in zip(counts, self.buckets))
+            self._values[key] = (counts, total + value, count + 1)
+    
+    def _render_value(self, key, value):
+        counts, total, count = value
+        lines = []
+        for bound, bucket in zip(self.buckets, counts):
+            labels = self._format_labels(key, {"le": _format_number(bound)})
+            lines.append(f"{self.name}_bucket{labels} {bucket}")
+        lines.append(f"{self.name}_bucket{self._format_labels(key, {'le': '+Inf'})} {count}")
+        lines.append(f"{self.name}_sum{self._format_labels(key)} {_format_number(total)}")
+        lines.append(f"{self.name}_count{self._format_labels(key)} {count}")
+        return lines
+
+def render_metrics():
+    """Render every registered metric in Prometheus text exposition format.
+    
+    Returns:
+        Exposition text
+    """
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+def _escape(value):
+    """Escape a label value."""
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_number(value):
+    """Format a sample value."""
+    if isinstance(value, float):
+        return str(int(value)) if value.is_integer() else repr(value)
+    return str(value)
+
+def _cache_hit_ratios():
+    """Compute the prompt-cache hit ratio per LLM backend."""
+    with LLM_CALLS._lock:
+        calls = {}
+        for (backend, _), count in LLM_CALLS._values.items():
+            calls[backend] = calls.get(backend, 0) + count
+    with LLM_CACHE_HITS._lock:
+        hits = {backend: count for (backend,), count in LLM_CACHE_HITS._values.items()}
+    return {(backend,): hits.get(backend, 0) / count for backend, count in calls.items() if count}
+
+def _backend_circuits():
+    """Report whether each LLM backend's circuit breaker lets calls through."""
+    from backend_scheduler import scheduler
+    return {(backend,): int(state["circuit"] != "open") for backend, state in scheduler.status().items()}
+
+def _endpoint_health():
+    """Report whether each local model server endpoint is healthy."""
+    from llm_backends import local_backends
+    return {
+        (backend.name, endpoint["url"]): int(endpoint["healthy"])
+        for backend in local_backends()
+        for endpoint in backend.pool.status()
+    }
+
+def _background_processes():
+    """Count background processes started by run_command."""
+    from state_manager import load_state
+    return {(): len(load_state().get("background_processes", []))}
+
+TASKS = Counter(
+    "agents_cli_tasks_total",
+    "Tasks executed, by agent type and outcome",
+    ("agent", "status")
+)
+TASK_DURATION = Histogram(
+    "agents_cli_task_duration_seconds",
+    "Task execution time, by agent type",
+    ("agent",)
+)
+SPECULATIVE_PLANS = Counter(
+    "agents_cli_speculative_plans_total",
+    "Developer plans requested during task analysis, by whether they were used (hit) or discarded (miss)",
+    ("outcome",)
+)
+QUEUE_DEPTH = Gauge(
+    "agents_cli_queue_depth",
+    "Tasks accepted by the server and not yet finished"
+)
+STEP_DURATION = Histogram(
+    "agents_cli_step_duration_seconds",
+    "Step execution time, by action",
+    ("action",)
+)
+STEP_CPU_SECONDS = Histogram(
+    "agents_cli_step_cpu_seconds",
+    "CPU time used by the commands of a step, by action",
+    ("action",)
+)
+STEP_PEAK_MEMORY = Histogram(
+    "agents_cli_step_peak_memory_megabytes",
+    "Peak memory of the commands of a step, by action",
+    ("action",),
+    buckets=(16, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+)
+STEP_LIMITS_EXCEEDED = Counter(
+    "agents_cli_step_limits_exceeded_total",
+    "Commands stopped for exceeding a step limit, by limit",
+    ("limit",)
+)
+LLM_CALLS = Counter(
+    "agents_cli_llm_calls_total",
+    "LLM calls, by backend and outcome",
+    ("backend", "status")
+)
+LLM_CALL_DURATION = Histogram(
+    "agents_cli_llm_call_duration_seconds",
+    "LLM call latency, by backend",
+    ("backend",)
+)
+LLM_PROMPT_TOKENS = Histogram(
+    "agents_cli_llm_prompt_tokens",
+    "Prompt tokens sent per LLM call, by agent",
+    ("agent",),
+    buckets=(64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+)
+LLM_RETRIES = Counter(
+    "agents_cli_llm_retries_total",
+    "LLM call attempts retried after a retryable error, by backend",
+    ("backend",)
+)
+LLM_JSON_REPAIRS = Counter(
+    "agents_cli_llm_json_repairs_total",
+    "Re-asks for a reply that did not match its JSON schema, by schema and outcome",
+    ("schema", "outcome")
+)
+LLM_COALESCED = Counter(
+    "agents_cli_llm_coalesced_calls_total",
+    "LLM requests answered by sharing an identical in-flight call, by backend",
+    ("backend",)
+)
+LLM_HEDGES = Counter(
+    "agents_cli_llm_hedged_calls_total",
+    "LLM requests duplicated to a second backend, by which request answered first",
+    ("winner",)
+)
+LLM_CACHE_HITS = Counter(
+    "agents_cli_llm_cache_hits_total",
+    "LLM calls served partly from the provider's prompt cache, by backend",
+    ("backend",)
+)
+LLM_CACHE_HIT_RATIO = Gauge(
+    "agents_cli_llm_cache_hit_ratio",
+    "Fraction of LLM calls with a prompt cache hit, by backend",
+    ("backend",),
+    collect=_cache_hit_ratios
+)
+LLM_BACKEND_AVAILABLE = Gauge(
+    "agents_cli_llm_backend_available",
+    "1 if the backend's circuit breaker is closed or half-open, 0 if open",
+    ("backend",),
+    collect=_backend_circuits
+)
+LLM_ENDPOINT_REQUESTS = Counter(
+    "agents_cli_llm_endpoint_requests_total",
+    "Requests sent to each endpoint of a load-balanced LLM backend",
+    ("backend", "endpoint")
+)
+LLM_ENDPOINT_HEALTHY = Gauge(
+    "agents_cli_llm_endpoint_healthy",
+    "1 if a local model server endpoint passed its last health check, 0 if not",
+    ("backend", "endpoint"),
+    collect=_endpoint_health
+)
+BACKGROUND_PROCESSES = Gauge(
+    "agents_cli_background_processes",
+    "Background processes started by steps and not yet killed",
+    collect=_background_processes
+)
@@ -7,10 +7,13 @@ Actions:
 - create_venv: {"action": "create_venv", "path": "./venv"}
 - install_deps: {"action": "install_deps", "deps": ["..."]}
 - create_file: {"action": "create_file", "path": "file", "content": "..."}
+- patch_file: {"action": "patch_file", "path": "file", "diff": "unified diff"}
+  or {"action": "patch_file", "path": "file", "edits": [{"search": "exact old text", "replace": "new text"}]}
 - run_file: {"action": "run_file", "file": "file.py", "venv": "./venv"}
 - run_command: {"action": "run_command", "command": "...", "background": true/false}
 
 If running a server, do it in background and then run tests. Finally kill the server.
+To change an existing file, prefer patch_file over rewriting the whole file.
 
 Return only JSON.
 """
@@ -28,6 +31,8 @@ Return steps in JSON only, following the allowed actions."""
 
 TESTER_SYSTEM_PROMPT = """You are a Tester Agent.
 If tests fail, provide steps to fix them (like modifying files or installing missing deps).
+To change an existing file, use a patch_file step with a unified "diff" or
+"edits" of the form [{"search": "exact old text", "replace": "new text"}].
 Return only JSON.
 """
 
@@ -35,14 +40,17 @@ TESTER_USER_PROMPT = """Tests have been run. If they failed, fix them by returni
 
 DEBUGGER_SYSTEM_PROMPT = """You are a Debugger Agent.
 You receive error logs. Provide JSON steps to fix code or dependencies.
+Fix code with patch_file steps rather than rewriting whole files:
+{"action": "patch_file", "path": "file", "diff": "unified diff"}
+or {"action": "patch_file", "path": "file", "edits": [{"search": "exact old text", "replace": "new text"}]}
 """
 
 # The debugger user prompt will be dynamic, including the error message.
 
 # New system prompts
 
-CODE_GENERATION_SYSTEM_PROMPT = """You are an expert {language} developer. 
-You need to generate production-ready code.
+CODE_GENERATION_SYSTEM_PROMPT = """You are an expert software developer. 
+You need to generate production-ready code in the language given in the request.
 
 Follow these guidelines:
 1. Write clean, efficient, and well-documented code
@@ -69,10 +77,15 @@ Return a JSON object with an "actions" array of actions to perform. Each action
 3. Modify a file:
    {"type": "modify_file", "path": "path/to/file.py", "content": "new file content"}
 
-4. Run a command in terminal:
+4. Patch part of a file (preferred over modify_file for existing files):
+   {"type": "patch_file", "path": "path/to/file.py", "diff": "unified diff"}
+   or {"type": "patch_file", "path": "path/to/file.py", "edits": [{"search": "exact old text", "replace": "new text"}]}
+   Each search text must match the file exactly once.
+
+5. Run a command in terminal:
    {"type": "run_terminal", "command": "python script.py"}
 
-5. Run a shell command directly:
+6. Run a shell command directly:
    {"type": "run_shell", "command": "ls -la", "background": false}
 
 For example:
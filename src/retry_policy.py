@@ -0,0 +1,152 @@
+# src/retry_policy.py
+import os
+import time
+import random
+import contextvars
+from contextlib import contextmanager
+import metrics
+
+# Statuses worth retrying: timeouts, rate limits and server-side failures
+RETRYABLE_STATUSES = {408, 409, 425, 429, 500, 502, 503, 504}
+
+# Overall time budget of a task, passed down to every LLM call it makes
+TASK_DEADLINE_SECONDS = float(os.getenv("TASK_DEADLINE_SECONDS", "600"))
+
+# Default timeouts per backend; local models are often slower than hosted ones
+DEFAULT_TIMEOUTS = {"openai": 60, "claude": 60, "local": 120}
+
+_deadline = contextvars.ContextVar("llm_deadline", default=None)
+
+class DeadlineExceeded(Exception):
+    """Raised when a call is attempted after its task's deadline has passed."""
+
+def get_policy(backend):
+    """Get the retry policy of a backend.
+    
+    Each setting can be overridden per backend (e.g. LLM_LOCAL_TIMEOUT) or for
+    all backends (e.g. LLM_TIMEOUT).
+    
+    Args:
+        backend: Backend name
+    
+    Returns:
+        Dictionary with timeout, max_attempts, backoff_base and backoff_max
+    """
+    def setting(name, default):
+        value = os.getenv(f"LLM_{backend.upper()}_{name}") or os.getenv(f"LLM_{name}")
+        return float(value) if value else default
+    
+    return {
+        "timeout": setting("TIMEOUT", DEFAULT_TIMEOUTS.get(backend, 60)),
+        "max_attempts": max(1, int(setting("MAX_ATTEMPTS", 3))),
+        "backoff_base": setting("BACKOFF_BASE", 0.5),
+        "backoff_max": setting("BACKOFF_MAX", 8.0)
+    }
+
+@contextmanager
+def deadline(seconds):
+    """Give the calls made in a block at most this many seconds in total.
+    
+    Nested deadlines never extend an outer one. The deadline is a context
+    variable, so it follows calls into threads started with bind_context.
+    
+    Args:
+        seconds: Time budget; None or a value <= 0 means no deadline
+    """
+    current = _deadline.get()
+    if seconds and seconds > 0:
+        new = time.monotonic() + seconds
+        current = min(current, new) if current is not None else new
+    token = _deadline.set(current)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+def remaining_time():
+    """Get the time left before the current deadline.
+    
+    Returns:
+        Seconds remaining (possibly negative), or None without a deadline
+    """
+    current = _deadline.get()
+    return None if current is None else current - time.monotonic()
+
+def call_with_retries(backend, call):
+    """Run a backend call under the backend's retry policy and the deadline.
+    
+    Failed attempts are retried after an exponential backoff with full
+    jitter, but only for retryable errors (see is_retryable). Each attempt's
+    timeout is cut short so that it never outlives the current deadline.
+    
+    Args:
+        backend: Backend name, used to look up the policy
+        call: Function taking the attempt's timeout in seconds
+    
+    Returns:
+        The result of call
+    
+    Raises:
+        DeadlineExceeded: If the deadline passes before a call succeeds
+        Exception: The last error, once it is not retryable or attempts run out
+    """
+    policy = get_policy(backend)
+    attempt = 1
+    while True:
+        timeout = attempt_timeout(policy["timeout"])
+        try:
+            return call(timeout)
+        except Exception as e:
+            if attempt >= policy["max_attempts"] or not is_retryable(e):
+                raise
+            delay = random.uniform(0, min(policy["backoff_max"], policy["backoff_base"] * 2 ** (attempt - 1)))
+            remaining = remaining_time()
+            if remaining is not None and remaining <= delay:
+                raise
+            print(f"Retrying {backend} call in {delay:.2f}s after error: {str(e)}")
+            metrics.LLM_RETRIES.inc(backend=backend)
+            time.sleep(delay)
+            attempt += 1
+
+def is_retryable(error):
+    """Check whether an error from a backend call is worth retrying.
+    
+    Works with OpenAI and Anthropic SDK errors and with requests exceptions
+    without importing either library.
+    
+    Args:
+        error: Exception raised by a call
+    
+    Returns:
+        True for timeouts, connection failures and retryable HTTP statuses
+    """
+    if isinstance(error, DeadlineExceeded):
+        return False
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    if status is not None:
+        return status in RETRYABLE_STATUSES
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    name = type(error).__name__
+    return "Timeout" in name or "Connection" in name
+
+def attempt_timeout(timeout):
+    """Cap an attempt's timeout by the time left before the deadline.
+    
+    Args:
+        timeout: The attempt's timeout in seconds
+    
+    Returns:
+        Seconds the attempt may take
+    
+    Raises:
+        DeadlineExceeded: If the deadline has already passed
+    """
+    remaining = remaining_time()
+    if remaining is None:
+        return timeout
+    if remaining <= 0:
+        raise DeadlineExceeded("Task deadline exceeded")
+    return min(timeout, remaining)
@@ -0,0 +1,383 @@
+# src/sandbox.py
+import os
+import time
+import signal
+import itertools
+import threading
+import subprocess
+import metrics
+
+# Wall-clock limit for a foreground command, in seconds (0 for none)
+STEP_TIMEOUT = float(os.getenv("STEP_TIMEOUT_SECONDS", "600"))
+# rlimits applied to every command (0 for none): CPU seconds, address space,
+# and size of any file it writes
+STEP_CPU_SECONDS = int(os.getenv("STEP_CPU_SECONDS", "0"))
+STEP_MEMORY_MB = int(os.getenv("STEP_MEMORY_MB", "0"))
+STEP_FILE_SIZE_MB = int(os.getenv("STEP_FILE_SIZE_MB", "0"))
+# Output kept from each stream of a command, split between its start and end
+STEP_OUTPUT_LIMIT_KB = int(os.getenv("STEP_OUTPUT_LIMIT_KB", "1024"))
+# Delegated cgroup v2 directory (e.g. /sys/fs/cgroup/agents) to run each
+# command in a child cgroup of; memory is then limited by the cgroup rather
+# than by rlimit. Empty to use rlimits only
+STEP_CGROUP = os.getenv("STEP_CGROUP", "")
+# cgroup limits (0 for none): CPU cores and number of processes
+STEP_CPU_CORES = float(os.getenv("STEP_CPU_CORES", "0"))
+STEP_MAX_PIDS = int(os.getenv("STEP_MAX_PIDS", "0"))
+
+_cgroup_ids = itertools.count()
+_cgroup_disabled = False
+
+class Cgroup:
+    """A cgroup v2 child group that one command runs in."""
+    
+    def __init__(self, path):
+        """Initialize a cgroup.
+        
+        Args:
+            path: Directory of the cgroup
+        """
+        self.path = path
+    
+    @classmethod
+    def create(cls):
+        """Create a cgroup with the configured limits under STEP_CGROUP.
+        
+        Returns:
+            Cgroup, or None if cgroups are not configured or not usable
+        """
+        global _cgroup_disabled
+        if not STEP_CGROUP or _cgroup_disabled:
+            return None
+        cgroup = cls(os.path.join(STEP_CGROUP, f"step-{os.getpid()}-{next(_cgroup_ids)}"))
+        try:
+            os.mkdir(cgroup.path)
+            if STEP_MEMORY_MB:
+                cgroup._write("memory.max", str(STEP_MEMORY_MB * 1024 * 1024))
+                cgroup._write("memory.swap.max", "0")
+            if STEP_CPU_CORES:
+                cgroup._write("cpu.max", f"{int(STEP_CPU_CORES * 100000)} 100000")
+            if STEP_MAX_PIDS:
+                cgroup._write("pids.max", str(STEP_MAX_PIDS))
+            return cgroup
+        except OSError as e:
+            print(f"Cannot use cgroup {STEP_CGROUP}, limiting commands with rlimits only: {str(e)}")
+            _cgroup_disabled = True
+            cgroup.remove()
+            return None
+    
+    def usage(self):
+        """Get the CPU seconds and peak memory (bytes) of the cgroup's processes."""
+        cpu_seconds = None
+        peak = None
+        stat = self._read("cpu.stat")
+        for line in (stat or "").splitlines():
+            if line.startswith("usage_usec "):
+                cpu_seconds = int(line.split()[1]) / 1e6
+        # memory.peak needs Linux 5.19
+        value = self._read("memory.peak")
+        if value and value.strip().isdigit():
+            peak = int(value)
+        return cpu_seconds, peak
+    
+    def oom_killed(self):
+        """Check whether the kernel killed a process for exceeding memory.max."""
+        for line in (self._read("memory.events") or "").splitlines():
+            if line.startswith("oom_kill "):
+                return int(line.split()[1]) > 0
+        return False
+    
+    def kill(self):
+        """Kill every process left in the cgroup (needs Linux 5.14)."""
+        try:
+            self._write("cgroup.kill", "1")
+        except OSError:
+            pass
+    
+    def remove(self):
+        """Remove the cgroup, waiting briefly for killed processes to exit."""
+        for _ in range(20):
+            try:
+                os.rmdir(self.path)
+                return
+            except FileNotFoundError:
+                return
+            except OSError:
+                time.sleep(0.05)
+    
+    def _read(self, name):
+        """Read a cgroup interface file, or None if it is unavailable."""
+        try:
+            with open(os.path.join(self.path, name), "r") as f:
+                return f.read()
+        except OSError:
+            return None
+    
+    def _write(self, name, value):
+        """Write a cgroup interface file."""
+        with open(os.path.join(self.path, name), "w") as f:
+            f.write(value)
+
+class OutputCapture:
+    """Reads a stream to its end, keeping at most STEP_OUTPUT_LIMIT_KB of it.
+    
+    The first and last halves of the limit are kept, so that both how a
+    command started and how it failed are in its output.
+    """
+    
+    def __init__(self, stream):
+        """Start reading a stream in a background thread.
+        
+        Args:
+            stream: Binary pipe of a process
+        """
+        self.limit = STEP_OUTPUT_LIMIT_KB * 1024
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.total = 0
+        self._thread = threading.Thread(target=self._read, args=(stream,), daemon=True)
+        self._thread.start()
+    
+    def _read(self, stream):
+        """Read the stream until it closes."""
+        half = self.limit // 2
+        with stream:
+            for chunk in iter(lambda: stream.read(65536), b""):
+                self.total += len(chunk)
+                if not self.limit:
+                    self.head += chunk
+                    continue
+                room = half - len(self.head)
+                if room > 0:
+                    self.head += chunk[:room]
+                    chunk = chunk[room:]
+                self.tail += chunk
+                if len(self.tail) > self.limit - half:
+                    del self.tail[:len(self.tail) - (self.limit - half)]
+    
+    @property
+    def truncated(self):
+        """Whether output was dropped to stay within the limit."""
+        return self.total > len(self.head) + len(self.tail)
+    
+    def text(self):
+        """Wait for the stream to end and get the kept output."""
+        self._thread.join()
+        if not self.truncated:
+            return (self.head + self.tail).decode("utf-8", errors="replace")
+        dropped = self.total - len(self.head) - len(self.tail)
+        return (
+            self.head.decode("utf-8", errors="replace")
+            + f"\n... [{dropped} bytes of output truncated] ...\n"
+            + self.tail.decode("utf-8", errors="replace")
+        )
+
+def limited_command(command, cgroup=None):
+    """Get the arguments for Popen that run a command within the rlimits.
+    
+    The limits are set by a shell wrapping the command, since a preexec_fn
+    is not safe to run in a process with threads. With a cgroup, the wrapper
+    then stops itself until join_cgroup has moved it into the cgroup, so that
+    nothing the command starts runs outside of it.
+    
+    Args:
+        command: Shell command
+        cgroup: Cgroup the command will run in, or None
+    
+    Returns:
+        Shell command, or a list of arguments for the wrapper (run without
+        shell=True)
+    """
+    if os.name != "posix":
+        # Windows has no rlimits; commands run without them
+        return command
+    limits = []
+    if STEP_CPU_SECONDS:
+        # SIGXCPU at the soft limit, SIGKILL a second later
+        limits.append(f"ulimit -S -t {STEP_CPU_SECONDS}")
+        limits.append(f"ulimit -H -t {STEP_CPU_SECONDS + 1}")
+    if STEP_MEMORY_MB and not cgroup:
+        # In kilobytes
+        limits.append(f"ulimit -v {STEP_MEMORY_MB * 1024}")
+    if STEP_FILE_SIZE_MB:
+        # In 512-byte blocks
+        limits.append(f"ulimit -f {STEP_FILE_SIZE_MB * 2048}")
+    if cgroup:
+        limits.append("kill -STOP $$")
+    if not limits:
+        return command
+    script = " && ".join(limits) + ' || exit 126\nexec /bin/sh -c "$1"'
+    return ["/bin/sh", "-c", script, "sh", command]
+
+def join_cgroup(process, cgroup):
+    """Move a command started with limited_command into its cgroup.
+    
+    Waits for the wrapper to stop itself, moves it into the cgroup and lets
+    it continue. If it cannot be moved, the command is killed.
+    
+    Args:
+        process: Popen of the command
+        cgroup: Cgroup to move it into, or None
+    
+    Raises:
+        OSError: If the command could not be moved into the cgroup
+    """
+    if not cgroup:
+        return
+    try:
+        # WNOWAIT leaves the wrapper's exit, if it failed to set a limit, for
+        # the caller to reap
+        info = os.waitid(os.P_PID, process.pid, os.WSTOPPED | os.WEXITED | os.WNOWAIT)
+        if info.si_code == os.CLD_STOPPED:
+            cgroup._write("cgroup.procs", str(process.pid))
+    except OSError:
+        process.kill()
+        cgroup.remove()
+        raise
+    finally:
+        os.kill(process.pid, signal.SIGCONT)
+
+def start_limited(command, cwd=None, env=None):
+    """Start a background command with the rlimits and cgroup limits.
+    
+    Args:
+        command: Shell command
+        cwd: Working directory
+        env: Environment, or None to inherit it
+    
+    Returns:
+        (Popen, Cgroup or None)
+    """
+    cgroup = Cgroup.create()
+    args = limited_command(command, cgroup)
+    process = subprocess.Popen(
+        args, cwd=cwd, env=env, shell=isinstance(args, str), stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        text=True
+    )
+    join_cgroup(process, cgroup)
+    return process, cgroup
+
+def run_limited(command, cwd=None, env=None):
+    """Run a command to completion within the step limits.
+    
+    The command runs in its own session, so that on timeout the processes it
+    started are killed with it.
+    
+    Args:
+        command: Shell command
+        cwd: Working directory
+        env: Environment, or None to inherit it
+    
+    Returns:
+        Dictionary with returncode, stdout, stderr, the limit the command
+        exceeded (or None), and its resource usage
+    """
+    if not hasattr(os, "wait4"):
+        return _run_unlimited(command, cwd, env)
+    
+    cgroup = Cgroup.create()
+    started = time.perf_counter()
+    args = limited_command(command, cgroup)
+    process = subprocess.Popen(
+        args, cwd=cwd, env=env, shell=isinstance(args, str), stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        start_new_session=True
+    )
+    join_cgroup(process, cgroup)
+    stdout = OutputCapture(process.stdout)
+    stderr = OutputCapture(process.stderr)
+    timed_out = threading.Event()
+    timer = None
+    if STEP_TIMEOUT > 0:
+        timer = threading.Timer(STEP_TIMEOUT, _kill_session, (process, cgroup, timed_out))
+        timer.daemon = True
+        timer.start()
+    
+    # Like communicate(), wait for the output to end before reaping the
+    # command, then reap it with wait4 to get the resources it used
+    out, err = stdout.text(), stderr.text()
+    _, status, rusage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    if timer:
+        timer.cancel()
+    
+    usage = {
+        "wall_seconds": round(time.perf_counter() - started, 3),
+        "cpu_seconds": round(rusage.ru_utime + rusage.ru_stime, 3),
+        # ru_maxrss is in kilobytes on Linux
+        "max_rss_mb": round(rusage.ru_maxrss / 1024, 1),
+        "output_bytes": stdout.total + stderr.total,
+        "output_truncated": stdout.truncated or stderr.truncated
+    }
+    limit = None
+    if cgroup:
+        cpu_seconds, peak = cgroup.usage()
+        if cpu_seconds is not None:
+            usage["cpu_seconds"] = round(cpu_seconds, 3)
+        if peak is not None:
+            usage["max_rss_mb"] = round(peak / (1024 * 1024), 1)
+        if cgroup.oom_killed():
+            limit = "memory"
+        cgroup.kill()
+        cgroup.remove()
+    
+    killed_by = _signal_of(process.returncode)
+    if timed_out.is_set():
+        limit = "timeout"
+    elif killed_by == signal.SIGXCPU or (
+        STEP_CPU_SECONDS and killed_by == signal.SIGKILL and usage["cpu_seconds"] >= STEP_CPU_SECONDS
+    ):
+        limit = "cpu"
+    elif killed_by == signal.SIGXFSZ:
+        limit = "file_size"
+    elif STEP_MEMORY_MB and not cgroup and process.returncode != 0 and "MemoryError" in err:
+        limit = "memory"
+    if limit:
+        metrics.STEP_LIMITS_EXCEEDED.inc(limit=limit)
+    return {"returncode": process.returncode, "stdout": out, "stderr": err, "limit": limit, "usage": usage}
+
+def limit_message(limit):
+    """Describe a limit a command exceeded, for its step output."""
+    return {
+        "timeout": f"Command timed out after {STEP_TIMEOUT:g}s",
+        "cpu": f"Command exceeded its CPU time limit of {STEP_CPU_SECONDS}s",
+        "memory": f"Command exceeded its memory limit of {STEP_MEMORY_MB} MB",
+        "file_size": f"Command exceeded its file size limit of {STEP_FILE_SIZE_MB} MB"
+    }[limit]
+
+def _signal_of(returncode):
+    """Get the signal that ended a command, or None.
+    
+    The shell reports a command it ran that was killed by signal N as
+    exit status 128 + N.
+    """
+    if returncode < 0:
+        return -returncode
+    if returncode > 128:
+        return returncode - 128
+    return None
+
+def _kill_session(process, cgroup, timed_out):
+    """Kill a command and every process in its session."""
+    timed_out.set()
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except OSError:
+        pass
+    if cgroup:
+        cgroup.kill()
+
+def _run_unlimited(command, cwd, env):
+    """Run a command with only the wall-clock limit, where wait4 is unavailable."""
+    started = time.perf_counter()
+    try:
+        result = subprocess.run(
+            command, cwd=cwd, env=env, shell=True, capture_output=True, text=True,
+            timeout=STEP_TIMEOUT or None
+        )
+        returncode, out, err, limit = result.returncode, result.stdout, result.stderr, None
+    except subprocess.TimeoutExpired as e:
+        returncode, limit = None, "timeout"
+        out = e.stdout.decode(errors="replace") if isinstance(e.stdout, bytes) else e.stdout or ""
+        err = e.stderr.decode(errors="replace") if isinstance(e.stderr, bytes) else e.stderr or ""
+        metrics.STEP_LIMITS_EXCEEDED.inc(limit=limit)
+    usage = {"wall_seconds": round(time.perf_counter() - started, 3)}
+    return {"returncode": returncode, "stdout": out, "stderr": err, "limit": limit, "usage": usage}
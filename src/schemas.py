@@ -0,0 +1,150 @@
+# src/schemas.py
+
+# JSON schemas of the agents' replies. They are sent to backends that support
+# schema-constrained output and checked with validate() after parsing.
+
+STEP_ACTIONS = [
+    "create_venv",
+    "install_deps",
+    "create_file",
+    "modify_file",
+    "patch_file",
+    "run_file",
+    "run_command",
+    "kill_process",
+    "open_file",
+    "run_terminal"
+]
+
+_EDITS = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "required": ["search", "replace"],
+        "properties": {
+            "search": {"type": "string"},
+            "replace": {"type": "string"}
+        }
+    }
+}
+
+STEPS_SCHEMA = {
+    "title": "steps",
+    "type": "object",
+    "required": ["steps"],
+    "properties": {
+        "steps": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "required": ["action"],
+                "properties": {
+                    "action": {"type": "string", "enum": STEP_ACTIONS},
+                    "path": {"type": "string"},
+                    "file": {"type": "string"},
+                    "venv": {"type": "string"},
+                    "content": {"type": "string"},
+                    "deps": {"type": "array", "items": {"type": "string"}},
+                    "command": {"type": "string"},
+                    "background": {"type": "boolean"},
+                    "diff": {"type": "string"},
+                    "edits": _EDITS
+                }
+            }
+        }
+    }
+}
+
+CURSOR_ACTIONS_SCHEMA = {
+    "title": "cursor_actions",
+    "type": "object",
+    "required": ["actions"],
+    "properties": {
+        "actions": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "required": ["type"],
+                "properties": {
+                    "type": {
+                        "type": "string",
+                        "enum": ["open_file", "create_file", "modify_file", "patch_file", "run_terminal", "run_shell"]
+                    },
+                    "path": {"type": "string"},
+                    "content": {"type": "string"},
+                    "command": {"type": "string"},
+                    "background": {"type": "boolean"},
+                    "diff": {"type": "string"},
+                    "edits": _EDITS
+                }
+            }
+        }
+    }
+}
+
+ROUTER_SCHEMA = {
+    "title": "router",
+    "type": "object",
+    "required": ["route_to", "complexity"],
+    "properties": {
+        "route_to": {"type": "string", "enum": ["local", "claude"]},
+        "complexity": {"type": "string", "enum": ["low", "medium", "high"]},
+        "explanation": {"type": "string"}
+    }
+}
+
+TASK_ANALYSIS_SCHEMA = {
+    "title": "task_analysis",
+    "type": "object",
+    "required": ["complexity", "agent", "instructions"],
+    "properties": {
+        "complexity": {"type": "string", "enum": ["low", "medium", "high"]},
+        "agent": {"type": "string", "enum": ["developer", "code_generation", "tester", "debugger", "cursor"]},
+        "instructions": {"type": "string"},
+        "file_paths": {"type": "array", "items": {"type": "string"}},
+        "language": {"type": "string"}
+    }
+}
+
+_TYPES = {
+    "object": dict,
+    "array": list,
+    "string": str,
+    "boolean": bool,
+    "number": (int, float),
+    "integer": int
+}
+
+def validate(data, schema, path="$"):
+    """Check parsed JSON against a schema.
+    
+    Supports the subset of JSON Schema used in this module: type, required,
+    properties, items and enum. Properties that are not listed are allowed.
+    
+    Args:
+        data: Parsed JSON value
+        schema: Schema dictionary
+        path: Location of data in the document, used in error messages
+    
+    Returns:
+        List of error messages (empty if data is valid)
+    """
+    expected = schema.get("type")
+    if expected:
+        if not isinstance(data, _TYPES[expected]) or (expected != "boolean" and isinstance(data, bool)):
+            return [f"{path} should be of type {expected}"]
+    if "enum" in schema and data not in schema["enum"]:
+        return [f"{path} should be one of {', '.join(map(str, schema['enum']))}, not {data!r}"]
+    
+    errors = []
+    if isinstance(data, dict):
+        for key in schema.get("required", ()):
+            if key not in data:
+                errors.append(f"{path} is missing required field '{key}'")
+        for key, subschema in schema.get("properties", {}).items():
+            if data.get(key) is not None:
+                errors.extend(validate(data[key], subschema, f"{path}.{key}"))
+    elif isinstance(data, list) and "items" in schema:
+        for index, item in enumerate(data):
+            errors.extend(validate(item, schema["items"], f"{path}[{index}]"))
+    return errors
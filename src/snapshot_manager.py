@@ -0,0 +1,201 @@
+# src/snapshot_manager.py
+import os
+import time
+import shutil
+import uuid
+from pathlib import Path
+from file_manager import file_digest, discard_writes
+
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", ".agent_snapshots")
+ROLLBACK_ON_FAILURE = os.getenv("ROLLBACK_ON_FAILURE", "false").lower() == "true"
+# A snapshot not discarded after this long was left by a process that died,
+# and is discarded by the next process to take a snapshot
+STALE_SNAPSHOT_SECONDS = 24 * 3600
+
+_stale_checked = False
+
+def touched_paths(steps, actions=("create_file", "modify_file", "patch_file")):
+    """Get the paths a list of steps will write to.
+    
+    Args:
+        steps: List of steps
+        actions: Step actions that write their "path"
+    
+    Returns:
+        List of file paths, without duplicates
+    """
+    paths = []
+    for step in steps:
+        path = step.get("path")
+        if step.get("action") in actions and path and path not in paths:
+            paths.append(path)
+    return paths
+
+def take_snapshot(paths):
+    """Snapshot the current contents of the given files.
+    
+    Each snapshot keeps a copy of every file under SNAPSHOT_DIR/snapshots/<id>,
+    named by its digest. Copies are shared between snapshots through
+    SNAPSHOT_DIR/blobs: a file whose digest is already stored is hardlinked
+    from there rather than copied again. A blob's link count is then its
+    reference count, so discarding a snapshot only looks at its own files.
+    The live files are always copied, never linked, since a file can be
+    modified in place (by an append or a command) after the snapshot.
+    
+    Args:
+        paths: Files to snapshot; missing files are recorded as absent
+    
+    Returns:
+        Snapshot dictionary to pass to restore_snapshot and discard_snapshot
+    """
+    global _stale_checked
+    if not _stale_checked:
+        _stale_checked = True
+        _discard_stale_snapshots()
+    snapshot = {"id": uuid.uuid4().hex, "files": {}, "restored": False, "discarded": False}
+    os.makedirs(_snapshot_dir(snapshot["id"]))
+    for path in paths:
+        abs_path = os.path.abspath(path)
+        digest = file_digest(abs_path)
+        if digest:
+            digest = _store_copy(snapshot["id"], abs_path, digest)
+        snapshot["files"][abs_path] = digest
+    return snapshot
+
+def restore_snapshot(snapshot):
+    """Restore the files of a snapshot to their snapshotted contents.
+    
+    Only the files recorded in the snapshot are touched, and files that
+    already match are left alone.
+    
+    Args:
+        snapshot: Snapshot dictionary from take_snapshot
+    
+    Returns:
+        True if every file was restored, False otherwise
+    """
+    discard_writes(snapshot["files"])
+    success = True
+    for abs_path, digest in snapshot["files"].items():
+        try:
+            if digest is None:
+                if os.path.isfile(abs_path):
+                    os.remove(abs_path)
+            elif file_digest(abs_path) != digest:
+                success = _restore_copy(snapshot["id"], abs_path, digest) and success
+        except Exception as e:
+            print(f"Error restoring {abs_path}: {str(e)}")
+            success = False
+    snapshot["restored"] = True
+    return success
+
+def discard_snapshot(snapshot):
+    """Discard a snapshot, leaving its files as they are.
+    
+    The snapshot can no longer be restored. Its copies are removed, along
+    with the blobs no other snapshot refers to.
+    
+    Args:
+        snapshot: Snapshot dictionary from take_snapshot
+    """
+    if snapshot["discarded"]:
+        return
+    snapshot["discarded"] = True
+    _remove_snapshot_dir(snapshot["id"])
+
+def _snapshot_dir(snapshot_id):
+    """Get the directory holding a snapshot's copies."""
+    return os.path.join(SNAPSHOT_DIR, "snapshots", snapshot_id)
+
+def _blob_path(digest):
+    """Get the blob store path for a digest."""
+    return os.path.join(SNAPSHOT_DIR, "blobs", digest[:2], digest)
+
+def _store_copy(snapshot_id, abs_path, digest):
+    """Store a copy of a file in a snapshot, sharing its blob if there is one.
+    
+    Returns:
+        Digest of the stored copy, which differs from digest if the file
+        changed while it was being copied
+    """
+    copy_path = os.path.join(_snapshot_dir(snapshot_id), digest)
+    if os.path.exists(copy_path):
+        # Another of the snapshot's files has the same contents
+        return digest
+    blob = _blob_path(digest)
+    try:
+        os.link(blob, copy_path)
+        return digest
+    except FileNotFoundError:
+        pass
+    except OSError:
+        # No hardlinks on this filesystem
+        if os.path.exists(blob):
+            shutil.copy2(blob, copy_path)
+            return digest
+    
+    temp_path = f"{copy_path}.tmp"
+    shutil.copy2(abs_path, temp_path)
+    stored = file_digest(temp_path)
+    copy_path = os.path.join(_snapshot_dir(snapshot_id), stored)
+    os.replace(temp_path, copy_path)
+    blob = _blob_path(stored)
+    try:
+        Path(blob).parent.mkdir(parents=True, exist_ok=True)
+        os.link(copy_path, blob)
+    except OSError:
+        # Already stored by another snapshot, or no hardlinks; the copy is
+        # kept in this snapshot either way
+        pass
+    return stored
+
+def _restore_copy(snapshot_id, abs_path, digest):
+    """Put a snapshot's copy of a file back at abs_path, verifying it first."""
+    copy_path = os.path.join(_snapshot_dir(snapshot_id), digest)
+    if file_digest(copy_path) != digest:
+        print(f"Snapshot of {abs_path} is missing or was modified; not restoring it")
+        return False
+    Path(abs_path).parent.mkdir(parents=True, exist_ok=True)
+    temp_path = f"{abs_path}.{uuid.uuid4().hex[:8]}.tmp"
+    shutil.copy2(copy_path, temp_path)
+    os.replace(temp_path, abs_path)
+    return True
+
+def _remove_snapshot_dir(snapshot_id):
+    """Remove a snapshot's copies and the blobs left without references."""
+    directory = _snapshot_dir(snapshot_id)
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return
+    for name in names:
+        try:
+            os.remove(os.path.join(directory, name))
+            blob = _blob_path(name)
+            # Only the blob store's own link is left
+            if os.stat(blob).st_nlink == 1:
+                os.remove(blob)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"Error removing snapshot copy {name}: {str(e)}")
+    try:
+        os.rmdir(directory)
+    except OSError:
+        pass
+
+def _discard_stale_snapshots():
+    """Discard the snapshots left behind by processes that died."""
+    snapshots_dir = os.path.join(SNAPSHOT_DIR, "snapshots")
+    try:
+        names = os.listdir(snapshots_dir)
+    except FileNotFoundError:
+        return
+    now = time.time()
+    for name in names:
+        try:
+            stale = now - os.path.getmtime(os.path.join(snapshots_dir, name)) > STALE_SNAPSHOT_SECONDS
+        except OSError:
+            continue
+        if stale:
+            _remove_snapshot_dir(name)
@@ -1,6 +1,14 @@
+import os
 import json
-from llm_client import ask_llm, extract_json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import metrics
+from tracing import trace, traced, current_trace_id, bind_context
+from retry_policy import TASK_DEADLINE_SECONDS, DeadlineExceeded, deadline
+from llm_client import ask_json
 from prompts import TASK_MANAGER_SYSTEM_PROMPT, ROUTER_SYSTEM_PROMPT
+from schemas import ROUTER_SCHEMA, TASK_ANALYSIS_SCHEMA
 from agents import (
     get_developer_instructions,
     get_tester_instructions,
@@ -9,13 +17,41 @@ from agents import (
     execute_cursor_commands
 )
 
+# Ask the developer agent for a plan while the task is still being analyzed,
+# and keep it if the analysis picks the developer agent
+SPECULATIVE_PLANNING = os.getenv("TASK_SPECULATIVE_PLANNING", "false").lower() == "true"
+# Complexity the speculative plan is requested at; it is discarded if the
+# analysis rates the task as more complex
+SPECULATIVE_COMPLEXITY = os.getenv("TASK_SPECULATIVE_COMPLEXITY", "medium").lower()
+
+COMPLEXITY_ORDER = ["low", "medium", "high"]
+
+# Threads for speculative plans, started on first use
+_speculation_pool = None
+_speculation_pool_lock = threading.Lock()
+
+def _get_speculation_pool():
+    """Get the thread pool that runs speculative plans, creating it on first use."""
+    global _speculation_pool
+    with _speculation_pool_lock:
+        if _speculation_pool is None:
+            _speculation_pool = ThreadPoolExecutor(thread_name_prefix="speculative-plan")
+        return _speculation_pool
+
 class TaskManager:
     """Main task manager that coordinates different agents."""
     
     def __init__(self):
         """Initialize the task manager."""
         self.history = []
+        self.speculation = {"hits": 0, "misses": 0}
+        # Tasks running now, and the directory to return to while a resumed
+        # task runs in its own
+        self._running = 0
+        self._moved_from = None
+        self._running_lock = threading.Lock()
         
+    @traced("router")
     def route_task(self, task_description):
         """Route a task to the appropriate agent based on complexity.
         
@@ -25,8 +61,14 @@ class TaskManager:
         Returns:
             Dictionary with routing information
         """
-        response = ask_llm(ROUTER_SYSTEM_PROMPT, task_description, use_local=True)
-        data = extract_json(response)
+        data = ask_json(
+            ROUTER_SYSTEM_PROMPT,
+            task_description,
+            ROUTER_SCHEMA,
+            use_local=True,
+            hedge=True,
+            agent="router"
+        )
         
         if not data:
             # Default routing if extraction fails
@@ -38,15 +80,45 @@ class TaskManager:
             
         return data
         
-    def execute_task(self, task_description):
+    def execute_task(self, task_description, trace_id=None):
         """Execute a user task by coordinating the appropriate agents.
         
+        The whole task runs as one trace, whose ID is added to the result,
+        and its LLM calls share a budget of TASK_DEADLINE_SECONDS. A task
+        that runs out of it stops with a deadline error.
+        
         Args:
             task_description: Description of the task
+            trace_id: Trace ID to use (a new one is generated if omitted)
             
         Returns:
             Result of the task execution
         """
+        refused = self._start_task()
+        if refused:
+            return {"success": False, "error": refused}
+        try:
+            with trace("task", trace_id=trace_id, task=task_description), deadline(TASK_DEADLINE_SECONDS):
+                try:
+                    result = self._execute_task(task_description)
+                except DeadlineExceeded as e:
+                    print(f"Task stopped: {str(e)}")
+                    result = {"success": False, "error": str(e)}
+                    self.history.append({"task": task_description, "result": result, "trace_id": current_trace_id()})
+                result["trace_id"] = current_trace_id()
+                return result
+        finally:
+            self._end_task()
+            
+    def _execute_task(self, task_description):
+        """Analyze a task and run it with the chosen agent."""
+        started = time.perf_counter()
+        speculative_plan = None
+        if SPECULATIVE_PLANNING:
+            speculative_plan = _get_speculation_pool().submit(bind_context(
+                lambda: get_developer_instructions(task_description, SPECULATIVE_COMPLEXITY)
+            ))
+        
         # First determine which agent should handle this and the complexity
         task_info = self.analyze_task(task_description)
         
@@ -56,10 +128,15 @@ class TaskManager:
         file_paths = task_info.get("file_paths", [])
         language = task_info.get("language", "python")
         
+        steps = None
+        if speculative_plan is not None:
+            steps = self._use_speculative_plan(speculative_plan, agent_type, complexity)
+        
         # Route to the appropriate agent
         if agent_type == "developer":
-            steps = get_developer_instructions(instructions, complexity)
-            result = self.execute_steps(steps)
+            if steps is None:
+                steps = get_developer_instructions(instructions, complexity)
+            result = self.execute_steps(steps, task_description)
             
         elif agent_type == "code_generation":
             # For code generation, we may have multiple files to generate
@@ -75,11 +152,11 @@ class TaskManager:
                 
         elif agent_type == "tester":
             steps = get_tester_instructions(instructions, complexity)
-            result = self.execute_steps(steps)
+            result = self.execute_steps(steps, task_description)
             
         elif agent_type == "debugger":
             steps = get_debugger_instructions(instructions, complexity)
-            result = self.execute_steps(steps)
+            result = self.execute_steps(steps, task_description)
             
         elif agent_type == "cursor":
             result = execute_cursor_commands(instructions, complexity)
@@ -87,15 +164,67 @@ class TaskManager:
         else:
             result = {"success": False, "error": f"Unknown agent type: {agent_type}"}
             
+        metrics.TASKS.inc(agent=agent_type, status="success" if result.get("success") else "failure")
+        metrics.TASK_DURATION.observe(time.perf_counter() - started, agent=agent_type)
+        
         # Record the task and result in history
         self.history.append({
             "task": task_description,
             "analysis": task_info,
-            "result": result
+            "result": result,
+            "trace_id": current_trace_id()
         })
         
         return result
         
+    def _use_speculative_plan(self, plan, agent_type, complexity):
+        """Decide whether a speculative developer plan can be used for a task.
+        
+        The plan was made from the task description rather than the analysis'
+        instructions, which restate it. It is used if the analysis picked the
+        developer agent at no more than SPECULATIVE_COMPLEXITY; otherwise it
+        is discarded (and left to finish in the background if still running).
+        
+        Args:
+            plan: Future of the speculative get_developer_instructions call
+            agent_type: Agent chosen by the analysis
+            complexity: Complexity from the analysis
+            
+        Returns:
+            The plan's steps, or None if it was discarded or failed
+        """
+        agrees = (
+            agent_type == "developer"
+            and complexity in COMPLEXITY_ORDER
+            and COMPLEXITY_ORDER.index(complexity) <= COMPLEXITY_ORDER.index(SPECULATIVE_COMPLEXITY)
+        )
+        steps = None
+        if agrees:
+            try:
+                steps = plan.result()
+            except Exception as e:
+                print(f"Speculative plan failed, asking the developer agent again: {str(e)}")
+        else:
+            plan.cancel()
+        
+        outcome = "hit" if steps else "miss"
+        self.speculation["hits" if steps else "misses"] += 1
+        metrics.SPECULATIVE_PLANS.inc(outcome=outcome)
+        return steps or None
+        
+    def get_speculation_stats(self):
+        """Get how often speculative developer plans were used.
+        
+        Returns:
+            Dictionary with hits, misses and hit_ratio
+        """
+        total = self.speculation["hits"] + self.speculation["misses"]
+        return {
+            **self.speculation,
+            "hit_ratio": round(self.speculation["hits"] / total, 4) if total else None
+        }
+        
+    @traced("analysis")
     def analyze_task(self, task_description):
         """Analyze a task to determine how to handle it.
         
@@ -113,15 +242,16 @@ class TaskManager:
         complexity = routing.get("complexity", "medium")
         
         # Get task analysis from the Task Manager agent
-        response = ask_llm(
+        data = ask_json(
             TASK_MANAGER_SYSTEM_PROMPT,
             task_description,
+            TASK_ANALYSIS_SCHEMA,
             use_local=use_local,
-            task_complexity=complexity
+            task_complexity=complexity,
+            hedge=True,
+            agent="task_manager"
         )
         
-        data = extract_json(response)
-        
         if not data:
             # Default task analysis if extraction fails
             return {
@@ -138,18 +268,105 @@ class TaskManager:
             
         return data
     
-    def execute_steps(self, steps):
+    def execute_steps(self, steps, task=None):
         """Execute a list of steps from an agent.
         
+        The steps are checkpointed under the task's trace ID, so the task can
+        be resumed with resume_task if it is interrupted.
+        
         Args:
             steps: List of steps to execute
+            task: Description of the task the steps are for
             
         Returns:
             Result of the execution
         """
         from main import execute_steps
-        return execute_steps(steps)
+        from checkpoint import start_checkpoint
+        return execute_steps(steps, checkpoint=start_checkpoint(current_trace_id(), steps, task))
+    
+    def resume_task(self, task_id):
+        """Resume an interrupted task from its checkpoint.
+        
+        Completed steps are not run again and no agent is asked for a new
+        plan. Background processes started by completed steps are restarted,
+        since they did not outlive the interrupted run. The steps run in the
+        task's original working directory; since that belongs to the whole
+        process, a task from another directory is only resumed while no
+        other task is running.
+        
+        Args:
+            task_id: ID of the task (its trace ID)
+        
+        Returns:
+            Result of the remaining steps
+        """
+        from main import execute_steps
+        from checkpoint import load_checkpoint
+        
+        checkpoint = load_checkpoint(task_id)
+        if checkpoint is None:
+            return {"success": False, "error": f"No checkpoint for task {task_id}"}
+        
+        refused = self._start_task(checkpoint.data["cwd"])
+        if refused:
+            return {"success": False, "error": refused}
+        try:
+            with trace("resume", trace_id=task_id, task=checkpoint.data.get("task")):
+                print(f"Resuming task {task_id} at step {checkpoint.next_step} of {len(checkpoint.data['steps'])}.")
+                
+                background = checkpoint.background_steps()
+                if background:
+                    print("Restarting background processes of completed steps.")
+                    execute_steps(background, debug=False)
+                result = execute_steps(checkpoint.remaining_steps(), checkpoint=checkpoint)
+                result["trace_id"] = task_id
+        finally:
+            self._end_task()
+        
+        self.history.append({
+            "task": checkpoint.data.get("task"),
+            "resumed": True,
+            "result": result,
+            "trace_id": task_id
+        })
+        return result
+        
+    def _start_task(self, cwd=None):
+        """Count a task as running, moving the process to its directory if needed.
         
+        Args:
+            cwd: Working directory the task must run in (None for the current one)
+        
+        Returns:
+            None if the task may run, otherwise the reason it may not
+        """
+        with self._running_lock:
+            if self._moved_from is not None:
+                return "A resumed task is running in another directory; try again when it finishes"
+            if cwd and os.path.realpath(cwd) != os.path.realpath(os.getcwd()):
+                if self._running:
+                    return f"Cannot resume in {cwd} while other tasks are running"
+                previous = os.getcwd()
+                try:
+                    os.chdir(cwd)
+                except OSError as e:
+                    return f"Cannot resume in {cwd}: {str(e)}"
+                self._moved_from = previous
+            self._running += 1
+        return None
+    
+    def _end_task(self):
+        """Count a task as finished, returning to the directory it moved from."""
+        with self._running_lock:
+            self._running -= 1
+            if self._moved_from is not None:
+                try:
+                    os.chdir(self._moved_from)
+                except OSError as e:
+                    print(f"Could not return to {self._moved_from}: {str(e)}")
+                self._moved_from = None
+    
     def get_history(self):
         """Get the task execution history.
         
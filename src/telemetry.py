@@ -0,0 +1,300 @@
+# src/telemetry.py
+import os
+import json
+import time
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+import metrics
+from tracing import set_attributes
+from backend_scheduler import scheduler
+
+TELEMETRY_LOG = os.path.abspath(os.getenv("LLM_TELEMETRY_LOG", "llm_calls.log"))
+TELEMETRY_LOG_MAX_BYTES = int(os.getenv("LLM_TELEMETRY_LOG_MAX_BYTES", str(5 * 1024 * 1024)))
+TELEMETRY_LOG_BACKUPS = int(os.getenv("LLM_TELEMETRY_LOG_BACKUPS", "3"))
+TELEMETRY_ENABLED = os.getenv("LLM_TELEMETRY", "true").lower() == "true"
+
+_logger = logging.getLogger("agents_cli.llm_calls")
+_logger.propagate = False
+_logger.setLevel(logging.INFO)
+
+_lock = threading.Lock()
+_totals = {}
+_prompt_sizes = {}
+# Chain of the current request; a context variable so that calls made on
+# other threads with tracing.bind_context still belong to it
+_chain = contextvars.ContextVar("llm_call_chain", default=None)
+
+@contextmanager
+def call_chain(agent=None, prompt=None):
+    """Track the backends tried while answering one LLM request.
+    
+    Provider functions add themselves with add_to_chain, so a fallback from
+    one backend to another shows up in the events of both calls. Nested
+    call_chain blocks share the outermost chain.
+    
+    Args:
+        agent: Agent that sent the request, for the per-agent prompt report
+        prompt: Full prompt text, used to estimate its size when the backend
+            does not report token counts
+    """
+    if _chain.get() is not None:
+        yield
+        return
+    token = _chain.set({
+        "backends": [],
+        "agent": agent,
+        "prompt_estimate": estimate_tokens(prompt) if prompt else None
+    })
+    try:
+        yield
+    finally:
+        _chain.reset(token)
+
+@contextmanager
+def separate_chain():
+    """Track the backends of one attempt apart from the current request's chain.
+    
+    Used for concurrent attempts at the same request, such as hedged calls,
+    which would otherwise interleave their backends in one chain. The agent
+    and prompt size carry over from the current chain.
+    
+    Yields:
+        List the attempt's backends are added to, for extend_chain
+    """
+    parent = _chain.get() or {}
+    token = _chain.set({
+        "backends": [],
+        "agent": parent.get("agent"),
+        "prompt_estimate": parent.get("prompt_estimate")
+    })
+    try:
+        yield _chain.get()["backends"]
+    finally:
+        _chain.reset(token)
+
+def extend_chain(backends):
+    """Add the backends of a finished attempt to the current request's chain.
+    
+    Args:
+        backends: Backend names, as yielded by separate_chain
+    """
+    chain = _chain.get()
+    if chain is not None:
+        chain["backends"].extend(backends)
+
+def add_to_chain(backend):
+    """Record that a backend is being tried for the current request.
+    
+    Args:
+        backend: Backend name
+    """
+    chain = _chain.get()
+    if chain is not None:
+        chain["backends"].append(backend)
+
+def current_chain():
+    """Get the backends tried so far for the current request.
+    
+    Returns:
+        List of backend names
+    """
+    chain = _chain.get()
+    return list(chain["backends"]) if chain else []
+
+def record_llm_call(backend, model, latency, prompt_tokens=None, completion_tokens=None,
+                    cached_tokens=0, ttft=None, cost=None, error=None):
+    """Record a structured event for one LLM call.
+    
+    Non-streamed calls receive their first token with the full response, so
+    their time-to-first-token is the total latency.
+    
+    Args:
+        backend: Backend that served the call ("openai", "claude", "local", "mock")
+        model: Model identifier
+        latency: Total latency in seconds
+        prompt_tokens: Prompt tokens reported by the backend
+        completion_tokens: Completion tokens reported by the backend
+        cached_tokens: Prompt tokens served from the provider's prompt cache
+        ttft: Time to first token in seconds
+        cost: Estimated price of the call in USD
+        error: Error message if the call failed
+    
+    Returns:
+        The recorded event
+    """
+    chain = _chain.get() or {}
+    agent = chain.get("agent")
+    event = {
+        "ts": time.time(),
+        "agent": agent,
+        "backend": backend,
+        "model": model,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "cached_tokens": cached_tokens or 0,
+        "cache_hit": bool(cached_tokens),
+        "ttft": round(ttft if ttft is not None else latency, 4),
+        "latency": round(latency, 4),
+        "cost_usd": round(cost, 6) if cost is not None else None,
+        "fallback_chain": current_chain() or [backend],
+        "success": error is None,
+        "error": error
+    }
+    set_attributes(
+        backend=backend,
+        model=model,
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens,
+        error=error
+    )
+    if backend not in ("mock", "replay"):
+        scheduler.observe(backend, latency, error is None)
+    if not TELEMETRY_ENABLED:
+        return event
+    
+    metrics.LLM_CALLS.inc(backend=backend, status="success" if error is None else "error")
+    prompt_size = prompt_tokens or chain.get("prompt_estimate")
+    if prompt_size:
+        metrics.LLM_PROMPT_TOKENS.observe(prompt_size, agent=agent or "unknown")
+    metrics.LLM_CALL_DURATION.observe(latency, backend=backend)
+    if event["cache_hit"]:
+        metrics.LLM_CACHE_HITS.inc(backend=backend)
+    
+    with _lock:
+        totals = _totals.setdefault((backend, model), {
+            "calls": 0,
+            "errors": 0,
+            "fallbacks": 0,
+            "cache_hits": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "cached_tokens": 0,
+            "latency_total": 0.0,
+            "latency_max": 0.0,
+            "cost_usd": 0.0
+        })
+        totals["calls"] += 1
+        totals["errors"] += error is not None
+        totals["fallbacks"] += len(event["fallback_chain"]) > 1
+        totals["cache_hits"] += event["cache_hit"]
+        totals["prompt_tokens"] += prompt_tokens or 0
+        totals["completion_tokens"] += completion_tokens or 0
+        totals["cached_tokens"] += event["cached_tokens"]
+        totals["latency_total"] += latency
+        totals["latency_max"] = max(totals["latency_max"], latency)
+        totals["cost_usd"] += cost or 0.0
+        if prompt_size:
+            sizes = _prompt_sizes.setdefault(agent or "unknown", {
+                "calls": 0,
+                "prompt_tokens": 0,
+                "max_prompt_tokens": 0,
+                "cached_tokens": 0
+            })
+            sizes["calls"] += 1
+            sizes["prompt_tokens"] += prompt_size
+            sizes["max_prompt_tokens"] = max(sizes["max_prompt_tokens"], prompt_size)
+            sizes["cached_tokens"] += event["cached_tokens"]
+        _log_event(event)
+    return event
+
+def get_llm_summary():
+    """Get aggregated LLM call statistics per backend and model.
+    
+    Returns:
+        List of dictionaries, one per (backend, model) pair
+    """
+    with _lock:
+        summary = []
+        for (backend, model), totals in sorted(_totals.items()):
+            entry = {"backend": backend, "model": model, **totals}
+            entry["latency_avg"] = round(totals["latency_total"] / totals["calls"], 4)
+            entry["latency_total"] = round(totals["latency_total"], 4)
+            entry["latency_max"] = round(totals["latency_max"], 4)
+            entry["cost_usd"] = round(totals["cost_usd"], 6)
+            summary.append(entry)
+        return summary
+
+def get_prompt_report():
+    """Get how many prompt tokens each agent sends per LLM call.
+    
+    Token counts come from the backend when it reports them and are
+    estimated from the prompt length otherwise.
+    
+    Returns:
+        List of dictionaries, one per agent
+    """
+    with _lock:
+        report = []
+        for agent, sizes in sorted(_prompt_sizes.items()):
+            entry = {"agent": agent, **sizes}
+            entry["avg_prompt_tokens"] = round(sizes["prompt_tokens"] / sizes["calls"])
+            entry["cached_ratio"] = round(sizes["cached_tokens"] / sizes["prompt_tokens"], 4)
+            report.append(entry)
+        return report
+
+def estimate_tokens(text):
+    """Roughly estimate the number of tokens in a text (about 4 characters each).
+    
+    Args:
+        text: Text to measure
+    
+    Returns:
+        Estimated token count
+    """
+    return max(1, (len(text) + 3) // 4)
+
+def usage_from_response(usage):
+    """Normalize a usage object or dictionary from any backend.
+    
+    Handles OpenAI-style (prompt_tokens/completion_tokens) and Anthropic-style
+    (input_tokens/output_tokens) usage, from SDK objects or raw JSON.
+    
+    Args:
+        usage: Usage object, dictionary or None
+    
+    Returns:
+        Dictionary with prompt_tokens, completion_tokens and cached_tokens
+    """
+    def field(obj, name):
+        if obj is None:
+            return None
+        if isinstance(obj, dict):
+            return obj.get(name)
+        return getattr(obj, name, None)
+    
+    details = field(usage, "prompt_tokens_details")
+    prompt_tokens = field(usage, "prompt_tokens")
+    if prompt_tokens is None and field(usage, "input_tokens") is not None:
+        # Anthropic counts prompt tokens read from or written to the cache separately
+        prompt_tokens = (
+            field(usage, "input_tokens")
+            + (field(usage, "cache_read_input_tokens") or 0)
+            + (field(usage, "cache_creation_input_tokens") or 0)
+        )
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": field(usage, "completion_tokens") or field(usage, "output_tokens"),
+        "cached_tokens": field(details, "cached_tokens") or field(usage, "cache_read_input_tokens") or 0
+    }
+
+def _log_event(event):
+    """Append an event to the rotating telemetry log."""
+    if not _logger.handlers:
+        try:
+            handler = RotatingFileHandler(
+                TELEMETRY_LOG,
+                maxBytes=TELEMETRY_LOG_MAX_BYTES,
+                backupCount=TELEMETRY_LOG_BACKUPS,
+                encoding="utf-8",
+                delay=True
+            )
+        except OSError as e:
+            print(f"Could not open LLM telemetry log {TELEMETRY_LOG}: {str(e)}")
+            _logger.addHandler(logging.NullHandler())
+            return
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        _logger.addHandler(handler)
+    _logger.info(json.dumps(event))
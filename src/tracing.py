@@ -0,0 +1,223 @@
+# src/tracing.py
+import os
+import json
+import time
+import uuid
+import threading
+import functools
+import contextvars
+from contextlib import contextmanager
+from pathlib import Path
+
+# Directory that finished traces are written to; tracing export is off when empty
+TRACE_DIR = os.path.abspath(os.getenv("TRACE_DIR")) if os.getenv("TRACE_DIR") else ""
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+def start_trace(name, trace_id=None, **attrs):
+    """Start a new trace and make its root span current.
+    
+    Args:
+        name: Name of the root span
+        trace_id: Trace ID to use (a new one is generated if omitted)
+        **attrs: Attributes recorded on the root span
+    
+    Returns:
+        The root span, to be passed to end_trace
+    """
+    trace = {
+        "trace_id": trace_id or uuid.uuid4().hex,
+        "spans": [],
+        "lock": threading.Lock()
+    }
+    return _open_span(name, trace, None, attrs)
+
+def end_trace(root, **attrs):
+    """Finish a trace and export it if TRACE_DIR is set.
+    
+    Args:
+        root: Root span returned by start_trace
+        **attrs: Attributes to add to the root span
+    
+    Returns:
+        Path of the exported trace file, or None
+    """
+    end_span(root, **attrs)
+    if TRACE_DIR:
+        return export_trace(root["trace"], TRACE_DIR)
+    return None
+
+@contextmanager
+def trace(name, trace_id=None, **attrs):
+    """Run a block as a new trace; see start_trace.
+    
+    If a trace is already active, the block becomes a span of it instead.
+    """
+    if _current_span.get() is not None:
+        with span(name, **attrs) as child:
+            yield child
+        return
+    
+    root = start_trace(name, trace_id, **attrs)
+    try:
+        yield root
+    except Exception as e:
+        root["args"]["error"] = str(e)
+        raise
+    finally:
+        end_trace(root)
+
+def start_span(name, **attrs):
+    """Start a child span of the current span and make it current.
+    
+    Args:
+        name: Span name
+        **attrs: Attributes recorded on the span
+    
+    Returns:
+        The span, or None if no trace is active
+    """
+    parent = _current_span.get()
+    if parent is None:
+        return None
+    return _open_span(name, parent["trace"], parent, attrs)
+
+def end_span(current, **attrs):
+    """Finish a span and restore its parent as the current span.
+    
+    Args:
+        current: Span returned by start_span (None is ignored)
+        **attrs: Attributes to add to the span
+    """
+    if current is None or "end" in current:
+        return
+    current["end"] = time.perf_counter_ns()
+    current["args"].update(attrs)
+    try:
+        _current_span.reset(current["token"])
+    except ValueError:
+        # Ended from a different context than it was started in
+        pass
+    trace = current["trace"]
+    with trace["lock"]:
+        trace["spans"].append(current)
+
+@contextmanager
+def span(name, **attrs):
+    """Run a block as a child span of the current span."""
+    current = start_span(name, **attrs)
+    try:
+        yield current
+    except Exception as e:
+        if current is not None:
+            current["args"]["error"] = str(e)
+        raise
+    finally:
+        end_span(current)
+
+def traced(name):
+    """Decorator that runs a function as a span of the current trace.
+    
+    Args:
+        name: Span name
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def current_trace_id():
+    """Get the ID of the active trace.
+    
+    Returns:
+        Trace ID, or None if no trace is active
+    """
+    current = _current_span.get()
+    return current["trace"]["trace_id"] if current else None
+
+def set_attributes(**attrs):
+    """Add attributes to the current span, if any."""
+    current = _current_span.get()
+    if current is not None:
+        current["args"].update(attrs)
+
+def bind_context(func):
+    """Bind a callable to the current trace context, for use in another thread.
+    
+    Args:
+        func: Callable to run later
+    
+    Returns:
+        Callable that runs func in a copy of the current context
+    """
+    context = contextvars.copy_context()
+    return functools.partial(context.run, func)
+
+def export_trace(trace, trace_dir):
+    """Write a trace as a Chrome trace file (chrome://tracing, Perfetto).
+    
+    Args:
+        trace: Trace dictionary
+        trace_dir: Directory to write <trace_id>.json to
+    
+    Returns:
+        Path of the written file, or None on failure
+    """
+    with trace["lock"]:
+        spans = list(trace["spans"])
+    if not spans:
+        return None
+    origin = min(s["start"] for s in spans)
+    pid = os.getpid()
+    events = []
+    for s in sorted(spans, key=lambda s: s["start"]):
+        events.append({
+            "name": s["name"],
+            "cat": s["name"].split(".")[0],
+            "ph": "X",
+            "ts": (s["start"] - origin) / 1000,
+            "dur": (s["end"] - s["start"]) / 1000,
+            "pid": pid,
+            "tid": s["tid"],
+            "args": {
+                "span_id": s["span_id"],
+                "parent_id": s["parent_id"],
+                **{key: _json_safe(value) for key, value in s["args"].items()}
+            }
+        })
+    try:
+        Path(trace_dir).mkdir(parents=True, exist_ok=True)
+        path = os.path.join(trace_dir, f"{trace['trace_id']}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({
+                "traceEvents": events,
+                "displayTimeUnit": "ms",
+                "otherData": {"trace_id": trace["trace_id"]}
+            }, f)
+        return path
+    except Exception as e:
+        print(f"Error exporting trace {trace['trace_id']}: {str(e)}")
+        return None
+
+def _open_span(name, trace, parent, attrs):
+    """Create a span and make it current."""
+    new_span = {
+        "name": name,
+        "trace": trace,
+        "span_id": uuid.uuid4().hex[:16],
+        "parent_id": parent["span_id"] if parent else None,
+        "tid": threading.get_ident(),
+        "args": dict(attrs),
+        "start": time.perf_counter_ns()
+    }
+    new_span["token"] = _current_span.set(new_span)
+    return new_span
+
+def _json_safe(value):
+    """Make an attribute value JSON serializable."""
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    return str(value)
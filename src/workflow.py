@@ -0,0 +1,439 @@
+# src/workflow.py
+import os
+import json
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import yaml
+from tracing import bind_context, span
+from prompts import (
+    DEVELOPER_SYSTEM_PROMPT,
+    DEVELOPER_USER_PROMPT,
+    TESTER_SYSTEM_PROMPT,
+    TESTER_USER_PROMPT,
+    DEBUGGER_SYSTEM_PROMPT
+)
+
+# YAML workflow definition for the project command (defaults to DEFAULT_WORKFLOW)
+PROJECT_WORKFLOW = os.getenv("PROJECT_WORKFLOW", "")
+# Most phases running at once
+WORKFLOW_MAX_PARALLEL = int(os.getenv("WORKFLOW_MAX_PARALLEL", "4"))
+# Reuse agent plans and finished setup steps of earlier runs whose inputs
+# have not changed
+WORKFLOW_CACHE = os.getenv("WORKFLOW_CACHE", "true").lower() == "true"
+# Cache file, relative to the project directory
+WORKFLOW_CACHE_FILE = os.getenv("WORKFLOW_CACHE_FILE", ".workflow_cache.json")
+
+# The tester's plan does not depend on anything the developer's steps
+# produce, so it is requested while those steps run
+DEFAULT_WORKFLOW = """
+phases:
+  developer_plan:
+    agent: developer
+  tester_plan:
+    agent: tester
+  develop:
+    execute: developer_plan
+  test:
+    execute: tester_plan
+    needs: [develop]
+"""
+
+# Agents a phase can ask for steps, with their system and default user prompts
+AGENTS = {
+    "developer": (DEVELOPER_SYSTEM_PROMPT, DEVELOPER_USER_PROMPT),
+    "tester": (TESTER_SYSTEM_PROMPT, TESTER_USER_PROMPT),
+    "debugger": (DEBUGGER_SYSTEM_PROMPT, "")
+}
+
+# Steps whose results persist on disk, so they need not be repeated
+SETUP_ACTIONS = ("create_venv", "install_deps", "create_file", "modify_file")
+
+class WorkflowError(ValueError):
+    """Raised for a workflow definition that cannot be run."""
+
+def load_workflow(path=None):
+    """Load and validate a workflow definition.
+    
+    A workflow is a mapping of phases. Each phase either asks an agent for
+    steps (agent, with optional prompt, complexity and inputs) or executes
+    the steps of another phase (execute, with optional debug), and can list
+    phases it must run after (needs). An agent phase's inputs are phases
+    whose results are added to its prompt; the debugger is asked to fix the
+    failed steps of its inputs. A phase starts as soon as the phases it
+    depends on are done.
+    
+    Args:
+        path: YAML file path (defaults to PROJECT_WORKFLOW, then DEFAULT_WORKFLOW)
+    
+    Returns:
+        Workflow dictionary, with each phase's dependencies under "depends"
+    
+    Raises:
+        WorkflowError: If the file cannot be read or the definition is invalid
+    """
+    path = path or PROJECT_WORKFLOW
+    try:
+        if path:
+            with open(path, "r") as f:
+                workflow = yaml.safe_load(f)
+        else:
+            workflow = yaml.safe_load(DEFAULT_WORKFLOW)
+    except (OSError, yaml.YAMLError) as e:
+        raise WorkflowError(f"Could not load workflow {path}: {str(e)}")
+    
+    phases = (workflow or {}).get("phases") if isinstance(workflow, dict) else None
+    if not isinstance(phases, dict) or not phases:
+        raise WorkflowError("A workflow needs a mapping of phases")
+    
+    for name, phase in phases.items():
+        if not isinstance(phase, dict) or ("agent" in phase) == ("execute" in phase):
+            raise WorkflowError(f"Phase {name} needs exactly one of agent or execute")
+        if "agent" in phase and phase["agent"] not in AGENTS:
+            raise WorkflowError(f"Phase {name} has unknown agent {phase['agent']}")
+        depends = []
+        for field in ("needs", "inputs"):
+            names = phase.get(field, [])
+            phase[field] = [names] if isinstance(names, str) else list(names)
+            depends.extend(phase[field])
+        if "execute" in phase and phase["inputs"]:
+            raise WorkflowError(f"Phase {name} executes steps and cannot have inputs")
+        if phase.get("agent") == "debugger" and not phase["inputs"]:
+            raise WorkflowError(f"Phase {name} needs inputs with steps to debug")
+        if "execute" in phase:
+            depends.append(phase["execute"])
+            if phases.get(phase["execute"], {}).get("agent") is None:
+                raise WorkflowError(f"Phase {name} must execute the steps of an agent phase")
+        for dependency in depends:
+            if dependency not in phases:
+                raise WorkflowError(f"Phase {name} depends on unknown phase {dependency}")
+        phase["depends"] = list(dict.fromkeys(depends))
+    
+    _check_acyclic(phases)
+    return workflow
+
+def _check_acyclic(phases):
+    """Raise WorkflowError if the phases' dependencies form a cycle."""
+    done = set()
+    visiting = set()
+    
+    def visit(name):
+        if name in done:
+            return
+        if name in visiting:
+            raise WorkflowError(f"Phase {name} is part of a dependency cycle")
+        visiting.add(name)
+        for dependency in phases[name]["depends"]:
+            visit(dependency)
+        visiting.discard(name)
+        done.add(name)
+    
+    for name in phases:
+        visit(name)
+
+class PhaseCache:
+    """Outputs of earlier workflow runs, keyed by a hash of their inputs.
+    
+    Each agent phase's latest plan is kept with the hash of what produced
+    it: its definition, its agent's prompts and the outputs of the phases it
+    depends on. Executions are not cached, since what their commands do
+    depends on the state of the workspace. Setup steps (creating the venv,
+    installing dependencies) are remembered once they succeed, so a changed
+    plan does not repeat them.
+    """
+    
+    def __init__(self, path):
+        """Initialize a cache.
+        
+        Args:
+            path: Cache file path
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._data = {"phases": {}, "steps": []}
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+            self._data["phases"].update(data.get("phases", {}))
+            self._data["steps"].extend(data.get("steps", []))
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable workflow cache {path}: {str(e)}")
+    
+    def get(self, name, key):
+        """Get a phase's cached output, or None if its inputs changed."""
+        with self._lock:
+            entry = self._data["phases"].get(name)
+            if entry and entry["key"] == key:
+                return entry["output"]
+            return None
+    
+    def put(self, name, key, output):
+        """Store a phase's output and save the cache."""
+        with self._lock:
+            self._data["phases"][name] = {"key": key, "output": output}
+            self._save()
+    
+    def drop(self, name):
+        """Forget a phase's cached output and save the cache."""
+        with self._lock:
+            if self._data["phases"].pop(name, None) is not None:
+                self._save()
+    
+    def has_step(self, step):
+        """Check whether a setup step has succeeded before."""
+        with self._lock:
+            return digest(step) in self._data["steps"]
+    
+    def add_steps(self, steps):
+        """Remember setup steps that succeeded and save the cache."""
+        with self._lock:
+            for step in steps:
+                key = digest(step)
+                if key not in self._data["steps"]:
+                    self._data["steps"].append(key)
+            self._save()
+    
+    def clear(self):
+        """Forget every cached output and step."""
+        with self._lock:
+            self._data = {"phases": {}, "steps": []}
+            self._save()
+    
+    def _save(self):
+        """Write the cache file (call with the lock held)."""
+        try:
+            with open(self.path, "w") as f:
+                json.dump(self._data, f)
+        except OSError as e:
+            print(f"Could not write workflow cache {self.path}: {str(e)}")
+
+def digest(value):
+    """Get the sha256 hash of a JSON-serializable value."""
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+def run_workflow(workflow, execute_steps, cache=None):
+    """Run the phases of a workflow, overlapping independent ones.
+    
+    Agent phases run concurrently. Executing phases share the working
+    directory and background processes, so they run one at a time. An
+    executing phase fails if its steps did not all succeed. A phase whose
+    dependencies failed or were skipped is skipped, except for a debugger
+    whose inputs include the failed execution it is meant to fix. An agent
+    phase whose inputs have not changed since a cached run reuses that
+    run's plan.
+    Executing phases always run; when one fails, the plan it executed is
+    dropped from the cache so the agent is asked again next time.
+    
+    Args:
+        workflow: Workflow from load_workflow
+        execute_steps: Function that executes a list of steps
+        cache: PhaseCache of earlier runs, or None
+    
+    Returns:
+        Dictionary with each phase's status ("done", "cached", "failed" or
+        "skipped"), output and duration in seconds
+    """
+    phases = workflow["phases"]
+    status = {}
+    outputs = {}
+    durations = {}
+    pending = dict(phases)
+    running = {}
+    execute_lock = threading.Lock()
+    
+    with ThreadPoolExecutor(max_workers=WORKFLOW_MAX_PARALLEL, thread_name_prefix="workflow") as pool:
+        while pending or running:
+            changed = True
+            while changed:
+                changed = False
+                for name, phase in list(pending.items()):
+                    blocked = [d for d in phase["depends"] if _blocks(phase, d, status, outputs)]
+                    if blocked:
+                        print(f"Skipping phase {name}: {', '.join(blocked)} did not complete.")
+                        status[name] = "skipped"
+                    elif all(d in outputs for d in phase["depends"]):
+                        key = phase_key(phase, outputs)
+                        cached = cache.get(name, key) if cache else None
+                        if cached is not None:
+                            print(f"Phase {name} is up to date.")
+                            status[name] = "cached"
+                            outputs[name] = cached
+                        else:
+                            run = bind_context(lambda name=name, phase=phase: _run_phase(
+                                name, phase, outputs, execute_steps, execute_lock, cache
+                            ))
+                            running[pool.submit(run)] = (name, key)
+                    else:
+                        continue
+                    del pending[name]
+                    changed = True
+            if not running:
+                break
+            
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name, key = running.pop(future)
+                try:
+                    output, durations[name] = future.result()
+                except Exception as e:
+                    print(f"Phase {name} failed: {str(e)}")
+                    output = None
+                if output is None:
+                    status[name] = "failed"
+                elif "execute" in phases[name] and not output.get("success"):
+                    # Kept for debugger phases that fix the failed steps
+                    status[name] = "failed"
+                    outputs[name] = output
+                else:
+                    status[name] = "done"
+                    outputs[name] = output
+                if not cache:
+                    continue
+                if "agent" in phases[name]:
+                    if output is not None:
+                        cache.put(name, key, output)
+                elif output is None or not output.get("success"):
+                    # The plan failed; ask for a new one rather than replay it
+                    cache.drop(phases[name]["execute"])
+    
+    return {
+        "status": status,
+        "outputs": outputs,
+        "durations": {name: round(seconds, 3) for name, seconds in durations.items()}
+    }
+
+def _blocks(phase, dependency, status, outputs):
+    """Check whether a dependency keeps a phase from running."""
+    if status.get(dependency) == "skipped":
+        return True
+    if status.get(dependency) != "failed":
+        return False
+    # A debugger exists to fix failed executions, so those do not block it
+    return not (phase.get("agent") == "debugger" and dependency in phase["inputs"] and dependency in outputs)
+
+def phase_key(phase, outputs):
+    """Get the hash of everything a phase's output depends on.
+    
+    Args:
+        phase: Phase definition
+        outputs: Outputs of the finished phases, including its dependencies
+    
+    Returns:
+        Hex digest
+    """
+    definition = {field: value for field, value in phase.items() if field != "depends"}
+    if "agent" in phase:
+        definition["prompts"] = AGENTS[phase["agent"]]
+    return digest({
+        "phase": definition,
+        "inputs": {dependency: digest(outputs[dependency]) for dependency in phase["depends"]}
+    })
+
+def _run_phase(name, phase, outputs, execute_steps, execute_lock, cache):
+    """Run one phase.
+    
+    Returns:
+        (output, duration in seconds); the output is None if the phase failed
+    """
+    started = time.perf_counter()
+    if "agent" in phase:
+        with span("workflow.phase", phase=name, agent=phase["agent"]):
+            steps = _ask_agent(phase, outputs)
+        if steps is None:
+            print(f"No valid instructions from {phase['agent'].capitalize()}.")
+        return steps, time.perf_counter() - started
+    
+    steps = _steps_to_run(outputs[phase["execute"]], cache)
+    if not steps:
+        return {"success": True, "results": []}, time.perf_counter() - started
+    with execute_lock:
+        print(f"=== {name.upper()} PHASE ===")
+        with span("workflow.phase", phase=name, execute=phase["execute"]):
+            outcome = execute_steps(steps, debug=phase.get("debug", True))
+    if cache:
+        cache.add_steps(
+            steps[result["step"]] for result in outcome["results"]
+            if result["success"] and result["action"] in ("create_venv", "install_deps")
+        )
+    return outcome, time.perf_counter() - started
+
+def _steps_to_run(steps, cache):
+    """Drop the setup steps at the start of a plan whose results are still in place.
+    
+    Files already holding the step's content are not rewritten, and a venv or
+    its dependencies are not set up again if the same step succeeded before
+    and the venv still exists. Only the leading setup steps are considered,
+    since later commands may change what they produced.
+    
+    Args:
+        steps: Steps of an agent phase
+        cache: PhaseCache of earlier runs, or None
+    
+    Returns:
+        Steps that need to run
+    """
+    if not cache:
+        return steps
+    remaining = list(steps)
+    while remaining and remaining[0].get("action") in SETUP_ACTIONS:
+        step = remaining[0]
+        action = step["action"]
+        if action in ("create_file", "modify_file"):
+            done = _has_content(step.get("path"), step.get("content", ""))
+        else:
+            venv = os.path.abspath(step.get("path" if action == "create_venv" else "venv", "./venv"))
+            done = cache.has_step(step) and os.path.isdir(venv)
+        if not done:
+            break
+        print(f"Up to date: {action} {step.get('path') or step.get('deps') or ''}".rstrip())
+        remaining.pop(0)
+    return remaining
+
+def _has_content(path, content):
+    """Check whether a file exists with the given content."""
+    try:
+        with open(path, "r") as f:
+            return f.read() == content
+    except (OSError, TypeError, UnicodeDecodeError):
+        return False
+
+def _ask_agent(phase, outputs):
+    """Ask a phase's agent for steps, with the results of its inputs.
+    
+    Returns:
+        List of steps (empty when a debugger has nothing to fix), or None if
+        the agent gave no valid instructions
+    """
+    from agents import get_developer_instructions, get_tester_instructions, get_debugger_instructions
+    
+    complexity = {"complexity": phase["complexity"]} if "complexity" in phase else {}
+    if phase["agent"] == "debugger":
+        errors = _input_results(phase["inputs"], outputs, failed_only=True)
+        if not errors:
+            return []
+        return get_debugger_instructions(errors, **complexity) or None
+    
+    ask = {"developer": get_developer_instructions, "tester": get_tester_instructions}[phase["agent"]]
+    prompt = phase.get("prompt")
+    if phase["inputs"]:
+        prompt = f"{prompt or AGENTS[phase['agent']][1]}\n\nResults of earlier phases:\n{_input_results(phase['inputs'], outputs)}"
+    return ask(prompt, **complexity) or None
+
+def _input_results(inputs, outputs, failed_only=False):
+    """Describe the outputs of a phase's inputs for an agent prompt."""
+    lines = []
+    for name in inputs:
+        output = outputs[name]
+        if not isinstance(output, dict):
+            if not failed_only:
+                lines.append(f"{name}: {json.dumps(output)}")
+            continue
+        for result in output.get("results", []):
+            if failed_only and result["success"]:
+                continue
+            state = "succeeded" if result["success"] else "failed"
+            lines.append(f"{name} step {result['step']} ({result['action']}) {state}: {result.get('output', '')}")
+    return "\n".join(lines)
@@ -0,0 +1,13 @@
+# tests/conftest.py
+import os
+import sys
+import pytest
+
+# The modules in src import each other as top-level modules
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Run a test in an empty temporary directory, for state.json and the like."""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
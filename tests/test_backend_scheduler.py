@@ -0,0 +1,65 @@
+# tests/test_backend_scheduler.py
+import pytest
+import backend_scheduler
+from backend_scheduler import BackendScheduler
+from retry_policy import DeadlineExceeded
+
+TIER = ("local", "openai")
+AVAILABLE = ["local", "openai"]
+
+@pytest.fixture
+def scheduler(monkeypatch):
+    monkeypatch.setattr(backend_scheduler, "HEALTH_PROBE_INTERVAL", 0)
+    monkeypatch.setattr(backend_scheduler, "CIRCUIT_FAILURE_THRESHOLD", 2)
+    return BackendScheduler()
+
+def _open_circuit(scheduler, backend):
+    for _ in range(backend_scheduler.CIRCUIT_FAILURE_THRESHOLD):
+        scheduler.observe(backend, 1.0, False)
+
+def _half_open(scheduler, backend, monkeypatch):
+    """Open a backend's circuit with a cooldown that has already passed."""
+    monkeypatch.setattr(backend_scheduler, "CIRCUIT_COOLDOWN", -1)
+    _open_circuit(scheduler, backend)
+
+def test_untried_backends_come_first_then_the_fastest(scheduler):
+    scheduler.observe("local", 2.0, True)
+    assert scheduler.choose("low", AVAILABLE, tier=TIER) == "openai"
+    scheduler.observe("openai", 5.0, True)
+    assert scheduler.choose("low", AVAILABLE, tier=TIER) == "local"
+
+def test_load_counts_against_a_backend(scheduler):
+    scheduler.observe("local", 1.0, True)
+    scheduler.observe("openai", 1.5, True)
+    with scheduler.track("local"):
+        assert scheduler.choose("low", AVAILABLE, tier=TIER) == "openai"
+
+def test_open_circuit_is_skipped(scheduler):
+    _open_circuit(scheduler, "local")
+    assert scheduler.status()["local"]["circuit"] == "open"
+    assert scheduler.choose("low", AVAILABLE, tier=TIER) == "openai"
+
+def test_half_open_circuit_lets_one_trial_through(scheduler, monkeypatch):
+    _half_open(scheduler, "local", monkeypatch)
+    scheduler.observe("openai", 5.0, True)
+    assert scheduler.choose("low", AVAILABLE, tier=TIER) == "local"
+    assert scheduler.choose("low", AVAILABLE, tier=TIER) == "openai"
+    scheduler.observe("local", 0.5, True)
+    assert scheduler.status()["local"]["circuit"] == "closed"
+
+def test_trial_that_never_reaches_the_backend_is_released(scheduler, monkeypatch):
+    _half_open(scheduler, "local", monkeypatch)
+    scheduler.observe("openai", 5.0, True)
+    assert scheduler.choose("low", AVAILABLE, tier=TIER) == "local"
+    with pytest.raises(DeadlineExceeded):
+        with scheduler.track("local"):
+            raise DeadlineExceeded("Task deadline exceeded")
+    assert scheduler.status()["local"]["circuit"] == "half-open"
+    assert scheduler.choose("low", AVAILABLE, tier=TIER) == "local"
+
+def test_latency_percentile(scheduler):
+    assert scheduler.latency_percentile("local", 95) is None
+    for latency in range(1, 101):
+        scheduler.observe("local", latency / 100, True)
+    assert scheduler.latency_percentile("local", 50) == pytest.approx(0.5, abs=0.02)
+    assert scheduler.latency_percentile("local", 100) == 1.0
@@ -0,0 +1,80 @@
+# tests/test_benchmarks.py
+import os
+import sys
+import json
+import subprocess
+import pytest
+import requests
+
+BENCHMARKS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks")
+sys.path.insert(0, BENCHMARKS_DIR)
+
+from fake_llm_server import FakeLLMServer
+from run_benchmarks import summarize
+
+@pytest.fixture
+def fake_server():
+    """Start a fake LLM server with canned developer replies."""
+    servers = []
+    
+    def start(**options):
+        server = FakeLLMServer(latency=0.0, seed=1, responses={"developer": '{"steps": []}'}, **options).start()
+        servers.append(server)
+        return server
+    yield start
+    for server in servers:
+        server.stop()
+
+def _chat(server, stream=False):
+    return requests.post(f"{server.url}/chat/completions", json={
+        "model": "m",
+        "stream": stream,
+        "messages": [{"role": "system", "content": "You are a developer agent"}, {"role": "user", "content": "Build it"}]
+    }, timeout=5)
+
+def test_chat_completion_reports_content_and_usage(fake_server):
+    server = fake_server()
+    reply = _chat(server).json()
+    
+    assert reply["choices"][0]["message"]["content"] == '{"steps": []}'
+    assert reply["usage"]["completion_tokens"] > 0
+    assert server.stats["completions"] == 1
+    assert requests.get(f"{server.url}/models", timeout=5).json()["data"][0]["id"] == "fake-model"
+
+def test_streamed_reply_is_sent_as_server_sent_events(fake_server):
+    response = _chat(fake_server(), stream=True)
+    events = [line[len("data: "):] for line in response.text.splitlines() if line.startswith("data: ")]
+    
+    assert events[-1] == "[DONE]"
+    assert "".join(json.loads(event)["choices"][0]["delta"]["content"] for event in events[:-1]) == '{"steps": []}'
+
+def test_errors_are_injected(fake_server):
+    server = fake_server(error_rate=1.0)
+    
+    assert _chat(server).status_code == 503
+    assert server.stats == {"requests": 1, "errors": 1, "completions": 0}
+
+def test_delay_adds_generation_time_and_jitter():
+    server = FakeLLMServer(latency=0.1, token_rate=100, jitter=0.0)
+    
+    assert server.delay(50) == pytest.approx(0.6)
+
+def test_summarize_latency_percentiles():
+    summary = summarize([i / 100 for i in range(1, 101)], failures=2)
+    
+    assert summary == {"count": 100, "failures": 2, "mean": 0.505, "p50": 0.5, "p90": 0.9, "p99": 0.99, "max": 1.0}
+    assert summarize([])["p50"] is None
+
+def test_benchmark_run_writes_its_results(tmp_path):
+    output = tmp_path / "results.json"
+    subprocess.run(
+        [sys.executable, os.path.join(BENCHMARKS_DIR, "run_benchmarks.py"), "--only", "execute_steps",
+         "--iterations", "2", "--files", "2", "--output", str(output)],
+        capture_output=True, check=True, timeout=120
+    )
+    
+    with open(output) as f:
+        results = json.load(f)
+    assert results["benchmarks"]["execute_steps"]["count"] == 2
+    assert results["benchmarks"]["execute_steps"]["failures"] == 0
+    assert {"revision", "timestamp", "settings", "fake_llm"} <= set(results)
@@ -0,0 +1,45 @@
+# tests/test_cassette.py
+import pytest
+import llm_client
+from cassette import Cassette, CassetteMiss
+
+SCHEMA = {"title": "steps", "type": "object"}
+
+@pytest.fixture
+def recorded(tmp_path, monkeypatch):
+    """A cassette with two recordings of one prompt, used for replays."""
+    cassette = Cassette(str(tmp_path / "cassette.jsonl.gz"))
+    cassette.record("system", "user", SCHEMA, "first", "local", "model", 0.5)
+    cassette.record("system", "user", SCHEMA, "second", "local", "model", 0.5)
+    cassette.close()
+    monkeypatch.setattr(llm_client, "cassette", cassette)
+    return cassette
+
+def test_replay_serves_recordings_in_order_then_the_last(recorded):
+    replies = [llm_client._replay("system", "user", SCHEMA) for _ in range(3)]
+    
+    assert replies == ["first", "second", "second"]
+
+def test_replay_keys_on_the_schema(recorded):
+    with pytest.raises(CassetteMiss):
+        llm_client._replay("system", "user", None)
+
+def test_replay_of_an_unrecorded_prompt_names_its_key(recorded):
+    key = Cassette.key("system", "other prompt", SCHEMA)
+    
+    with pytest.raises(CassetteMiss, match=key):
+        llm_client._replay("system", "other prompt", SCHEMA)
+
+def test_truncated_cassette_replays_what_was_written(recorded):
+    with open(recorded.path, "rb") as f:
+        data = f.read()
+    with open(recorded.path, "wb") as f:
+        f.write(data[:-4])
+    cassette = Cassette(recorded.path)
+    
+    assert cassette.replay("system", "user", SCHEMA)["response"] == "first"
+
+def test_missing_cassette_replays_nothing(tmp_path):
+    cassette = Cassette(str(tmp_path / "missing.jsonl.gz"))
+    
+    assert cassette.replay("system", "user") is None
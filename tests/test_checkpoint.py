@@ -0,0 +1,74 @@
+# tests/test_checkpoint.py
+import os
+import pytest
+import checkpoint
+import main
+from checkpoint import Checkpoint, checkpoint_path, load_checkpoint, start_checkpoint
+from task_manager import TaskManager
+
+PLAN = [
+    {"action": "run_command", "command": "echo first >> log.txt"},
+    {"action": "create_file", "path": "a.txt", "content": "a"},
+    {"action": "run_command", "command": "test -f ready"},
+    {"action": "run_command", "command": "echo last >> log.txt"}
+]
+
+@pytest.fixture
+def checkpoints(workdir, monkeypatch):
+    """Enable checkpoints, saved under the test's directory."""
+    monkeypatch.setattr(checkpoint, "CHECKPOINTS", True)
+    monkeypatch.setattr(checkpoint, "CHECKPOINT_DIR", str(workdir / "checkpoints"))
+    return workdir
+
+def test_failed_plan_keeps_a_checkpoint_at_its_last_completed_step(checkpoints):
+    outcome = main.execute_steps(PLAN, debug=False, checkpoint=start_checkpoint("task1", PLAN, "build"))
+    
+    assert not outcome["success"]
+    saved = load_checkpoint("task1")
+    assert saved.data["status"] == "failed"
+    assert saved.next_step == 2
+    assert [result["step"] for result in saved.data["results"]] == [0, 1]
+
+def test_resume_runs_only_the_remaining_steps(checkpoints):
+    main.execute_steps(PLAN, debug=False, checkpoint=start_checkpoint("task2", PLAN, "build"))
+    (checkpoints / "ready").write_text("")
+    
+    result = TaskManager().resume_task("task2")
+    
+    assert result["success"] and result["trace_id"] == "task2"
+    assert (checkpoints / "log.txt").read_text().split() == ["first", "last"]
+    assert not os.path.exists(checkpoint_path("task2"))
+
+def test_successful_plan_leaves_no_checkpoint(checkpoints):
+    (checkpoints / "ready").write_text("")
+    
+    assert main.execute_steps(PLAN, debug=False, checkpoint=start_checkpoint("task3", PLAN))["success"]
+    assert load_checkpoint("task3") is None
+
+def test_unflushed_writes_are_not_completed_steps(checkpoints):
+    saved = start_checkpoint("task4", PLAN)
+    saved.step_done(0, {"step": 0})
+    saved.step_done(1, {"step": 1}, flushed=False)
+    
+    assert load_checkpoint("task4").next_step == 1
+    saved.flushed()
+    assert load_checkpoint("task4").next_step == 2
+
+def test_background_processes_after_the_last_kill_are_restarted():
+    steps = [
+        {"action": "run_command", "command": "server a", "background": True},
+        {"action": "kill_process"},
+        {"action": "run_command", "command": "server b", "background": True},
+        {"action": "run_command", "command": "ls"},
+        {"action": "run_command", "command": "server c", "background": True}
+    ]
+    saved = Checkpoint({"task_id": "t", "steps": steps, "last_completed": 3, "results": []})
+    
+    assert saved.background_steps() == [steps[2]]
+    assert saved.remaining_steps() == [steps[4]]
+
+def test_checkpoints_are_off_by_default_and_ids_cannot_leave_the_directory(checkpoints, monkeypatch):
+    assert load_checkpoint("../task1") is None
+    assert TaskManager().resume_task("missing")["error"] == "No checkpoint for task missing"
+    monkeypatch.setattr(checkpoint, "CHECKPOINTS", False)
+    assert start_checkpoint("task5", PLAN) is None
@@ -0,0 +1,95 @@
+# tests/test_daemon.py
+import os
+import sys
+import stat
+import time
+import socket
+import threading
+import subprocess
+import pytest
+import daemon
+
+pytestmark = pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="needs Unix domain sockets")
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+# A daemon whose commands print what they ran with, and how many commands
+# their worker has run
+DAEMON_SCRIPT = """
+import os, sys, time
+sys.path.insert(0, {src!r})
+import daemon
+count = []
+def run_argv(argv):
+    count.append(argv)
+    print(f"pid={{os.getpid()}} count={{len(count)}} cwd={{os.getcwd()}} x={{os.environ.get('X')}}")
+    if argv == ["sleep"]:
+        time.sleep(1)
+    if argv == ["fail"]:
+        sys.exit(3)
+daemon.run_daemon(run_argv, sys.argv[1])
+"""
+
+@pytest.fixture
+def running_daemon(tmp_path):
+    """Start a daemon with two workers, and stop it after the test."""
+    socket_path = str(tmp_path / "daemon.sock")
+    script = tmp_path / "daemon_main.py"
+    script.write_text(DAEMON_SCRIPT.format(src=SRC))
+    process = subprocess.Popen(
+        [sys.executable, str(script), socket_path], env=dict(os.environ, AGENTS_DAEMON_WORKERS="2"),
+        stdout=subprocess.DEVNULL
+    )
+    for _ in range(100):
+        if os.path.exists(socket_path):
+            break
+        time.sleep(0.05)
+    yield socket_path
+    daemon.stop_daemon(socket_path)
+    process.wait(timeout=10)
+    assert not os.path.exists(socket_path)
+
+def _run(socket_path, argv, capsys):
+    """Forward a command and get its exit code and output."""
+    exit_code = daemon.forward_to_daemon(argv, socket_path)
+    return exit_code, capsys.readouterr().out
+
+def test_socket_is_only_accessible_to_its_owner(running_daemon):
+    assert stat.S_IMODE(os.stat(running_daemon).st_mode) == 0o600
+
+def test_commands_run_in_the_callers_directory_and_environment(running_daemon, tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("X", "from caller")
+    monkeypatch.setenv("PATH", os.environ["PATH"] + os.pathsep + str(tmp_path))
+    exit_code, output = _run(running_daemon, ["a"], capsys)
+    assert exit_code == 0
+    assert f"cwd={tmp_path}" in output
+    assert "x=from caller" in output
+
+def test_exit_code_is_forwarded(running_daemon, capsys):
+    assert _run(running_daemon, ["fail"], capsys)[0] == 3
+
+def test_workers_keep_their_state_between_commands(running_daemon, capsys):
+    counts = {}
+    for _ in range(6):
+        output = _run(running_daemon, ["a"], capsys)[1]
+        pid, count = [part.split("=")[1] for part in output.split()[:2]]
+        counts[pid] = max(counts.get(pid, 0), int(count))
+    assert len(counts) <= 2
+    assert max(counts.values()) > 1
+
+def test_commands_run_concurrently(running_daemon):
+    started = time.perf_counter()
+    threads = [threading.Thread(target=daemon.forward_to_daemon, args=(["sleep"], running_daemon)) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert time.perf_counter() - started < 1.9
+
+def test_different_settings_run_in_process(running_daemon, monkeypatch, capsys):
+    monkeypatch.setenv("LLM_SINGLE_FLIGHT", "something else")
+    assert _run(running_daemon, ["a"], capsys) == (None, "")
+
+def test_no_daemon_runs_in_process(tmp_path):
+    assert daemon.forward_to_daemon(["a"], str(tmp_path / "missing.sock")) is None
@@ -0,0 +1,87 @@
+# tests/test_endpoint_pool.py
+import pytest
+import endpoint_pool
+from endpoint_pool import EndpointPool
+
+URLS = ["http://a/v1", "http://b/v1", "http://c/v1"]
+
+class StatusError(Exception):
+    """Error carrying an HTTP status, like the SDKs' API errors."""
+    
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+@pytest.fixture
+def pool(monkeypatch):
+    """A pool of three endpoints, without background health checks or retries."""
+    monkeypatch.setattr(endpoint_pool, "POOL_HEALTH_INTERVAL", 0)
+    monkeypatch.setenv("LLM_TEST_POOL_MAX_ATTEMPTS", "1")
+    return EndpointPool("test_pool", URLS)
+
+def _endpoint(pool, url):
+    return next(endpoint for endpoint in pool.endpoints if endpoint.url == url)
+
+def test_requests_go_to_the_least_loaded_endpoint(pool):
+    _endpoint(pool, "http://a/v1").in_flight = 3
+    _endpoint(pool, "http://b/v1").in_flight = 2
+    
+    assert pool.choose().url == "http://c/v1"
+    with pool.acquire() as first, pool.acquire() as second, pool.acquire() as third:
+        assert (first.url, second.url) == ("http://c/v1", "http://c/v1")
+        assert third.url in ("http://b/v1", "http://c/v1")
+        assert first.in_flight + _endpoint(pool, "http://b/v1").in_flight == 5
+    assert _endpoint(pool, "http://c/v1").in_flight == 0
+
+def test_healthy_endpoints_with_the_model_are_preferred(pool):
+    _endpoint(pool, "http://a/v1").healthy = False
+    _endpoint(pool, "http://b/v1").models = {"small"}
+    _endpoint(pool, "http://c/v1").models = {"large"}
+    
+    assert pool.choose("large").url == "http://c/v1"
+    assert pool.choose("default").url in ("http://b/v1", "http://c/v1")
+    assert pool.choose("large", exclude=pool.endpoints[1:]).url == "http://a/v1"
+
+def test_retryable_error_fails_over_to_another_endpoint(pool):
+    tried = []
+    
+    def request(endpoint, timeout):
+        tried.append(endpoint.url)
+        if len(tried) == 1:
+            raise StatusError(503)
+        return endpoint.url
+    
+    assert pool.call("m", request) == tried[1]
+    assert tried[0] != tried[1]
+    assert not _endpoint(pool, tried[0]).healthy
+
+def test_other_errors_are_not_failed_over(pool):
+    tried = []
+    
+    def request(endpoint, timeout):
+        tried.append(endpoint.url)
+        raise StatusError(400)
+    
+    with pytest.raises(StatusError):
+        pool.call("m", request)
+    assert len(tried) == 1
+    assert all(endpoint.healthy for endpoint in pool.endpoints)
+
+def test_error_is_raised_once_every_endpoint_failed(pool):
+    tried = []
+    
+    def request(endpoint, timeout):
+        tried.append(endpoint.url)
+        raise StatusError(503)
+    
+    with pytest.raises(StatusError):
+        pool.call("m", request)
+    assert sorted(tried) == URLS
+
+def test_check_records_health_and_loaded_models(pool, monkeypatch):
+    replies = {"http://a/v1": (True, ["small"]), "http://b/v1": (False, "Error: 500"), "http://c/v1": (True, ["large"])}
+    monkeypatch.setattr(endpoint_pool, "probe_endpoint", lambda url: replies[url])
+    
+    assert pool.check() == (True, ["small", "large"])
+    assert [status["healthy"] for status in pool.status()] == [True, False, True]
+    assert pool.status()[0]["models"] == ["small"]
@@ -0,0 +1,87 @@
+# tests/test_execute_steps.py
+import os
+import pytest
+import main
+import snapshot_manager
+from state_manager import load_state
+
+def test_write_steps_are_flushed_and_recorded(workdir):
+    outcome = main.execute_steps([
+        {"action": "create_file", "path": "a.txt", "content": "a"},
+        {"action": "modify_file", "path": "a.txt", "content": "b"}
+    ], debug=False)
+    assert outcome["success"]
+    assert (workdir / "a.txt").read_text() == "b"
+    assert [action["success"] for action in load_state()["actions"]] == [True, True]
+
+def test_failed_final_flush_is_recorded_as_failed(workdir):
+    (workdir / "taken").mkdir()
+    outcome = main.execute_steps([{"action": "create_file", "path": "taken", "content": "x"}], debug=False)
+    assert not outcome["success"]
+    result = outcome["results"][0]
+    assert result["output"] == "Error: the file could not be written to disk"
+    actions = load_state()["actions"]
+    assert len(actions) == 1
+    assert not actions[0]["success"]
+    assert actions[0]["output"] == result["output"]
+
+def test_failed_flush_before_a_command_stops_the_steps(workdir):
+    (workdir / "taken").mkdir()
+    outcome = main.execute_steps([
+        {"action": "create_file", "path": "taken", "content": "x"},
+        {"action": "run_command", "command": "touch ran"}
+    ], debug=False)
+    assert not outcome["success"]
+    assert not (workdir / "ran").exists()
+    assert [action["success"] for action in load_state()["actions"]] == [False, False]
+
+@pytest.fixture
+def rollback(monkeypatch):
+    monkeypatch.setattr(snapshot_manager, "ROLLBACK_ON_FAILURE", True)
+
+def _debugger(monkeypatch, *fixes):
+    """Replace the debugger agent with one giving these fixes, then none.
+    
+    Returns:
+        List of the contents of a.txt each time the debugger was asked
+    """
+    import agents
+    seen = []
+    
+    def get_debugger_instructions(error_msg):
+        seen.append(open("a.txt").read())
+        return fixes[len(seen) - 1] if len(seen) <= len(fixes) else None
+    monkeypatch.setattr(agents, "get_debugger_instructions", get_debugger_instructions)
+    return seen
+
+FAILING = [
+    {"action": "modify_file", "path": "a.txt", "content": "broken"},
+    {"action": "run_command", "command": "grep -q fixed a.txt"}
+]
+
+def test_debugger_sees_the_failed_files_and_its_fix_is_kept(workdir, rollback, monkeypatch):
+    (workdir / "a.txt").write_text("original")
+    seen = _debugger(monkeypatch, [{"action": "modify_file", "path": "a.txt", "content": "fixed"}])
+    main.execute_steps(FAILING)
+    assert seen == ["broken"]
+    assert (workdir / "a.txt").read_text() == "fixed"
+
+def test_failed_batch_is_rolled_back_without_a_fix(workdir, rollback, monkeypatch):
+    (workdir / "a.txt").write_text("original")
+    seen = _debugger(monkeypatch)
+    outcome = main.execute_steps(FAILING)
+    assert not outcome["success"]
+    assert seen == ["broken"]
+    assert (workdir / "a.txt").read_text() == "original"
+
+def test_failed_batch_is_rolled_back_when_the_fix_fails(workdir, rollback, monkeypatch):
+    (workdir / "a.txt").write_text("original")
+    seen = _debugger(monkeypatch, [
+        {"action": "modify_file", "path": "a.txt", "content": "still broken"},
+        {"action": "run_command", "command": "grep -q fixed a.txt"}
+    ])
+    outcome = main.execute_steps(FAILING)
+    assert not outcome["success"]
+    assert seen == ["broken", "still broken"]
+    assert (workdir / "a.txt").read_text() == "original"
+    assert os.listdir(workdir / ".agent_snapshots" / "snapshots") == []
@@ -0,0 +1,45 @@
+# tests/test_extract_json.py
+import json
+import time
+from llm_client import extract_json, iter_json_objects
+from schemas import ROUTER_SCHEMA
+
+def test_object_in_prose_with_braces_after_it():
+    text = 'Plan: {"route_to": "local", "complexity": "low"} and then use {braces} in prose.'
+    
+    assert extract_json(text) == {"route_to": "local", "complexity": "low"}
+
+def test_braces_inside_strings_do_not_end_the_object():
+    text = 'x {"content": "def f():\\n    return {\\"a\\": 1}", "path": "a.py"} y'
+    
+    assert extract_json(text) == {"content": 'def f():\n    return {"a": 1}', "path": "a.py"}
+
+def test_object_matching_the_schema_is_preferred():
+    text = 'Example: {"foo": 1}\nAnswer: {"route_to": "claude", "complexity": "high"}'
+    
+    assert extract_json(text, ROUTER_SCHEMA) == {"route_to": "claude", "complexity": "high"}
+    assert extract_json(text) == {"foo": 1}
+
+def test_first_parsed_object_is_returned_when_none_matches():
+    assert extract_json('{"foo": 1} {"bar": 2}', ROUTER_SCHEMA) == {"foo": 1}
+
+def test_common_formatting_errors_are_repaired():
+    text = "{'route_to': 'local', 'complexity': 'low',}"
+    
+    assert extract_json(text) == {"route_to": "local", "complexity": "low"}
+
+def test_unparseable_blocks_are_skipped():
+    assert list(iter_json_objects('{not json} {"ok": true} {also not}')) == [{"ok": True}]
+
+def test_unclosed_block_ends_the_scan():
+    assert list(iter_json_objects('{"a": 1} {"b": ')) == [{"a": 1}]
+    assert extract_json("no json here") is None
+    assert extract_json(None) is None
+
+def test_large_reply_with_many_unclosed_braces_is_scanned_quickly():
+    # Quadratic rescanning took seconds on this; a single pass takes milliseconds
+    text = "{ " * 5_000 + json.dumps({"route_to": "local", "complexity": "low"})
+    
+    started = time.perf_counter()
+    extract_json(text, ROUTER_SCHEMA)
+    assert time.perf_counter() - started < 1
@@ -0,0 +1,102 @@
+# tests/test_file_manager.py
+import os
+from file_manager import (
+    apply_patch,
+    patch_file,
+    create_file,
+    read_file,
+    write_batch,
+    flush_writes
+)
+
+ORIGINAL = "one\ntwo\nthree\n"
+
+def test_unified_diff_replaces_lines():
+    diff = "@@ -1,3 +1,3 @@\n one\n-two\n+TWO\n three\n"
+    assert apply_patch(ORIGINAL, diff=diff) == (True, "one\nTWO\nthree\n")
+
+def test_hunk_is_found_away_from_its_stated_line():
+    diff = "@@ -10,2 +10,2 @@\n two\n-three\n+THREE\n"
+    assert apply_patch(ORIGINAL, diff=diff) == (True, "one\ntwo\nTHREE\n")
+
+def test_insertion_hunk_inserts_after_the_stated_line():
+    diff = "@@ -1,0 +2,1 @@\n+inserted\n"
+    assert apply_patch(ORIGINAL, diff=diff) == (True, "one\ninserted\ntwo\nthree\n")
+
+def test_insertion_hunk_at_start_and_end():
+    assert apply_patch(ORIGINAL, diff="@@ -0,0 +1 @@\n+zero\n") == (True, "zero\none\ntwo\nthree\n")
+    assert apply_patch(ORIGINAL, diff="@@ -3,0 +4 @@\n+four\n") == (True, "one\ntwo\nthree\nfour\n")
+
+def test_insertion_after_an_earlier_hunk_uses_the_offset():
+    diff = "@@ -1,1 +1,2 @@\n one\n+one and a half\n@@ -2,0 +4,1 @@\n+two and a half\n"
+    success, patched = apply_patch(ORIGINAL, diff=diff)
+    assert success
+    assert patched == "one\none and a half\ntwo\ntwo and a half\nthree\n"
+
+def test_blank_context_line_without_leading_space():
+    content = "a\n\nb\n"
+    diff = "@@ -1,3 +1,3 @@\n a\n\n-b\n+B\n"
+    assert apply_patch(content, diff=diff) == (True, "a\n\nB\n")
+
+def test_context_line_without_leading_space_is_rejected():
+    diff = "@@ -1,3 +1,3 @@\none\n-two\n+TWO\n three\n"
+    success, message = apply_patch(ORIGINAL, diff=diff)
+    assert not success
+    assert "Malformed line" in message and "'one'" in message
+
+def test_conflicting_hunk_is_reported():
+    diff = "@@ -1,2 +1,2 @@\n one\n-zwei\n+TWO\n"
+    assert apply_patch(ORIGINAL, diff=diff) == (False, "Hunk 1 context does not match")
+
+def test_search_replace_edits():
+    assert apply_patch(ORIGINAL, edits=[{"search": "two", "replace": "2"}]) == (True, "one\n2\nthree\n")
+    assert not apply_patch("x x", edits=[{"search": "x", "replace": "y"}])[0]
+    assert not apply_patch(ORIGINAL, edits=[{"search": "four", "replace": "4"}])[0]
+
+def test_search_replace_blocks_in_diff():
+    blocks = "<<<<<<< SEARCH\ntwo\n=======\n2\n>>>>>>> REPLACE\n"
+    assert apply_patch(ORIGINAL, diff=blocks) == (True, "one\n2\nthree\n")
+
+def test_conflicting_patch_leaves_the_file_untouched(tmp_path):
+    path = tmp_path / "f.txt"
+    path.write_text(ORIGINAL)
+    success, _ = patch_file(str(path), edits=[{"search": "two", "replace": "2"}, {"search": "nope", "replace": ""}])
+    assert not success
+    assert path.read_text() == ORIGINAL
+    assert patch_file(str(path), edits=[{"search": "two", "replace": "2"}]) == (True, f"File {path} patched.")
+    assert path.read_text() == "one\n2\nthree\n"
+
+def test_create_file_leaves_no_temporary_files(tmp_path):
+    path = tmp_path / "f.txt"
+    assert create_file(str(path), "hello\n")
+    assert create_file(str(path), "hello again\n")
+    assert path.read_text() == "hello again\n"
+    assert os.listdir(tmp_path) == ["f.txt"]
+
+def test_unchanged_content_is_not_rewritten(tmp_path):
+    path = tmp_path / "f.txt"
+    create_file(str(path), "same")
+    inode = os.stat(path).st_ino
+    create_file(str(path), "same")
+    assert os.stat(path).st_ino == inode
+
+def test_write_batch_buffers_and_coalesces_writes(tmp_path):
+    path = tmp_path / "f.txt"
+    with write_batch():
+        create_file(str(path), "first")
+        with write_batch():
+            create_file(str(path), "second")
+        # Only the outermost batch flushes
+        assert not path.exists()
+        assert read_file(str(path)) == "second"
+    assert path.read_text() == "second"
+
+def test_flush_writes_reports_failure(tmp_path):
+    # A directory cannot be replaced by a file
+    (tmp_path / "taken").mkdir()
+    with write_batch():
+        create_file(str(tmp_path / "ok.txt"), "ok")
+        create_file(str(tmp_path / "taken"), "content")
+        assert not flush_writes()
+    assert (tmp_path / "taken").is_dir()
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
@@ -0,0 +1,143 @@
+# tests/test_llm_backends.py
+from types import SimpleNamespace
+import pytest
+import llm_backends
+from llm_backends import CLAUDE_MAX_TOKENS, Backend, ClaudeBackend, OpenAICompatibleBackend
+from schemas import STEPS_SCHEMA
+
+class FakeMessages:
+    """Stands in for anthropic's client.messages, recording each call."""
+    
+    def __init__(self):
+        self.calls = []
+    
+    def create(self, **kwargs):
+        self.calls.append(("create", kwargs))
+        return SimpleNamespace(
+            content=[SimpleNamespace(text='"ok": true}')],
+            usage=SimpleNamespace(input_tokens=3, output_tokens=2)
+        )
+    
+    def stream(self, **kwargs):
+        self.calls.append(("stream", kwargs))
+        
+        class Stream:
+            text_stream = iter(["o", "k"])
+            
+            def __enter__(self):
+                return self
+            
+            def __exit__(self, *exc):
+                return False
+        return Stream()
+
+def _claude():
+    backend = ClaudeBackend("claude", "key", "claude-test")
+    backend._client = SimpleNamespace(messages=FakeMessages())
+    return backend
+
+def test_claude_passes_max_tokens_on_both_paths():
+    backend = _claude()
+    text, _ = backend._complete("system", "user", "claude-test", 0.2, None)
+    chunks = list(backend._stream("system", "user", "claude-test", 0.2))
+    
+    assert text == '"ok": true}'
+    assert chunks == ["o", "k"]
+    calls = backend._client.messages.calls
+    assert [kind for kind, _ in calls] == ["create", "stream"]
+    assert all(kwargs["max_tokens"] == CLAUDE_MAX_TOKENS for _, kwargs in calls)
+
+def test_claude_prefills_json_replies(monkeypatch):
+    monkeypatch.setattr(llm_backends, "STRUCTURED_OUTPUT", True)
+    backend = _claude()
+    text, _ = backend._complete("system", "user", "claude-test", 0.2, {"type": "object"})
+    
+    assert text == '{"ok": true}'
+    _, kwargs = backend._client.messages.calls[0]
+    assert kwargs["messages"][-1] == {"role": "assistant", "content": "{"}
+
+class StatusError(Exception):
+    """Error carrying an HTTP status, like the SDKs' API errors."""
+    
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+class FakeCompletions:
+    """Stands in for the OpenAI client's chat.completions, rejecting structured output if asked to."""
+    
+    def __init__(self, reject=False):
+        self.reject = reject
+        self.calls = []
+    
+    def create(self, **kwargs):
+        self.calls.append(kwargs)
+        if self.reject and "response_format" in kwargs:
+            raise StatusError(400)
+        message = SimpleNamespace(content='{"steps": []}')
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+def _openai_client(reject=False):
+    return SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions(reject)))
+
+@pytest.mark.parametrize("capabilities, response_format", [
+    ({"chat", "json_schema"}, {"type": "json_schema", "json_schema": {"name": "steps", "schema": STEPS_SCHEMA}}),
+    ({"chat", "json_object"}, {"type": "json_object"}),
+    ({"chat"}, None),
+])
+def test_structured_output_follows_the_backend_capabilities(monkeypatch, capabilities, response_format):
+    monkeypatch.setattr(llm_backends, "STRUCTURED_OUTPUT", True)
+    backend = OpenAICompatibleBackend("test", "http://localhost:1/v1", "", "model", capabilities=capabilities)
+    
+    assert backend._structured_output("model", STEPS_SCHEMA).get("response_format") == response_format
+    assert backend._structured_output("model", None) == {}
+
+def test_model_rejecting_structured_output_is_asked_without_it(monkeypatch):
+    monkeypatch.setattr(llm_backends, "STRUCTURED_OUTPUT", True)
+    backend = OpenAICompatibleBackend("test", "http://localhost:1/v1", "", "model")
+    client = _openai_client(reject=True)
+    
+    for _ in range(2):
+        backend._create_completion(client, 10, "model", "system", "user", 0.2, STEPS_SCHEMA)
+    
+    assert ["response_format" in call for call in client.chat.completions.calls] == [True, False, False]
+
+def test_default_backends_are_registered():
+    assert {"local", "openai", "claude"} <= set(llm_backends._registry)
+    assert llm_backends.get_backend("local").kind == "local"
+    assert llm_backends.get_backend("openai").kind == "remote"
+
+def test_extra_backends_parse_as_named_url_lists():
+    value = "vllm=http://gpu1:8000/v1,http://gpu2:8000/v1, llama=http://cpu:8080/v1"
+    
+    assert llm_backends._parse_backends(value) == [
+        ("vllm", ["http://gpu1:8000/v1", "http://gpu2:8000/v1"]),
+        ("llama", ["http://cpu:8080/v1"]),
+    ]
+
+def test_fallback_chain_skips_unknown_backends_and_cycles(monkeypatch):
+    for name in ("test_a", "test_b"):
+        monkeypatch.setitem(llm_backends._registry, name, Backend(name, "model"))
+    monkeypatch.setitem(llm_backends._fallbacks, "test_a", ["test_missing", "test_b"])
+    monkeypatch.setitem(llm_backends._fallbacks, "test_b", ["test_a"])
+    
+    assert llm_backends.fallback_chain("test_a") == ["test_a", "test_b"]
+    assert llm_backends.fallback_chain("test_missing") == []
+
+def test_registering_a_backend_replaces_one_with_the_same_name(monkeypatch):
+    monkeypatch.setitem(llm_backends._registry, "test_a", Backend("test_a", "old"))
+    llm_backends.register_backend(Backend("test_a", "new"))
+    
+    assert llm_backends.get_backend("test_a").model == "new"
+
+def test_availability_and_model_choice_depend_on_the_kind():
+    local = OpenAICompatibleBackend("test_local", "http://localhost:1/v1", "", "served-model")
+    remote = OpenAICompatibleBackend("test_remote", None, "", "gpt", kind="remote")
+    
+    assert local.available() and not remote.available()
+    assert local.model_for("gpt-4") == "served-model"
+    assert remote.model_for("gpt-4") == "gpt-4" and remote.model_for(None) == "gpt"
+
+def test_base_backend_has_no_embeddings():
+    with pytest.raises(llm_backends.BackendError):
+        Backend("test_a", "model").embed(["text"])
@@ -0,0 +1,146 @@
+# tests/test_llm_client.py
+import time
+import threading
+import pytest
+import llm_backends
+import llm_client
+from llm_backends import Backend, BackendError
+from telemetry import call_chain, current_chain
+from retry_policy import DeadlineExceeded, deadline
+from schemas import ROUTER_SCHEMA
+
+class FakeBackend(Backend):
+    """Backend whose replies are scripted, counting the calls it answers at once."""
+    
+    kind = "local"
+    
+    def __init__(self, name, reply="reply", error=None, gate=None):
+        super().__init__(name, "fake-model")
+        self.reply = reply
+        self.error = error
+        self.gate = gate
+        self.calls = 0
+        self.in_flight = 0
+        self.most_in_flight = 0
+        self._lock = threading.Lock()
+    
+    def _complete(self, system_prompt, user_prompt, model, temperature, json_schema):
+        with self._lock:
+            self.calls += 1
+            self.in_flight += 1
+            self.most_in_flight = max(self.most_in_flight, self.in_flight)
+        try:
+            if self.gate:
+                self.gate.wait(5)
+            if self.error:
+                raise self.error
+            return self.reply, None
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+@pytest.fixture
+def backends(monkeypatch):
+    """Register fake backends for a test, with fallbacks as given."""
+    def register(*fakes, fallbacks=None):
+        for fake in fakes:
+            monkeypatch.setitem(llm_backends._registry, fake.name, fake)
+        for name, chain in (fallbacks or {}).items():
+            monkeypatch.setitem(llm_backends._fallbacks, name, chain)
+        return fakes
+    return register
+
+def test_fallbacks_are_tried_in_order_until_one_answers(backends):
+    first, second, third = backends(
+        FakeBackend("fake_a", error=BackendError("down")),
+        FakeBackend("fake_b", reply="from b"),
+        FakeBackend("fake_c", reply="from c"),
+        fallbacks={"fake_a": ["fake_b"], "fake_b": ["fake_c"]}
+    )
+    
+    assert llm_client._complete_with_fallbacks("fake_a", "system", "user") == "from b"
+    assert (first.calls, second.calls, third.calls) == (1, 1, 0)
+
+def test_concurrent_requests_to_a_local_backend_are_sent_at_once(backends):
+    gate = threading.Event()
+    fake, = backends(FakeBackend("fake_local", gate=gate))
+    results = []
+    threads = [
+        threading.Thread(
+            target=lambda i=i: results.append(llm_client._complete_with_fallbacks("fake_local", "system", f"user {i}"))
+        )
+        for i in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while fake.in_flight < 4 and time.monotonic() < deadline:
+        time.sleep(0.001)
+    gate.set()
+    for thread in threads:
+        thread.join(5)
+    
+    assert fake.most_in_flight == 4
+    assert results == ["reply"] * 4
+
+@pytest.fixture
+def hedging(monkeypatch):
+    """Hedge calls that take longer than 20 ms."""
+    monkeypatch.setattr(llm_client, "HEDGE_DELAY_MS", 20)
+    monkeypatch.setattr(llm_client.scheduler, "latency_percentile", lambda backend, percentile: None)
+
+def test_slow_call_is_hedged_to_the_secondary(backends, hedging):
+    gate = threading.Event()
+    primary, secondary = backends(FakeBackend("fake_slow", "slow", gate=gate), FakeBackend("fake_fast", "fast"))
+    with call_chain():
+        result = llm_client._hedged_call("fake_slow", "fake_fast", "system", "user", None, 0.2)
+        chain = current_chain()
+    gate.set()
+    
+    assert result == "fast"
+    assert chain == ["fake_fast"]
+    assert (primary.calls, secondary.calls) == (1, 1)
+
+def test_fast_call_is_not_hedged(backends, hedging):
+    primary, secondary = backends(FakeBackend("fake_primary", "first"), FakeBackend("fake_secondary", "second"))
+    
+    assert llm_client._hedged_call("fake_primary", "fake_secondary", "system", "user", None, 0.2) == "first"
+    assert secondary.calls == 0
+
+def test_passed_deadline_raises_instead_of_a_mock_reply(backends):
+    fake, = backends(FakeBackend("fake_local"))
+    
+    with deadline(0.01):
+        time.sleep(0.02)
+        with pytest.raises(DeadlineExceeded):
+            llm_client._complete_with_fallbacks("fake_local", "system", "user")
+    assert fake.calls == 0
+
+def _replies(monkeypatch, *replies):
+    """Make ask_llm answer with the given replies in turn, recording the prompts."""
+    prompts = []
+    
+    def ask_llm(system_prompt, user_prompt, **kwargs):
+        prompts.append((user_prompt, kwargs.get("json_schema")))
+        return replies[len(prompts) - 1]
+    monkeypatch.setattr(llm_client, "ask_llm", ask_llm)
+    return prompts
+
+def test_ask_json_requests_the_schema_and_returns_a_valid_reply(monkeypatch):
+    prompts = _replies(monkeypatch, 'Here you go: {"route_to": "local", "complexity": "low"}')
+    
+    assert llm_client.ask_json("system", "user", ROUTER_SCHEMA) == {"route_to": "local", "complexity": "low"}
+    assert prompts == [("user", ROUTER_SCHEMA)]
+
+def test_ask_json_asks_once_for_a_corrected_reply(monkeypatch):
+    prompts = _replies(monkeypatch, '{"route_to": "moon"}', '{"route_to": "claude", "complexity": "high"}')
+    
+    assert llm_client.ask_json("system", "user", ROUTER_SCHEMA) == {"route_to": "claude", "complexity": "high"}
+    repair_prompt = prompts[1][0]
+    assert '{"route_to": "moon"}' in repair_prompt
+    assert "$ is missing required field 'complexity'" in repair_prompt
+
+def test_ask_json_returns_none_without_any_json(monkeypatch):
+    _replies(monkeypatch, "I cannot help with that.", "Still no.")
+    
+    assert llm_client.ask_json("system", "user", ROUTER_SCHEMA) is None
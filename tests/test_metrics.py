@@ -0,0 +1,57 @@
+# tests/test_metrics.py
+import pytest
+import metrics
+from metrics import Counter, Gauge, Histogram, render_metrics
+
+@pytest.fixture
+def registry(monkeypatch):
+    """Register the metrics a test creates apart from the process's own."""
+    monkeypatch.setattr(metrics, "_registry", [])
+
+def test_counter_renders_one_sample_per_label_set(registry):
+    counter = Counter("test_calls_total", "Calls", ("backend",))
+    counter.inc(backend="local")
+    counter.inc(2, backend="local")
+    counter.inc(backend='say "hi"\n')
+    
+    assert render_metrics().splitlines() == [
+        "# HELP test_calls_total Calls",
+        "# TYPE test_calls_total counter",
+        'test_calls_total{backend="local"} 3',
+        'test_calls_total{backend="say \\"hi\\"\\n"} 1',
+    ]
+
+def test_histogram_buckets_are_cumulative(registry):
+    histogram = Histogram("test_seconds", "Durations", buckets=(1, 0.1))
+    for value in (0.05, 0.5, 5):
+        histogram.observe(value)
+    
+    assert render_metrics().splitlines()[2:] == [
+        'test_seconds_bucket{le="0.1"} 1',
+        'test_seconds_bucket{le="1"} 2',
+        'test_seconds_bucket{le="+Inf"} 3',
+        "test_seconds_sum 5.55",
+        "test_seconds_count 3",
+    ]
+
+def test_gauge_collects_its_values_when_rendered(registry):
+    values = {("a",): 1}
+    Gauge("test_up", "Up", ("name",), collect=lambda: values)
+    first = render_metrics()
+    values = {("b",): 0}
+    
+    assert 'test_up{name="a"} 1' in first
+    assert render_metrics().splitlines()[2:] == ['test_up{name="b"} 0']
+
+def test_failing_collector_renders_no_samples(registry):
+    Gauge("test_broken", "Broken", collect=lambda: 1 / 0)
+    
+    assert render_metrics().splitlines() == ["# HELP test_broken Broken", "# TYPE test_broken gauge"]
+
+def test_process_metrics_render(workdir):
+    metrics.TASKS.inc(agent="developer", status="success")
+    text = render_metrics()
+    
+    assert "# TYPE agents_cli_tasks_total counter" in text
+    assert 'agents_cli_tasks_total{agent="developer",status="success"}' in text
+    assert "agents_cli_background_processes 0" in text
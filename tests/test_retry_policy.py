@@ -0,0 +1,109 @@
+# tests/test_retry_policy.py
+import time
+import pytest
+import retry_policy
+from retry_policy import (
+    DeadlineExceeded, attempt_timeout, call_with_retries, deadline, get_policy, is_retryable, remaining_time
+)
+
+class StatusError(Exception):
+    """Error carrying an HTTP status, like the SDKs' API errors."""
+    
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+class ReadTimeout(Exception):
+    """Named like the requests library's timeout."""
+
+@pytest.fixture
+def no_sleep(monkeypatch):
+    """Record backoff delays instead of sleeping."""
+    delays = []
+    monkeypatch.setattr(retry_policy.time, "sleep", delays.append)
+    monkeypatch.setenv("LLM_TEST_MAX_ATTEMPTS", "3")
+    monkeypatch.setenv("LLM_TEST_BACKOFF_BASE", "1")
+    return delays
+
+def _flaky(*errors, result="ok"):
+    """Get a call that raises the given errors in turn, then returns result."""
+    attempts = []
+    
+    def call(timeout):
+        attempts.append(timeout)
+        if len(attempts) <= len(errors):
+            raise errors[len(attempts) - 1]
+        return result
+    call.attempts = attempts
+    return call
+
+@pytest.mark.parametrize("error, retryable", [
+    (StatusError(429), True),
+    (StatusError(503), True),
+    (StatusError(400), False),
+    (StatusError(401), False),
+    (TimeoutError(), True),
+    (ConnectionResetError(), True),
+    (ReadTimeout(), True),
+    (ValueError("bad reply"), False),
+    (DeadlineExceeded("late"), False),
+])
+def test_is_retryable(error, retryable):
+    assert is_retryable(error) is retryable
+
+def test_policy_settings_per_backend_override_global_ones(monkeypatch):
+    monkeypatch.setenv("LLM_TIMEOUT", "30")
+    monkeypatch.setenv("LLM_LOCAL_TIMEOUT", "90")
+    
+    assert get_policy("local")["timeout"] == 90
+    assert get_policy("openai")["timeout"] == 30
+
+def test_retryable_errors_are_retried_with_jittered_backoff(no_sleep):
+    call = _flaky(StatusError(503), TimeoutError())
+    
+    assert call_with_retries("test", call) == "ok"
+    assert len(call.attempts) == 3
+    assert 0 <= no_sleep[0] <= 1 and 0 <= no_sleep[1] <= 2
+
+def test_other_errors_are_raised_at_once(no_sleep):
+    call = _flaky(StatusError(400))
+    
+    with pytest.raises(StatusError):
+        call_with_retries("test", call)
+    assert len(call.attempts) == 1 and no_sleep == []
+
+def test_last_error_is_raised_when_attempts_run_out(no_sleep):
+    call = _flaky(*[StatusError(503)] * 3)
+    
+    with pytest.raises(StatusError):
+        call_with_retries("test", call)
+    assert len(call.attempts) == 3
+
+def test_attempt_timeout_is_capped_by_the_deadline(no_sleep):
+    call = _flaky()
+    with deadline(0.5):
+        call_with_retries("test", call)
+    
+    assert call.attempts[0] <= 0.5
+
+def test_no_retry_once_the_backoff_would_outlive_the_deadline(no_sleep, monkeypatch):
+    monkeypatch.setattr(retry_policy.random, "uniform", lambda low, high: high)
+    call = _flaky(StatusError(503))
+    
+    with deadline(0.5), pytest.raises(StatusError):
+        call_with_retries("test", call)
+    assert len(call.attempts) == 1
+
+def test_nested_deadlines_never_extend_the_outer_one():
+    with deadline(0.2):
+        with deadline(60):
+            assert remaining_time() <= 0.2
+        with deadline(None):
+            assert remaining_time() <= 0.2
+    assert remaining_time() is None
+
+def test_passed_deadline_stops_the_next_attempt():
+    with deadline(0.01):
+        time.sleep(0.02)
+        with pytest.raises(DeadlineExceeded):
+            attempt_timeout(60)
@@ -0,0 +1,83 @@
+# tests/test_sandbox.py
+import sys
+import time
+import pytest
+import sandbox
+from sandbox import limited_command, run_limited
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="rlimits need a POSIX system")
+
+@pytest.fixture
+def limits(monkeypatch):
+    """Set step limits for a test; everything not given is unlimited."""
+    def set_limits(timeout=0, cpu=0, memory=0, file_size=0, output_kb=1024):
+        monkeypatch.setattr(sandbox, "STEP_TIMEOUT", timeout)
+        monkeypatch.setattr(sandbox, "STEP_CPU_SECONDS", cpu)
+        monkeypatch.setattr(sandbox, "STEP_MEMORY_MB", memory)
+        monkeypatch.setattr(sandbox, "STEP_FILE_SIZE_MB", file_size)
+        monkeypatch.setattr(sandbox, "STEP_OUTPUT_LIMIT_KB", output_kb)
+        monkeypatch.setattr(sandbox, "STEP_CGROUP", "")
+    set_limits()
+    return set_limits
+
+def _python(code):
+    return f"{sys.executable} -c \"{code}\""
+
+def test_command_output_exit_code_and_usage(limits, workdir):
+    result = run_limited("echo out; echo err >&2; exit 3")
+    
+    assert (result["returncode"], result["stdout"], result["stderr"], result["limit"]) == (3, "out\n", "err\n", None)
+    assert {"wall_seconds", "cpu_seconds", "max_rss_mb", "output_bytes"} <= set(result["usage"])
+    assert result["usage"]["output_bytes"] == 8
+
+def test_timeout_kills_the_command_and_its_children(limits, workdir):
+    limits(timeout=0.3)
+    started = time.perf_counter()
+    result = run_limited("sleep 30 & sleep 30")
+    
+    assert result["limit"] == "timeout"
+    assert time.perf_counter() - started < 5
+
+def test_cpu_limit(limits, workdir):
+    limits(cpu=1)
+    result = run_limited(_python("while True: pass"))
+    
+    assert result["limit"] == "cpu"
+
+def test_memory_limit(limits, workdir):
+    limits(memory=256)
+    result = run_limited(_python("x = bytearray(1024 ** 3)"))
+    
+    assert result["limit"] == "memory"
+
+def test_file_size_limit(limits, workdir):
+    limits(file_size=1)
+    result = run_limited("head -c 2000000 /dev/zero > big.bin")
+    
+    assert result["limit"] == "file_size"
+    assert (workdir / "big.bin").stat().st_size <= 1024 * 1024
+
+def test_output_keeps_its_start_and_end(limits, workdir):
+    limits(output_kb=1)
+    result = run_limited(_python("print('start' + 'x' * 10000 + 'end')"))
+    
+    assert result["stdout"].startswith("start")
+    assert result["stdout"].rstrip().endswith("end")
+    assert "bytes of output truncated" in result["stdout"]
+    assert result["usage"]["output_truncated"]
+
+def test_commands_without_limits_run_as_they_are(limits):
+    assert limited_command("ls") == "ls"
+    limits(cpu=5)
+    assert limited_command("ls")[-1] == "ls"
+
+def test_step_reports_the_limit_and_its_usage(limits, workdir):
+    import main
+    limits(timeout=0.3)
+    outcome = main.execute_steps([{"action": "run_command", "command": "sleep 30"}], debug=False)
+    
+    result = outcome["results"][0]
+    assert not result["success"]
+    assert result["output"].startswith("Command timed out after 0.3s")
+    assert result["usage"]["limit"] == "timeout"
+    assert result["usage"]["commands"] == 1
@@ -0,0 +1,30 @@
+# tests/test_schemas.py
+from schemas import ROUTER_SCHEMA, STEPS_SCHEMA, validate
+
+def test_valid_steps_pass():
+    data = {"steps": [{"action": "create_file", "path": "a.py", "content": ""}, {"action": "run_command", "command": "ls"}]}
+    
+    assert validate(data, STEPS_SCHEMA) == []
+
+def test_errors_name_their_location():
+    data = {"steps": [{"action": "create_file"}, {"path": "b.py"}, {"action": "explode", "deps": "flask"}]}
+    
+    errors = validate(data, STEPS_SCHEMA)
+    
+    assert len(errors) == 3
+    assert errors[0] == "$.steps[1] is missing required field 'action'"
+    assert errors[1].startswith("$.steps[2].action should be one of create_venv,")
+    assert errors[1].endswith("not 'explode'")
+    assert errors[2] == "$.steps[2].deps should be of type array"
+
+def test_booleans_are_not_numbers_and_null_fields_are_ignored():
+    schema = {"type": "object", "properties": {"count": {"type": "number"}, "name": {"type": "string"}}}
+    
+    assert validate({"count": True}, schema) == ["$.count should be of type number"]
+    assert validate({"count": 2.5, "name": None}, schema) == []
+
+def test_extra_properties_are_allowed():
+    assert validate({"route_to": "local", "complexity": "low", "confidence": 0.9}, ROUTER_SCHEMA) == []
+
+def test_wrong_top_level_type():
+    assert validate(["steps"], STEPS_SCHEMA) == ["$ should be of type object"]
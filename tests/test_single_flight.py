@@ -0,0 +1,114 @@
+# tests/test_single_flight.py
+import time
+import threading
+import llm_client
+from llm_client import single_flight
+from retry_policy import DeadlineExceeded, deadline
+
+KEY = ("test", "model", "system", "user", 0.2, None)
+
+class Leader:
+    """Runs single_flight in a thread with a call that blocks until released."""
+    
+    def __init__(self, outcome="result", seconds=None):
+        self.release = threading.Event()
+        self.calls = 0
+        self.outcome = outcome
+        self.result = None
+        self.thread = threading.Thread(target=self._run, args=(seconds,), daemon=True)
+        self.thread.start()
+        while KEY not in llm_client._in_flight:
+            time.sleep(0.001)
+    
+    def _run(self, seconds):
+        def call():
+            self.calls += 1
+            self.release.wait()
+            if isinstance(self.outcome, Exception):
+                raise self.outcome
+            return self.outcome
+        try:
+            with deadline(seconds):
+                self.result = single_flight(KEY, call)
+        except Exception as e:
+            self.result = e
+
+def _follow(results, call=lambda: "own result", seconds=None):
+    """Start a follower thread that appends what single_flight gave it."""
+    def run():
+        try:
+            with deadline(seconds):
+                results.append(single_flight(KEY, call))
+        except Exception as e:
+            results.append(e)
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+def _wait_for_followers(count):
+    """Give follower threads time to reach the in-flight call."""
+    time.sleep(0.05 * count)
+
+def test_concurrent_callers_share_one_call():
+    leader = Leader("shared result")
+    results = []
+    followers = [_follow(results) for _ in range(4)]
+    _wait_for_followers(4)
+    leader.release.set()
+    for follower in followers:
+        follower.join(5)
+    leader.thread.join(5)
+    assert leader.calls == 1
+    assert leader.result == "shared result"
+    assert results == ["shared result"] * 4
+    assert KEY not in llm_client._in_flight
+
+def test_provider_errors_are_shared():
+    error = ValueError("bad request")
+    leader = Leader(error)
+    results = []
+    follower = _follow(results)
+    _wait_for_followers(1)
+    leader.release.set()
+    follower.join(5)
+    assert results == [error]
+
+def test_follower_waits_no_longer_than_its_deadline():
+    leader = Leader()
+    results = []
+    started = time.perf_counter()
+    follower = _follow(results, seconds=0.2)
+    follower.join(5)
+    assert isinstance(results[0], DeadlineExceeded)
+    assert time.perf_counter() - started < 1
+    leader.release.set()
+    leader.thread.join(5)
+
+def test_leaders_deadline_is_not_shared():
+    leader = Leader(DeadlineExceeded("Task deadline exceeded"))
+    results = []
+    follower = _follow(results)
+    _wait_for_followers(1)
+    leader.release.set()
+    follower.join(5)
+    assert isinstance(leader.result, DeadlineExceeded)
+    assert results == ["own result"]
+
+def test_timeout_under_the_leaders_deadline_is_not_shared():
+    leader = Leader(TimeoutError("timed out"), seconds=30)
+    results = []
+    follower = _follow(results)
+    _wait_for_followers(1)
+    leader.release.set()
+    follower.join(5)
+    assert results == ["own result"]
+
+def test_timeout_without_a_deadline_is_shared():
+    error = TimeoutError("timed out")
+    leader = Leader(error)
+    results = []
+    follower = _follow(results)
+    _wait_for_followers(1)
+    leader.release.set()
+    follower.join(5)
+    assert results == [error]
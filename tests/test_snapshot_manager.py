@@ -0,0 +1,85 @@
+# tests/test_snapshot_manager.py
+import os
+import time
+import pytest
+import snapshot_manager
+from snapshot_manager import take_snapshot, restore_snapshot, discard_snapshot, touched_paths
+from file_manager import create_file, append_to_file
+
+@pytest.fixture(autouse=True)
+def fresh_stale_check(monkeypatch):
+    monkeypatch.setattr(snapshot_manager, "_stale_checked", False)
+
+def _blobs(root):
+    return [name for _, _, names in os.walk(root / ".agent_snapshots" / "blobs") for name in names]
+
+def test_touched_paths():
+    steps = [
+        {"action": "create_file", "path": "a"},
+        {"action": "run_command", "command": "ls"},
+        {"action": "patch_file", "path": "a"},
+        {"action": "modify_file", "path": "b"}
+    ]
+    assert touched_paths(steps) == ["a", "b"]
+
+def test_restore_puts_back_changed_and_removes_new_files(workdir):
+    (workdir / "a.txt").write_text("original")
+    snapshot = take_snapshot(["a.txt", "new.txt"])
+    create_file("a.txt", "changed")
+    create_file("new.txt", "new")
+    assert restore_snapshot(snapshot)
+    assert (workdir / "a.txt").read_text() == "original"
+    assert not (workdir / "new.txt").exists()
+
+def test_in_place_writes_do_not_change_the_snapshot(workdir):
+    (workdir / "a.txt").write_text("original")
+    snapshot = take_snapshot(["a.txt"])
+    append_to_file("a.txt", " appended")
+    with open("a.txt", "r+") as f:
+        f.write("OVERWRITE")
+    assert restore_snapshot(snapshot)
+    assert (workdir / "a.txt").read_text() == "original"
+
+def test_restored_file_is_not_linked_to_the_snapshot(workdir):
+    (workdir / "a.txt").write_text("original")
+    first = take_snapshot(["a.txt"])
+    create_file("a.txt", "changed")
+    restore_snapshot(first)
+    second = take_snapshot(["a.txt"])
+    append_to_file("a.txt", " appended")
+    assert restore_snapshot(second)
+    assert (workdir / "a.txt").read_text() == "original"
+
+def test_discard_removes_only_unreferenced_blobs(workdir):
+    (workdir / "a.txt").write_text("shared")
+    first = take_snapshot(["a.txt"])
+    second = take_snapshot(["a.txt"])
+    assert len(_blobs(workdir)) == 1
+    discard_snapshot(first)
+    assert len(_blobs(workdir)) == 1
+    create_file("a.txt", "changed")
+    assert restore_snapshot(second)
+    assert (workdir / "a.txt").read_text() == "shared"
+    discard_snapshot(second)
+    assert _blobs(workdir) == []
+    assert os.listdir(workdir / ".agent_snapshots" / "snapshots") == []
+
+def test_discard_does_not_scan_other_blobs(workdir):
+    stray = workdir / ".agent_snapshots" / "blobs" / "00" / "00stray"
+    stray.parent.mkdir(parents=True)
+    stray.write_text("not ours")
+    (workdir / "a.txt").write_text("a")
+    discard_snapshot(take_snapshot(["a.txt"]))
+    assert stray.exists()
+
+def test_stale_snapshots_are_discarded(workdir):
+    (workdir / "a.txt").write_text("a")
+    take_snapshot(["a.txt"])
+    stale = os.listdir(workdir / ".agent_snapshots" / "snapshots")[0]
+    old = time.time() - snapshot_manager.STALE_SNAPSHOT_SECONDS - 60
+    os.utime(workdir / ".agent_snapshots" / "snapshots" / stale, (old, old))
+    snapshot_manager._stale_checked = False
+    (workdir / "b.txt").write_text("b")
+    live = take_snapshot(["b.txt"])
+    assert os.listdir(workdir / ".agent_snapshots" / "snapshots") == [live["id"]]
+    assert len(_blobs(workdir)) == 1
@@ -0,0 +1,48 @@
+# tests/test_startup.py
+import os
+import sys
+import json
+import time
+import subprocess
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+MAIN = os.path.join(SRC, "main.py")
+# Time that `main.py --help` may take beyond starting a bare interpreter
+STARTUP_BUDGET_SECONDS = float(os.getenv("STARTUP_BUDGET_SECONDS", "0.1"))
+# Modules that only the commands themselves need
+COMMAND_MODULES = (
+    "agents", "task_manager", "llm_client", "llm_backends", "cursor_integration",
+    "metrics", "telemetry", "tracing", "backend_scheduler", "checkpoint",
+    "retry_policy", "snapshot_manager", "executor", "sandbox", "file_manager",
+    "openai", "anthropic", "requests", "flask", "yaml"
+)
+
+def _best_of(args, runs=5):
+    """Get the shortest wall time of several runs of a command."""
+    best = None
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run(args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def test_help_stays_within_the_startup_budget():
+    baseline = _best_of([sys.executable, "-c", "pass"])
+    startup = _best_of([sys.executable, MAIN, "--help"])
+    assert startup - baseline < STARTUP_BUDGET_SECONDS
+
+def test_help_imports_no_command_modules():
+    code = (
+        "import sys, json\n"
+        f"sys.path.insert(0, {SRC!r})\n"
+        "import main\n"
+        "try:\n"
+        "    main.main(['--help'])\n"
+        "except SystemExit:\n"
+        "    pass\n"
+        "sys.stderr.write(json.dumps(sorted(sys.modules)))\n"
+    )
+    completed = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    loaded = set(json.loads(completed.stderr))
+    assert not loaded.intersection(COMMAND_MODULES)
@@ -0,0 +1,84 @@
+# tests/test_task_manager.py
+import threading
+import pytest
+import task_manager
+from task_manager import TaskManager
+
+PLAN = [{"action": "run_command", "command": "echo planned"}]
+
+@pytest.fixture
+def manager(monkeypatch, workdir):
+    """A task manager that records agent requests and the steps it executes."""
+    monkeypatch.setattr(task_manager, "SPECULATIVE_PLANNING", True)
+    monkeypatch.setattr(task_manager, "SPECULATIVE_COMPLEXITY", "medium")
+    manager = TaskManager()
+    manager.asked = []
+    manager.executed = []
+    manager.analysis = {"agent": "developer", "complexity": "low", "instructions": "restated task"}
+    
+    def developer(instructions, complexity="medium"):
+        manager.asked.append(("developer", instructions, complexity))
+        return PLAN
+    
+    def tester(instructions, complexity="medium"):
+        manager.asked.append(("tester", instructions, complexity))
+        return PLAN
+    
+    def execute_steps(steps, task=None):
+        manager.executed.append(steps)
+        return {"success": True}
+    monkeypatch.setattr(task_manager, "get_developer_instructions", developer)
+    monkeypatch.setattr(task_manager, "get_tester_instructions", tester)
+    monkeypatch.setattr(manager, "analyze_task", lambda task: manager.analysis)
+    monkeypatch.setattr(manager, "execute_steps", execute_steps)
+    return manager
+
+def test_speculative_plan_is_used_when_the_analysis_agrees(manager):
+    assert manager.execute_task("build it")["success"]
+    
+    assert manager.asked == [("developer", "build it", "medium")]
+    assert manager.executed == [PLAN]
+    assert manager.get_speculation_stats() == {"hits": 1, "misses": 0, "hit_ratio": 1.0}
+
+def test_speculative_plan_is_discarded_for_another_agent(manager):
+    manager.analysis = {"agent": "tester", "complexity": "low", "instructions": "test it"}
+    manager.execute_task("build it")
+    
+    assert ("tester", "test it", "low") in manager.asked
+    assert manager.get_speculation_stats()["misses"] == 1
+
+def test_speculative_plan_is_discarded_for_a_more_complex_task(manager):
+    manager.analysis = {"agent": "developer", "complexity": "high", "instructions": "restated task"}
+    manager.execute_task("build it")
+    
+    assert manager.asked[-1] == ("developer", "restated task", "high")
+    assert manager.get_speculation_stats()["misses"] == 1
+
+def test_failed_speculative_plan_asks_the_developer_again(manager, monkeypatch):
+    calls = []
+    
+    def developer(instructions, complexity="medium"):
+        calls.append(instructions)
+        if len(calls) == 1:
+            raise RuntimeError("backend down")
+        return PLAN
+    monkeypatch.setattr(task_manager, "get_developer_instructions", developer)
+    manager.execute_task("build it")
+    
+    assert calls == ["build it", "restated task"]
+    assert manager.executed == [PLAN]
+
+def test_plan_is_requested_while_the_task_is_analyzed(manager, monkeypatch):
+    planning = threading.Event()
+    
+    def developer(instructions, complexity="medium"):
+        planning.set()
+        return PLAN
+    
+    def analyze_task(task):
+        assert planning.wait(5), "the plan was not requested during the analysis"
+        return manager.analysis
+    monkeypatch.setattr(task_manager, "get_developer_instructions", developer)
+    monkeypatch.setattr(manager, "analyze_task", analyze_task)
+    
+    assert manager.execute_task("build it")["success"]
@@ -0,0 +1,78 @@
+# tests/test_telemetry.py
+import pytest
+import telemetry
+from telemetry import (
+    add_to_chain, call_chain, get_llm_summary, get_prompt_report, record_llm_call, usage_from_response
+)
+from llm_backends import Backend
+
+@pytest.fixture
+def events(monkeypatch):
+    """Start from empty totals and collect logged events instead of writing them."""
+    logged = []
+    monkeypatch.setattr(telemetry, "_totals", {})
+    monkeypatch.setattr(telemetry, "_prompt_sizes", {})
+    monkeypatch.setattr(telemetry, "_log_event", logged.append)
+    monkeypatch.setattr(telemetry, "TELEMETRY_ENABLED", True)
+    return logged
+
+def test_usage_from_openai_response():
+    usage = {"prompt_tokens": 100, "completion_tokens": 20, "prompt_tokens_details": {"cached_tokens": 64}}
+    
+    assert usage_from_response(usage) == {"prompt_tokens": 100, "completion_tokens": 20, "cached_tokens": 64}
+
+def test_usage_from_anthropic_response_counts_cached_prompt_tokens():
+    usage = {"input_tokens": 10, "output_tokens": 5, "cache_read_input_tokens": 80, "cache_creation_input_tokens": 6}
+    
+    assert usage_from_response(usage) == {"prompt_tokens": 96, "completion_tokens": 5, "cached_tokens": 80}
+
+def test_usage_from_missing_response():
+    assert usage_from_response(None) == {"prompt_tokens": None, "completion_tokens": None, "cached_tokens": 0}
+
+def test_cost_uses_per_million_token_prices(monkeypatch):
+    monkeypatch.delenv("LLM_PRICED_COST", raising=False)
+    backend = Backend("priced", "model", cost=(3.0, 15.0))
+    
+    assert backend.estimate_cost(1000, 200) == pytest.approx(0.006)
+
+def test_cost_can_be_overridden_per_backend(monkeypatch):
+    monkeypatch.setenv("LLM_PRICED_COST", "1,2")
+    
+    assert Backend("priced", "model", cost=(3.0, 15.0)).cost == (1.0, 2.0)
+
+def test_event_records_the_fallback_chain(events):
+    with call_chain("developer", "x" * 400):
+        add_to_chain("test_primary")
+        record_llm_call("test_primary", "model", 0.5, error="down")
+        add_to_chain("test_fallback")
+        event = record_llm_call("test_fallback", "model", 0.25, prompt_tokens=120, completion_tokens=30,
+                                cached_tokens=100, cost=0.01)
+    
+    assert event["agent"] == "developer"
+    assert event["fallback_chain"] == ["test_primary", "test_fallback"]
+    assert event["cache_hit"] and event["success"]
+    assert event["ttft"] == event["latency"] == 0.25
+    assert [logged["success"] for logged in events] == [False, True]
+
+def test_summary_aggregates_calls_per_backend_and_model(events):
+    with call_chain("tester", "x" * 400):
+        record_llm_call("test_backend", "model", 0.5, prompt_tokens=10, completion_tokens=5, cost=0.5)
+        record_llm_call("test_backend", "model", 1.5, error="timeout")
+    
+    summary, = get_llm_summary()
+    assert (summary["backend"], summary["model"]) == ("test_backend", "model")
+    assert (summary["calls"], summary["errors"], summary["fallbacks"]) == (2, 1, 0)
+    assert summary["latency_avg"] == 1.0 and summary["latency_max"] == 1.5
+    assert summary["cost_usd"] == 0.5
+
+def test_prompt_report_estimates_sizes_the_backend_did_not_report(events):
+    with call_chain("router", "x" * 400):
+        record_llm_call("test_backend", "model", 0.1)
+    with call_chain("router", "x" * 40):
+        record_llm_call("test_backend", "model", 0.1, prompt_tokens=50, cached_tokens=25)
+    
+    report, = get_prompt_report()
+    assert report["agent"] == "router"
+    assert (report["calls"], report["prompt_tokens"], report["max_prompt_tokens"]) == (2, 150, 100)
+    assert report["avg_prompt_tokens"] == 75
+    assert report["cached_ratio"] == round(25 / 150, 4)
@@ -0,0 +1,78 @@
+# tests/test_tracing.py
+import json
+import threading
+import pytest
+import tracing
+from tracing import bind_context, current_trace_id, set_attributes, span, trace, traced
+
+@pytest.fixture
+def trace_dir(tmp_path, monkeypatch):
+    """Export traces to a temporary directory."""
+    monkeypatch.setattr(tracing, "TRACE_DIR", str(tmp_path))
+    return tmp_path
+
+def _events(trace_dir, trace_id):
+    with open(trace_dir / f"{trace_id}.json") as f:
+        return {event["name"]: event for event in json.load(f)["traceEvents"]}
+
+def test_spans_nest_under_the_trace_root(trace_dir):
+    @traced("agent.step")
+    def step():
+        set_attributes(action="run_command")
+    
+    with trace("task", trace_id="t1", task="build") as root:
+        with span("llm.local", model="m"):
+            step()
+    
+    events = _events(trace_dir, "t1")
+    assert set(events) == {"task", "llm.local", "agent.step"}
+    assert events["task"]["args"]["parent_id"] is None
+    assert events["llm.local"]["args"]["parent_id"] == root["span_id"]
+    assert events["agent.step"]["args"]["parent_id"] == events["llm.local"]["args"]["span_id"]
+    assert events["agent.step"]["args"]["action"] == "run_command"
+    assert events["task"]["dur"] >= events["llm.local"]["dur"]
+
+def test_errors_are_recorded_on_the_span(trace_dir):
+    with pytest.raises(ValueError):
+        with trace("task", trace_id="t2"):
+            with span("phase"):
+                raise ValueError("boom")
+    
+    events = _events(trace_dir, "t2")
+    assert events["phase"]["args"]["error"] == "boom"
+    assert events["task"]["args"]["error"] == "boom"
+
+def test_bound_context_carries_the_trace_to_other_threads(trace_dir):
+    seen = []
+    
+    def work():
+        seen.append(current_trace_id())
+        with span("worker"):
+            pass
+    
+    with trace("task", trace_id="t3"):
+        thread = threading.Thread(target=bind_context(work))
+        thread.start()
+        thread.join()
+        unbound = threading.Thread(target=lambda: seen.append(current_trace_id()))
+        unbound.start()
+        unbound.join()
+    
+    assert seen == ["t3", None]
+    assert "worker" in _events(trace_dir, "t3")
+
+def test_spans_outside_a_trace_are_not_recorded(trace_dir):
+    with span("orphan") as current:
+        set_attributes(ignored=True)
+    
+    assert current is None
+    assert current_trace_id() is None
+    assert list(trace_dir.iterdir()) == []
+
+def test_nested_trace_becomes_a_span(trace_dir):
+    with trace("server", trace_id="t4"):
+        with trace("task", trace_id="ignored"):
+            assert current_trace_id() == "t4"
+    
+    assert "task" in _events(trace_dir, "t4")
+    assert not (trace_dir / "ignored.json").exists()
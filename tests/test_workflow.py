@@ -0,0 +1,152 @@
+# tests/test_workflow.py
+import time
+import threading
+import pytest
+import workflow
+from workflow import PhaseCache, WorkflowError, load_workflow, run_workflow
+
+FIX_WORKFLOW = """
+phases:
+  plan:
+    agent: developer
+  build:
+    execute: plan
+  fix_plan:
+    agent: debugger
+    inputs: [build]
+  fix:
+    execute: fix_plan
+  docs_plan:
+    agent: tester
+    needs: [build]
+"""
+
+@pytest.fixture
+def agents(monkeypatch):
+    """Answer agent phases with one command step each, counting the requests."""
+    asked = []
+    
+    def ask_agent(phase, outputs):
+        asked.append(phase["agent"])
+        return [{"action": "run_command", "command": f"{phase['agent']} step"}]
+    monkeypatch.setattr(workflow, "_ask_agent", ask_agent)
+    return asked
+
+def _executor(failing=()):
+    """Get an execute_steps that fails the steps whose command is in failing."""
+    executed = []
+    
+    def execute_steps(steps, debug=True):
+        results = []
+        for i, step in enumerate(steps):
+            executed.append(step["command"])
+            success = step["command"] not in failing
+            results.append({"step": i, "action": step["action"], "success": success, "output": ""})
+        return {"success": all(result["success"] for result in results), "results": results}
+    execute_steps.executed = executed
+    return execute_steps
+
+def _load(tmp_path, text):
+    path = tmp_path / "workflow.yaml"
+    path.write_text(text)
+    return load_workflow(str(path))
+
+def test_default_workflow_runs_every_phase(agents):
+    execute_steps = _executor()
+    result = run_workflow(load_workflow(), execute_steps)
+    
+    assert set(result["status"].values()) == {"done"}
+    assert sorted(agents) == ["developer", "tester"]
+    assert execute_steps.executed == ["developer step", "tester step"]
+
+def test_failed_execution_fails_its_phase_and_skips_dependents(agents):
+    execute_steps = _executor(failing={"developer step"})
+    result = run_workflow(load_workflow(), execute_steps)
+    
+    assert result["status"]["develop"] == "failed"
+    assert result["status"]["test"] == "skipped"
+    assert execute_steps.executed == ["developer step"]
+
+def test_debugger_runs_on_a_failed_execution_among_its_inputs(workdir, agents):
+    execute_steps = _executor(failing={"developer step"})
+    result = run_workflow(_load(workdir, FIX_WORKFLOW), execute_steps)
+    
+    assert result["status"]["build"] == "failed"
+    assert result["status"]["fix"] == "done"
+    assert result["status"]["docs_plan"] == "skipped"
+    assert execute_steps.executed == ["developer step", "debugger step"]
+
+def test_cached_plans_are_reused_and_failed_plans_dropped(workdir, agents):
+    cache = PhaseCache(str(workdir / "cache.json"))
+    run_workflow(load_workflow(), _executor(failing={"tester step"}), cache)
+    agents.clear()
+    
+    result = run_workflow(load_workflow(), _executor(), PhaseCache(str(workdir / "cache.json")))
+    
+    assert result["status"]["developer_plan"] == "cached"
+    assert result["status"]["tester_plan"] == "done"
+    assert agents == ["tester"]
+
+@pytest.mark.parametrize("text, error", [
+    ("phases: {a: {execute: b}, b: {execute: a}}", "must execute the steps of an agent phase"),
+    ("phases: {a: {agent: developer, needs: [b]}, b: {agent: tester, needs: [a]}}", "dependency cycle"),
+    ("phases: {a: {agent: debugger}}", "needs inputs"),
+    ("phases: {a: {agent: nobody}}", "unknown agent"),
+])
+def test_invalid_workflows_are_rejected(workdir, text, error):
+    with pytest.raises(WorkflowError, match=error):
+        _load(workdir, text)
+
+def test_agent_phases_are_asked_concurrently(monkeypatch):
+    barrier = threading.Barrier(2, timeout=5)
+    
+    def ask_agent(phase, outputs):
+        barrier.wait()
+        return [{"action": "run_command", "command": f"{phase['agent']} step"}]
+    monkeypatch.setattr(workflow, "_ask_agent", ask_agent)
+    
+    result = run_workflow(load_workflow(), _executor())
+    assert set(result["status"].values()) == {"done"}
+
+def test_execution_starts_before_other_plans_arrive(monkeypatch):
+    developing = threading.Event()
+    
+    def ask_agent(phase, outputs):
+        if phase["agent"] == "tester":
+            assert developing.wait(5), "develop waited for the tester's plan"
+        return [{"action": "run_command", "command": f"{phase['agent']} step"}]
+    
+    def execute_steps(steps, debug=True):
+        developing.set()
+        return {"success": True, "results": []}
+    monkeypatch.setattr(workflow, "_ask_agent", ask_agent)
+    
+    assert set(run_workflow(load_workflow(), execute_steps)["status"].values()) == {"done"}
+
+def test_executing_phases_run_one_at_a_time(workdir, agents):
+    running = []
+    overlaps = []
+    
+    def execute_steps(steps, debug=True):
+        running.append(steps)
+        overlaps.append(len(running))
+        time.sleep(0.02)
+        running.remove(steps)
+        return {"success": True, "results": []}
+    parallel = "phases:\n" + "".join(f"  plan{i}: {{agent: developer}}\n  run{i}: {{execute: plan{i}}}\n" for i in range(4))
+    
+    result = run_workflow(_load(workdir, parallel), execute_steps)
+    assert set(result["status"].values()) == {"done"}
+    assert overlaps == [1, 1, 1, 1]
+
+def test_setup_steps_already_in_place_are_skipped(workdir):
+    (workdir / "app.py").write_text("print('hi')\n")
+    cache = PhaseCache(str(workdir / "cache.json"))
+    steps = [
+        {"action": "create_file", "path": "app.py", "content": "print('hi')\n"},
+        {"action": "create_file", "path": "new.py", "content": ""},
+        {"action": "create_file", "path": "app.py", "content": "print('hi')\n"},
+    ]
+    
+    assert workflow._steps_to_run(steps, cache) == steps[1:]
+    assert workflow._steps_to_run(steps, None) == steps